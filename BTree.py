@@ -4,13 +4,24 @@
 ###################################
 
 import abc      # for ABstract Class
+import bisect   # for binary search within nodes
+import contextlib   # for block access without a writer to lock out
+import heapq    # for picking the pages to trickle
+import mmap     # for memory-mapped block access
 import os       # Operating System, for file checking
 import struct   # for handling binary file structures
+import threading    # for loading a block once when threads miss together
+import time     # for commit intervals
 import dbcache  # for handling cache
+import dbcodec  # for packing/unpacking blocks
+import dbindex  # for secondary attribute indexes
+import dbslots  # for compact node storage
+import dbsnap   # for snapshots
+import dbspace  # for tracking free blocks
+import dbwal    # for the redo log
+import dbwriter     # for the background writer
 # from colorama import Fore, Back, Style      # add some color to dbms, some panache!
 
-# invoke global in-memory cache
-cache = dbcache.cache()
 
 
 def CATTableFileReader(filename, dbFilename):
@@ -60,9 +71,8 @@ def CATTableAttrReader(filename, fileTable):
     return tables
 
 
-def PrintData(prompt, entry):
+def PrintData(prompt, entry, catalog):
     """Pretty-print the db Entry"""
-    global cache
     fields = [str(ent) for ent in entry]
 
     if entry[0] >= 0:
@@ -71,59 +81,309 @@ def PrintData(prompt, entry):
         type = 'edge'
 
     entryLen = {}
-    for i in range(len(cache.header['catalog'][type])):
+    for i in range(len(catalog[type])):
         thisLength = max(
-            len(cache.header['catalog'][type][i][0]), len(fields[i]))
+            len(catalog[type][i][0]), len(fields[i]))
         entryLen.update({i: thisLength})
 
     names = prompt
     entfield = len(names) * ' '
-    for i in range(len(cache.header['catalog'][type])):
-        names += cache.header['catalog'][type][i][0] + \
-            (entryLen[i] - len(cache.header['catalog'][type][i][0])) * ' ' + '  '
+    for i in range(len(catalog[type])):
+        names += catalog[type][i][0] + \
+            (entryLen[i] - len(catalog[type][i][0])) * ' ' + '  '
         entfield += fields[i] + (entryLen[i] - len(fields[i])) * ' ' + '  '
 
     print(names)
     print(entfield)
 
 
+# versioned header layout:
+#   magic, version, blockSize, index min/max keys, data min/max keys,
+#   growth extent, blockCount, rootRID, dataRootRID, block0, key format,
+#   first dictionary page
+# the header gets a fixed area ahead of block0, so growing the file never
+# moves the blocks. the block usage bitmap trails the last block.
+# files without the magic use the original 'IIQQQI' layout (512 byte blocks,
+# one min/max key pair shared by index and data nodes, map before block0)
+# version 3 files keep fixed-width data pages (fill counted in slots),
+# version 4 files have slotted data pages (fill counted in bytes),
+# version 5 files add the key format: plain 'q' keys or delta-coded keys
+# (delta-coded index nodes count their fill in bytes, too)
+# version 6 files store DICT attributes as codes into dictionary pages,
+# older files keep them as plain V20 text
+headerMagic = b'MBPT'
+headerVersion = 6
+fixedVersion = 3
+keyVersion = 5
+dictVersion = 6
+headerFormat = '=4sIIIIIIIQQQIIq'
+keyPlain, keyDelta = 0, 1
+headerArea = 256
+legacyFormat = '=IIQQQI'
+defaultExtent = 64      # blocks added each time the file grows
+defaultLogCommit = 64   # operations per group commit of the redo log
+defaultLogInterval = 1.0    # seconds after which pending operations commit anyway
+defaultWriterBatch = 16     # dirty pages handed to the background writer at a time
+defaultCheckpointInterval = 30.0    # seconds between checkpoints (background writer on)
+defaultReadahead = 32   # blocks read at once by a scan running through consecutive blocks
+
+# node splits: two even halves, or append splits --> a record past the last key
+# of the tree (or before the first) leaves the full node at splitFill of a block
+# and starts the new one almost empty, sequential keys fill their pages
+splitEven, splitAppend = 0, 1
+defaultSplitFill = 0.9
+
+# edge attributes always hash-indexed --> out-edge and in-edge adjacency
+adjacencyFields = ['LinkFrom', 'LinkTo']
+
+# on-disk width (in bytes) of each catalog attribute type
+fieldWidth = {'Int': 8, 'V20': 20}
+
+# fixed per-page overhead of a fixed-width data node
+dataHeaderSize = struct.calcsize('=chqI')    # type, #slots, next, rid
+
+
+def recordSize(fields):
+    """byte width of one data-node record (key + fields) of a catalog type"""
+    for field in fields:
+        if field[1] not in fieldWidth:
+            raise ValueError("'" + field[1] + "' attributes need slotted data pages.")
+    return sum([fieldWidth[field[1]] for field in fields])
+
+
+def textCatalog(catalog):
+    """catalog with DICT attributes stored as V20 text (files before dictionary pages)"""
+    if catalog == None:
+        return None
+    return dict([(type, [(field[0], 'V20' if field[1] == 'DICT' else field[1], field[2])
+                         for field in fields]) for type, fields in catalog.items()])
+
+
+def nodeCapacity(catalog, blockSize, version=headerVersion, keyFormat=keyPlain):
+    """(min, max) fill per index node and per data node of one block.
+       index node fill is a key count (bytes with delta-coded keys),
+       data node fill is a slot count on fixed pages, bytes on slotted pages"""
+    if version < dictVersion:
+        catalog = textCatalog(catalog)
+    pageCodec = makeCodec(version, catalog, blockSize, keyFormat)
+    indexMin, indexMax = pageCodec.indexLimits()
+    if version > fixedVersion:
+        dataMin, dataMax = pageCodec.dataLimits()
+    elif catalog == None:
+        dataMax = 4
+        dataMin = dataMax // 2
+    else:
+        # data nodes hold node and edge records alike --> size for the widest
+        width = max([recordSize(fields) for fields in catalog.values()])
+        dataMax = (blockSize - dataHeaderSize) // width
+        dataMin = dataMax // 2
+    if dataMax < 4:
+        raise ValueError("block size of " + str(blockSize) +
+                         " bytes is too small for the catalog records.")
+    return indexMin, indexMax, dataMin, dataMax
+
+
+def makeCodec(version, catalog, blockSize, keyFormat=keyPlain):
+    """page codec matching the page layout of a file version and key format"""
+    if version < dictVersion:
+        catalog = textCatalog(catalog)
+    if version > fixedVersion and keyFormat == keyDelta:
+        return dbcodec.deltaCodec(catalog, blockSize)
+    if version > fixedVersion:
+        return dbcodec.slottedCodec(catalog, blockSize)
+    return dbcodec.codec(catalog, blockSize)
+
+
+def fillCount(minCount, maxCount, fillFactor):
+    """number of entries per node when packing to fillFactor"""
+    return max(minCount, min(maxCount, int(maxCount * fillFactor)))
+
+
+def packGroups(items, perGroup, minCount, maxCount, weight=None):
+    """chunk sorted items into nodes filled up to perGroup, last node keeps >= minCount.
+       fill is counted by weight(item) (one per item by default)"""
+    if weight == None:
+        groups = [items[i:i + perGroup] for i in range(0, len(items), perGroup)]
+        sizes = [len(group) for group in groups]
+    else:
+        groups, sizes = [[]], [0]
+        for item in items:
+            size = weight(item)
+            if sizes[-1] + size > perGroup and len(groups[-1]) > 0:
+                groups.append([])
+                sizes.append(0)
+            groups[-1].append(item)
+            sizes[-1] += size
+    if len(groups) > 1 and sizes[-1] < minCount:
+        # short tail --> fold into its left sibling or split the pair evenly
+        tail = groups[-2] + groups[-1]
+        total = sizes[-2] + sizes[-1]
+        if total <= maxCount:
+            groups[-2:] = [tail]
+        elif weight == None:
+            half = len(tail) // 2
+            groups[-2:] = [tail[:half], tail[half:]]
+        else:   # both halves within half an item of each other
+            largest = max([weight(item) for item in tail])
+            half, size = 0, 0
+            while 2 * size < total - largest:
+                size += weight(tail[half])
+                half += 1
+            groups[-2:] = [tail[:half], tail[half:]]
+    return groups
+
+
 def readDBHeader(dbfile):
     """returns header information of db file"""
     header = dict()
-    blockArray = []
     dbfile.seek(0)
-    minK = int(struct.unpack('I', dbfile.read(4))[0])
-    maxK = int(struct.unpack('I', dbfile.read(4))[0])
-    blockCount = int(struct.unpack('Q', dbfile.read(8))[0])
-    root = int(struct.unpack('Q', dbfile.read(8))[0])
-    dataRoot = int(struct.unpack('Q', dbfile.read(8))[0])
-    block0 = int(struct.unpack('I', dbfile.read(4))[0])
-    for _ in range(blockCount):
-        block = int.from_bytes(dbfile.read(
-            1), byteorder='little', signed=False)
-        blockArray.append(block)
+    if dbfile.read(4) == headerMagic:
+        dbfile.seek(0)
+        (_, version, blockSize, minK, maxK, dataMinK, dataMaxK, extent,
+         blockCount, root, dataRoot, block0, keyFormat, dictRID) = struct.unpack(
+            headerFormat, dbfile.read(struct.calcsize(headerFormat)))
+        if version < keyVersion:    # older headers end before the key format
+            keyFormat = keyPlain
+        if version < dictVersion:   # ... or before the dictionary pages
+            dictRID = -1
+        dbfile.seek(block0 + blockCount * blockSize)    # trailing bitmap
+        space = dbspace.spaceMap(blockCount, dbfile.read((blockCount + 7) // 8))
+    else:   # original header --> fixed fanout and block size
+        dbfile.seek(0)
+        minK, maxK, blockCount, root, dataRoot, block0 = struct.unpack(
+            legacyFormat, dbfile.read(struct.calcsize(legacyFormat)))
+        version, blockSize, extent = 0, 512, defaultExtent
+        keyFormat = keyPlain
+        dictRID = -1
+        dataMinK, dataMaxK = minK, maxK
+        space = dbspace.spaceFromArray(dbfile.read(blockCount))
 
     # make a header
+    header.update({'version': version})
+    header.update({'blockSize': blockSize})
     header.update({'minKey': minK})
     header.update({'maxKey': maxK})
+    header.update({'dataMinKey': dataMinK})
+    header.update({'dataMaxKey': dataMaxK})
+    header.update({'extent': extent})
     header.update({'blockCount': blockCount})
     header.update({'rootRID': root})
     header.update({'dataRootRID': dataRoot})
     header.update({'block0': block0})
-    header.update({'blockArray': blockArray})
+    header.update({'space': space})
+    header.update({'keyFormat': keyFormat})
+    header.update({'dictRID': dictRID})
     return header
 
 
 def writeHeader(dbfile, house):
     """overwrite db header information"""
     dbfile.seek(0)
-    dbfile.write(struct.pack('I', house['minKey']))
-    dbfile.write(struct.pack('I', house['maxKey']))
-    dbfile.write(struct.pack('Q', house['blockCount']))
-    dbfile.write(struct.pack('Q', house['rootRID']))
-    dbfile.write(struct.pack('Q', house['dataRootRID']))
-    dbfile.write(struct.pack('I', house['block0']))  # block0 start position
-    dbfile.write(bytearray(house['blockArray']))
+    if house['version'] == 0:   # keep original layout, block0 must not move
+        dbfile.write(struct.pack(legacyFormat, house['minKey'], house['maxKey'],
+                                 house['blockCount'], house['rootRID'],
+                                 house['dataRootRID'], house['block0']))
+        dbfile.write(house['space'].toArray())
+    else:
+        dbfile.write(struct.pack(headerFormat, headerMagic, house['version'],
+                                 house['blockSize'], house['minKey'],
+                                 house['maxKey'], house['dataMinKey'],
+                                 house['dataMaxKey'], house['extent'],
+                                 house['blockCount'], house['rootRID'],
+                                 house['dataRootRID'], house['block0'],
+                                 house['keyFormat'], house['dictRID']))
+        dbfile.seek(house['block0'] + house['blockCount'] * house['blockSize'])
+        dbfile.write(house['space'].toBytes())
+
+
+def replayLog(dbfile, logName, house):
+    """redo the committed batches of the log on the db file (house gets
+       the logged db state) --> True if the log had anything to replay"""
+    logged = dbwal.readLog(logName, house['blockSize'])
+    if logged == None:
+        return False
+    pages, (blockCount, root, dataRoot, dictRID, bitmap) = logged
+    for rid in sorted(pages):
+        dbfile.seek(house['block0'] + rid * house['blockSize'])
+        dbfile.write(pages[rid])
+    house.update({'blockCount': blockCount})
+    house.update({'rootRID': root})
+    house.update({'dataRootRID': dataRoot})
+    house.update({'dictRID': dictRID})
+    house.update({'space': dbspace.spaceMap(blockCount, bitmap)})
+    writeHeader(dbfile, house)
+    dbfile.flush()
+    os.fsync(dbfile.fileno())
+    return True
+
+
+def writeAt(house, blockPos, data):
+    """data to the db file of house at blockPos"""
+    house['file'].seek(blockPos)
+    house['file'].write(data)
+    if house['concurrent']:     # readers of a concurrent tree pread past the file buffer
+        house['file'].flush()
+
+
+def newLatch(cache):
+    """page latch for a node of a concurrent tree, None otherwise"""
+    if cache != None and cache.header != None and cache.header.get('concurrent'):
+        return dbcache.latch()
+    return None
+
+
+def getBlock(house, refID):
+    """raw bytes of block refID as they are in the db file of house"""
+    blockPos = house['block0'] + refID * house['blockSize']
+    if house['view'] != None:
+        return bytes(house['view'][blockPos:blockPos + house['blockSize']])
+    house['file'].seek(blockPos)
+    return house['file'].read(house['blockSize'])
+
+
+def saveVersion(house, refID):
+    """block refID is about to be overwritten --> snapshots that still
+       read it from the db file get the old image first"""
+    readers = [snap for snap in house['snapshots'] if refID not in snap.blocks]
+    if len(readers) > 0:
+        block = getBlock(house, refID)
+        for snap in readers:
+            snap.blocks.update({refID: block})
+
+
+def staleIndexes(house):
+    """the db file is about to change --> the index file saved for it stops
+       being current (cleared on disk first, a crash from here on means a rebuild)"""
+    if house['indexFile'] != None:
+        dbindex.invalidate(house['indexFile'])
+        house['indexFile'] = None
+
+
+def putBlock(house, refID, block):
+    """raw bytes of block refID to the db file of house"""
+    blockPos = house['block0'] + refID * house['blockSize']
+    saveVersion(house, refID)
+    staleIndexes(house)
+    if house['mmap'] != None:
+        house['mmap'][blockPos:blockPos + len(block)] = block
+    else:
+        writeAt(house, blockPos, block)
+
+
+def mapFile(house):
+    """switch block I/O over to a memory map of the db file"""
+    house['file'].flush()
+    house['mmap'] = mmap.mmap(house['file'].fileno(), 0)
+    house['view'] = memoryview(house['mmap'])
+
+
+def unmapFile(house):
+    """drop the memory map (flushing it), block I/O goes back to the file"""
+    house['view'].release()
+    house['mmap'].flush()
+    house['mmap'].close()
+    house['view'], house['mmap'] = None, None
+
 
 #####
 #######
@@ -139,15 +399,31 @@ class BPlusTree:
     def makeHouse(self):
         house = dict()
         house.update({'file': self.file})
+        house.update({'version': self.version})
         house.update({'minKey': self.minKey})
         house.update({'maxKey': self.maxKey})
+        house.update({'dataMinKey': self.dataMinKey})
+        house.update({'dataMaxKey': self.dataMaxKey})
         house.update({'blockCount': self.blockCount})
         house.update({'blockSize': self.blockSize})
         house.update({'block0': self.block0})
-        house.update({'blockArray': self.blockArray})
-        house.update({'arrayPos': self.arrayPos})
-        house.update({'freeSlots': self.freeSlots})
+        house.update({'space': self.space})
+        house.update({'extent': self.extent})
+        house.update({'bufferSize': self.bufferSize})
         house.update({'catalog': self.catalog})
+        house.update({'keyFormat': self.keyFormat})
+        house.update({'split': (self.splitPolicy, self.splitFill)})
+        house.update({'readahead': self.readahead})
+        house.update({'dictRID': -1})
+        house.update({'codec': makeCodec(self.version, self.catalog, self.blockSize,
+                                         self.keyFormat)})
+        house.update({'mmap': None})
+        house.update({'view': None})
+        house.update({'log': None})
+        house.update({'writer': None})
+        house.update({'concurrent': self.concurrent})
+        house.update({'snapshots': []})
+        house.update({'indexFile': None})
         if self.root != None:
             house.update({'rootRID': self.root.rid})
         else:
@@ -159,179 +435,735 @@ class BPlusTree:
             house.update({'dataRootRID': 0})
         return house
 
-    def __init__(self, numBlocks, dbfile, catalog=None, bufferSize=None):
-        global cache
-        self.maxKey = 4  # <----  max allowable keys/node
-        self.minKey = self.maxKey // 2  # <----  min allowable keys/node
-        self.blockSize = 512  # <----  block size (in bytes)
-        self.blockCount = numBlocks  # <----  number of blocks allowable in db
-        self.blockArray = [0 for _ in range(self.blockCount)]
-        self.freeSlots = numBlocks
+    def __init__(self, numBlocks, dbfile, catalog=None, bufferSize=None, blockSize=512,
+                 useMmap=False, extent=defaultExtent, compressKeys=False,
+                 logCommit=None, logInterval=defaultLogInterval,
+                 backgroundWriter=False, checkpointInterval=None, concurrent=False,
+                 splitPolicy=splitEven, splitFill=defaultSplitFill,
+                 readahead=defaultReadahead):
+        # redo log: group commit every logCommit operations (or logInterval
+        # seconds), None --> no log, dirty nodes reach the file on eviction/EXIT
+        self.logCommit = logCommit
+        self.logInterval = logInterval
+        # background writer: evicted and trickled pages are written off the
+        # insert path, checkpoints every checkpointInterval seconds (None --> EXIT only)
+        self.backgroundWriter = backgroundWriter
+        self.checkpointInterval = checkpointInterval
+        self.checkpointed = time.monotonic()
+        # concurrent: many threads may read while one writes --> page latches
+        self.concurrent = concurrent
+        # split policy: splitEven or splitAppend (splitFill 1.0 --> 100/0 splits)
+        if splitFill < 0.5 or splitFill > 1.0:
+            raise ValueError("split fill of " + str(splitFill) + " is not within 0.5 .. 1.0.")
+        self.splitPolicy = splitPolicy
+        self.splitFill = splitFill
+        # scans along the data node chain: blocks read ahead in runs, kept out
+        # of the buffer (0 --> one block at a time, through the buffer)
+        self.readahead = readahead
+        self.extent = extent  # <----  blocks added whenever the file runs out
+        self.useMmap = useMmap  # <----  block I/O through a memory map
+        self.blockSize = blockSize  # <----  block size (in bytes)
+        # delta-coded keys --> more keys per page, fill counted in bytes
+        self.keyFormat = keyDelta if compressKeys else keyPlain
+        # fanout follows from the block size and the catalog record sizes
+        self.version = headerVersion
+        (self.minKey, self.maxKey, self.dataMinKey, self.dataMaxKey) = nodeCapacity(
+            catalog, self.blockSize, self.version, self.keyFormat)  # <----  node fill limits
+        self.blockCount = numBlocks  # <----  initial number of blocks in db
+        self.space = dbspace.spaceMap(self.blockCount)
         self.block0 = 0
         self.file = dbfile
         self.bufferSize = bufferSize
         self.catalog = catalog
+        self.indexes = dbindex.indexSet(catalog)
 
         self.root = None
         self.dataRoot = None
 
-        self.arrayPos = 0
-        # move header information to cache
-        cache.header = self.makeHouse()
+        # every tree has its own buffer pool, the header travels with it
+        self.cache = dbcache.cache()
+        self.cache.header = self.makeHouse()
+        self.cache.pager = RID(self.cache)
         if self.bufferSize == None:
             # set default cache size to 10% of DB size
             cacheSize = max(2, self.blockCount // 10)
-            cache.setMaxCount(cacheSize)
+            self.cache.setMaxCount(cacheSize)
         else:
-            cache.setMaxCount(self.bufferSize)
+            self.cache.setMaxCount(self.bufferSize)
 
     def readDB(self):
-        global cache
         overhead = readDBHeader(self.file)
+        # a redo log left behind --> the last session didn't end in a checkpoint
+        recovered = replayLog(self.file, self.logFile(), overhead)
+        self.version = overhead['version']
+        self.blockSize = overhead['blockSize']
         self.minKey = overhead['minKey']
         self.maxKey = overhead['maxKey']
+        self.dataMinKey = overhead['dataMinKey']
+        self.dataMaxKey = overhead['dataMaxKey']
+        self.keyFormat = overhead['keyFormat']
+        self.extent = overhead['extent']
         self.blockCount = overhead['blockCount']
         self.rootRef = overhead['rootRID']
         self.dataRootRef = overhead['dataRootRID']
         self.block0 = overhead['block0']
-        self.blockArray = overhead['blockArray']
-        self.arrayPos = 0
-
-        # setup cache overhead
-        cache.header = overhead
-        cache.header['arrayPos'] = 0
-        cache.header.update({'file': self.file})
-        cache.header.update({'blockSize': self.blockSize})
-        cache.header['freeSlots'] = self.blockCount - \
-            sum(cache.header['blockArray'])
-        cache.header.update({'catalog': self.catalog})
+        self.space = overhead['space']
+
+        # setup cache overhead (nodes of a db opened before on this tree don't belong here)
+        self.cache.clear()
+        self.cache.header = overhead
+        self.cache.header.update({'file': self.file})
+        self.cache.header.update({'catalog': self.catalog})
+        self.cache.header.update({'codec': makeCodec(self.version, self.catalog,
+                                                self.blockSize, self.keyFormat)})
+        self.cache.header.update({'mmap': None})
+        self.cache.header.update({'view': None})
+        self.cache.header.update({'log': None})
+        self.cache.header.update({'writer': None})
+        self.cache.header.update({'concurrent': self.concurrent})
+        self.cache.header.update({'snapshots': []})
+        self.cache.header.update({'indexFile': None})
+        self.cache.header.update({'bufferSize': self.bufferSize})
+        self.cache.header.update({'split': (self.splitPolicy, self.splitFill)})
+        self.cache.header.update({'readahead': self.readahead})
+
+        # original layout --> map moves behind the blocks on the next commit
+        # (data pages stay fixed-width, their fill is counted in slots)
+        if self.version == 0 and struct.calcsize(headerFormat) <= self.block0:
+            self.version = fixedVersion
+            self.cache.header['version'] = fixedVersion
 
         if self.bufferSize == None:
             # set default cache size to 10% of DB size
             cacheSize = max(1, self.blockCount // 10)
-            cache.setMaxCount(cacheSize)
+            self.cache.setMaxCount(cacheSize)
         else:
-            cache.setMaxCount(self.bufferSize)
+            self.cache.setMaxCount(self.bufferSize)
+
+        if self.useMmap:
+            mapFile(self.cache.header)
+
+        # dictionaries first, records of DICT attributes decode through them
+        self.cache.pager.readDicts()
 
         # prepare db with root nodes
-        self.dataRoot = RID().node(self.dataRootRef)
-        if cache.header['dataRootRID'] == cache.header['rootRID']:
+        self.dataRoot = self.cache.pager.node(self.dataRootRef)
+        if self.cache.header['dataRootRID'] == self.cache.header['rootRID']:
             self.root = self.dataRoot
         else:
-            self.root = RID().node(self.rootRef)
+            self.root = self.cache.pager.node(self.rootRef)
+
+        # secondary indexes --> rebuilt if the index file doesn't match the db,
+        # else it stays current until the db file changes
+        self.indexes, stamp = dbindex.loadIndexes(self.indexFile(), self.catalog)
+        if recovered or stamp != self.indexStamp():
+            dbindex.invalidate(self.indexFile())
+            if len(self.indexes.indexes) > 0:
+                self.indexes.rebuild(self.rangeScan())
+        else:
+            self.cache.header.update({'indexFile': self.indexFile()})
+        self.openAdjacency()
+        self.openLog()
+        self.openWriter()
 
     def newDB(self):
-        global cache
-        # write new empty database
-        rootRef, drootRef = 0, 0
-        emptyBlock = [0 for _ in range(self.blockSize)]
-
-        self.file.write(struct.pack('I', self.minKey))
-        self.file.write(struct.pack('I', self.maxKey))
-        self.file.write(struct.pack('Q', self.blockCount))
-        self.file.write(struct.pack('Q', rootRef))
-        self.file.write(struct.pack('Q', drootRef))
-        self.block0 = struct.calcsize('IIQQQI') + self.blockCount
-        self.file.write(struct.pack('I', self.block0))  # block0 start position
-        self.file.write(bytearray(self.blockArray))
-        for _ in range(self.blockCount):
-            self.file.write(bytearray(emptyBlock))
+        # write new empty database --> blocks are the zero gap before the map
+        self.block0 = headerArea
+        self.cache.clear()
+        self.cache.header = self.makeHouse()
+        dbindex.invalidate(self.indexFile())    # left by an older db of that name
+        writeHeader(self.file, self.cache.header)
+        if self.useMmap:
+            mapFile(self.cache.header)
 
         # formally start a new dataRoot node
-        self.dataRoot = RID().newDataNode()
-        RID().writeNode(self.dataRoot)
+        self.dataRoot = self.cache.pager.newDataNode()
+        self.cache.pager.writeNode(self.dataRoot)
         self.root = None
-        cache.header = self.makeHouse()
+        self.cache.header.update({'rootRID': 0})
+        self.cache.header.update({'dataRootRID': self.dataRoot.rid})
+        self.openAdjacency()
+        self.openLog()
+        self.openWriter()
+
+    def logFile(self):
+        """name of the file holding the redo log"""
+        return self.file.name + '.wal'
+
+    def logState(self):
+        """db state the redo log records with every batch"""
+        return (self.cache.header['blockCount'], self.cache.header['rootRID'],
+                self.cache.header['dataRootRID'], self.cache.header['dictRID'],
+                self.cache.header['space'].toBytes())
+
+    def openLog(self):
+        """start a redo log based on the db file as it is now (w/o log: drop any old one)"""
+        if self.cache.header['log'] != None:
+            self.cache.header['log'].close()
+            self.cache.header['log'] = None
+        if self.logCommit == None or self.cache.header['version'] == 0:
+            if os.path.exists(self.logFile()):
+                os.remove(self.logFile())
+            return
+        with self.cache.pager.blockIO():     # the base batch says the db file has it all
+            if self.cache.header['mmap'] != None:
+                self.cache.header['mmap'].flush()
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        log = dbwal.redoLog(self.logFile(), self.cache.header['blockSize'])
+        log.reset(self.logState())
+        log.started = time.monotonic()
+        self.cache.header['log'] = log
+
+    def openWriter(self):
+        """start the background writer of the db (if asked for)"""
+        if not self.backgroundWriter:
+            return
+        house = self.cache.header
+        writer = dbwriter.pageWriter(lambda refID, block: putBlock(house, refID, block))
+        house.update({'writer': writer})
+        writer.start()
+
+    def closeWriter(self):
+        """stop the background writer, whatever it still holds goes to the db file"""
+        if self.cache.header['writer'] != None:
+            self.cache.header['writer'].stop()
+            self.cache.header['writer'] = None
+
+    def opStep(self, count=1):
+        """count more operations done --> group commit once enough have piled up,
+           pages for the background writer, checkpoint when due"""
+        log = self.cache.header['log']
+        if log != None:
+            log.ops += count
+            # the buffer overshoots while it holds uncommitted nodes --> commit early
+            if log.ops >= self.logCommit or self.cache.nodeCount > self.cache.nodeMax or \
+                    time.monotonic() - log.started >= self.logInterval:
+                self.commit()
+                with self.cache.lock:   # no reader reloads a node before it is written
+                    for node in self.cache.shrink():
+                        if node.dirty:
+                            self.cache.pager.writeBack(node)
+        if self.checkpointInterval != None and \
+                time.monotonic() - self.checkpointed >= self.checkpointInterval:
+            self.checkpoint()
+        elif self.cache.header['writer'] != None and len(self.cache.header['writer'].queue) == 0:
+            self.cache.pager.trickle(defaultWriterBatch)    # writer caught up --> next pages
+
+    def commit(self):
+        """group commit: every node changed since the last commit, the blocks held
+           back from the db file and the db state go to the log in one append"""
+        log = self.cache.header['log']
+        if log == None:
+            return
+        with self.cache.writeLatch:
+            self.appendBatch(log)
+
+    def appendBatch(self, log):
+        self.cache.pager.writeDicts()
+        pages = dict(log.pending)
+        for rid in self.cache.held:
+            pages.update({rid: bytes(self.cache.pager.encodeNode(self.cache.nodes[rid]))})
+        state = self.logState()
+        if len(pages) > 0 or state != log.state:
+            log.append(pages, state)
+        # logged --> held back blocks may go to the db file, held nodes may leave the buffer
+        for rid in sorted(log.pending):
+            self.cache.pager.writeBlock(rid, log.pending[rid])
+        log.pending = dict()
+        self.cache.held = set()
+        log.ops = 0
+        log.started = time.monotonic()
+
+    def snapshot(self):
+        """read-only view of the db as it is now, later writes don't show in it
+           (see dbsnap). a tree that isn't concurrent takes it in the writing thread,
+           any thread may read it. release it when done, it ends with the tree"""
+        with self.cache.writeLatch:
+            house = self.cache.header
+            edgeFields = dict()
+            if self.catalog != None:
+                for name in adjacencyFields:
+                    edgeFields.update({name: self.indexes.fieldInfo('edge', name)[0]})
+            blocks = dict()     # images newer than the db file
+            snap = dbsnap.snapshot(house['codec'], self.rootRID(), blocks,
+                                   self.cache.pager.blockIO, lambda rid: getBlock(house, rid),
+                                   self.dropSnapshot, edgeFields)
+            with self.cache.lock, self.cache.pager.blockIO():
+                if house['writer'] != None:
+                    blocks.update(house['writer'].queue)
+                if house['log'] != None:
+                    blocks.update(house['log'].pending)
+                for node in self.cache.nodes.values():
+                    if node.dirty:
+                        blocks.update({node.rid: bytes(self.cache.pager.encodeNode(node))})
+                house['snapshots'] = house['snapshots'] + [snap]
+        return snap
+
+    def dropSnapshot(self, snap):
+        with self.cache.pager.blockIO():
+            self.cache.header['snapshots'] = [live for live in self.cache.header['snapshots']
+                                              if live is not snap]
+
+    def indexFile(self):
+        """name of the file holding the secondary indexes"""
+        return self.file.name + '.idx'
+
+    def indexStamp(self):
+        """db state the index file must match when it is read back"""
+        return (self.cache.header['rootRID'], self.cache.header['dataRootRID'],
+                self.cache.header['blockCount'])
+
+    def createIndex(self, type, name, kind='O'):
+        """index type.name ('O' ordered or 'H' hash) over the records in the db.
+           the index file gets the definition right away, not current: the db
+           file may lag the buffer --> a crash before cacheOut means a rebuild"""
+        if type == 'node':
+            records = self.rangeScan(0, None)
+        else:
+            records = self.rangeScan(None, -1)
+        index = self.indexes.create(type, name, kind, records)
+        self.cache.header.update({'indexFile': None})
+        self.indexes.save(self.indexFile(), self.indexStamp(), False)
+        return index
+
+    def indexScan(self, index, op, value):
+        """records whose indexed attribute satisfies (attribute op value), in key order"""
+        return [(key, self.searchKey(key))
+                for key in sorted(index.lookup(op, value))]
+
+    def dictScan(self, type, name, value):
+        """records of type whose DICT attribute name equals value, in key order.
+           compares codes only --> None if name isn't dictionary-encoded in this db"""
+        info = self.indexes.fieldInfo(type, name)
+        if info == None:
+            return None
+        fieldPos = info[0]
+        column = self.cache.header['codec'].dicts.get((type, fieldPos))
+        if column == None:
+            return None
+        code = column.lookup(value)
+        if code == None:    # never stored --> nothing can match
+            return []
+        if self.concurrent:     # leaves are copied under their latches
+            if type == 'node':
+                records = self.rangeScan(0, None)
+            else:
+                records = self.rangeScan(None, -1)
+            return [(key, data) for key, data in records if data[fieldPos].code == code]
+
+        # blocks not in the buffer are matched on the codes in their slots
+        pager = self.cache.pager
+        node = self.findLeaf(0) if type == 'node' else pager.node(self.dataRoot.rid)
+        ring = dbcache.ring(self.cache.header['readahead'], node.rid)
+        matches = []
+        while True:
+            if hasattr(node, 'rid'):
+                matches.extend(slot for slot in node.slots if (slot[0] < 0) == (type == 'edge')
+                               and slot[1][fieldPos].code == code)
+                next, last = node.next, node.slots[-1][0] if len(node.slots) > 0 else None
+            else:
+                next, last, found = self.cache.header['codec'].dictMatches(
+                    node, type, fieldPos, code, pager.readOverflow)
+                matches.extend(found)
+            if next == -1 or (type == 'edge' and last != None and last >= 0):
+                return matches
+            node = pager.scanBlock(next, ring)
+
+    def openAdjacency(self):
+        """make sure the edge adjacency indexes exist (built by one edge scan)"""
+        if self.catalog == None:
+            return
+        for name in adjacencyFields:
+            if self.indexes.find('edge', name) == None:
+                self.createIndex('edge', name, 'H')
+
+    def outEdges(self, nodeKey):
+        """edge records leaving node nodeKey, in key order"""
+        return self.indexScan(self.indexes.find('edge', 'LinkFrom'), '=', nodeKey)
+
+    def inEdges(self, nodeKey):
+        """edge records entering node nodeKey, in key order"""
+        return self.indexScan(self.indexes.find('edge', 'LinkTo'), '=', nodeKey)
+
+    def incidentEdges(self, nodeKey):
+        """keys of all edges touching node nodeKey"""
+        edgeKeys = dict()
+        for name in adjacencyFields:
+            for key in self.indexes.find('edge', name).lookup('=', nodeKey):
+                edgeKeys.update({key: key})
+        return sorted(edgeKeys)
 
     def searchKey(self, key):
         """search db for key --> return tuple"""
-        # mount to the root
+        if self.concurrent:
+            leaf = self.latchedLeaf(key)[0]
+            data = leaf.search(key)
+            self.cache.pager.unlatch(leaf, 'S')
+            return data
+        # jump down from the root
+        return self.findLeaf(key).search(key)
+
+    def rootRID(self):
+        """rid of the node every descent starts at"""
         if self.root != None:
-            node = RID().node(self.root.rid)
+            return self.root.rid
+        return self.dataRoot.rid
+
+    def latchedLeaf(self, key, before=False, last=False):
+        """concurrent tree: 'S' latched data node holding key (before --> the keys
+           below key, None --> the first/last leaf) and its fences (None --> unbounded).
+           latches crab down: a reader holds two at most, and only for one step"""
+        while True:
+            rid = self.rootRID()
+            node = self.cache.pager.node(rid, 'S')
+            if rid == self.rootRID() and self.cache.nodes.get(rid) is node:
+                break
+            self.cache.pager.unlatch(node, 'S')     # the root moved meanwhile
+        low, high = None, None
+        while hasattr(node, 'keys'):
+            if key == None:
+                index = len(node.keys) if last else 0
+            elif before:
+                index = bisect.bisect_left(node.keys, key)
+            else:
+                index = bisect.bisect_right(node.keys, key)
+            if index > 0:
+                low = node.keys[index - 1]
+            if index < len(node.keys):
+                high = node.keys[index]
+            child = self.cache.pager.node(node.link[index], 'S')
+            self.cache.pager.unlatch(node, 'S')
+            node = child
+        return node, low, high
+
+    def latchedScan(self, lo, hi, reverse):
+        """range scan of a concurrent tree: each leaf is copied under its latch,
+           the next one is found by a new descent from the fence of the last"""
+        key, before = (hi, False) if reverse else (lo, False)
+        seen = None     # last key handed out
+        while True:
+            leaf, low, high = self.latchedLeaf(key, before, reverse)
+            slots = [slot for slot in leaf.slots
+                     if (lo == None or slot[0] >= lo) and (hi == None or slot[0] <= hi)]
+            self.cache.pager.unlatch(leaf, 'S')
+            if reverse:
+                slots.reverse()
+            for slot in slots:
+                if seen == None or (slot[0] < seen if reverse else slot[0] > seen):
+                    seen = slot[0]
+                    yield slot
+            if reverse:
+                if low == None or (lo != None and low <= lo):
+                    return
+                key, before = low, True
+            else:
+                if high == None or (hi != None and high > hi):
+                    return
+                key = high
+
+    def findLeaf(self, key):
+        """descend from the root to the data node that holds key"""
+        if self.root != None:
+            node = self.cache.pager.node(self.root.rid)
         else:
-            node = RID().node(self.dataRoot.rid)
-        # jump down
-        return node.search(key)
+            node = self.cache.pager.node(self.dataRoot.rid)
+        while hasattr(node, 'keys'):
+            node = self.cache.pager.node(node.link[bisect.bisect_right(node.keys, key)])
+        return node
+
+    def rangeScan(self, lo=None, hi=None, reverse=False):
+        """yields (key, fields) for lo <= key <= hi in key order (None --> unbounded).
+           only the leaves of the range (plus one descent) are read"""
+        if self.concurrent:
+            yield from self.latchedScan(lo, hi, reverse)
+            return
+        if reverse:
+            if self.root != None:
+                node = self.cache.pager.node(self.root.rid)
+            else:
+                node = self.cache.pager.node(self.dataRoot.rid)
+            yield from self.recScan(node, lo, hi)
+            return
+
+        if lo == None:
+            node = self.cache.pager.node(self.dataRoot.rid)
+            index = 0
+        else:
+            node = self.findLeaf(lo)
+            index = node.slotIndex(lo)
+        ring = dbcache.ring(self.cache.header['readahead'], node.rid)
+        while True:
+            slots = node.slots      # cut at hi once, then zip the pairs off the slot list
+            last = len(slots) if hi == None else bisect.bisect_right(slots.keys, hi)
+            yield from zip(slots.keys[index:last], slots.records[index:last])
+            if last < len(slots):
+                return
+            if node.next == -1:
+                return
+            node = self.cache.pager.scanNode(node.next, ring)
+            index = 0
+
+    def recScan(self, node, lo, hi):
+        """Recursive portion of reverse range scan (leaves have no back links)"""
+        if hasattr(node, 'keys'):   # only visit children overlapping [lo, hi]
+            first = 0
+            last = len(node.link) - 1
+            if lo != None:
+                first = bisect.bisect_right(node.keys, lo)
+            if hi != None:
+                last = bisect.bisect_right(node.keys, hi)
+            for index in range(last, first - 1, -1):
+                yield from self.recScan(self.cache.pager.node(node.link[index]), lo, hi)
+        else:
+            slots = node.slots
+            first = 0
+            last = len(slots)
+            if lo != None:
+                first = node.slotIndex(lo)
+            if hi != None:
+                last = node.slotIndex(hi)
+                if last < len(slots) and slots[last][0] == hi:
+                    last += 1
+            for index in range(last - 1, first - 1, -1):
+                yield slots[index]
 
     def RootSplit(self, key, link):
         """Handle splitting root at key"""
-        global cache
-        newRoot = RID().newIndexNode(key, [self.root.rid, link])
+        newRoot = self.cache.pager.newIndexNode(key, [self.root.rid, link])
         self.root = newRoot
         self.rootRef = self.root.rid
-        RID().updateNode(newRoot)
-        cache.header.update({'rootRID': self.root.rid})
-        cache.header.update({'dataRootRID': self.dataRoot.rid})
+        self.cache.pager.updateNode(newRoot)
+        self.cache.header.update({'rootRID': self.root.rid})
+        self.cache.header.update({'dataRootRID': self.dataRoot.rid})
+
+    def needsOldData(self, key):
+        """True if replacing/deleting key must see the old record (indexes, overflow blocks)"""
+        return len(self.indexes.typeIndexes(key)) > 0 or self.cache.header['codec'].canSpill(key)
+
+    def spillValues(self, key, data):
+        """fits the record to the page format and moves VAR values too long
+           for a data page onto overflow blocks, returns None if the db has no room for them"""
+        pageCodec = self.cache.header['codec']
+        data = pageCodec.fitRecord(key, data)
+        spillPos = pageCodec.spillFields(key, data)
+        if len(spillPos) == 0:
+            return data
+        numBlocks = sum([pageCodec.overflowPages(dbcodec.textSize(data[i]))
+                         for i in spillPos])
+        if not self.cache.pager.reserveBlocks(numBlocks):
+            return None
+        data = list(data)
+        for i in spillPos:
+            data[i] = self.cache.pager.writeOverflow(data[i])
+        return tuple(data)
+
+    def freeValues(self, data):
+        """releases the overflow blocks of a record"""
+        for value in data:
+            if isinstance(value, dbcodec.spilled):
+                self.cache.pager.freeOverflow(value)
 
     def insertKey(self, keyDat):
         """inserts (key, data) tuple into tree"""
+        if not self.concurrent:
+            return self.insertOne(keyDat)
+        with self.cache.writeLatch:     # writers take turns, readers carry on
+            try:
+                return self.insertOne(keyDat)
+            finally:
+                self.cache.pager.releasePath()
+
+    def insertOne(self, keyDat):
+        inputKey, data = keyDat[0], self.spillValues(keyDat[0], tuple(keyDat[1:]))
+        if data == None:
+            return 'full'
+        return self.insertRecord(inputKey, data)
 
-        inputKey, data = keyDat[0], tuple(keyDat[1:])
+    def insertRecord(self, inputKey, data):
+        """inserts a record whose long values are spilled already"""
+        oldData = None
+        if self.needsOldData(inputKey):  # overwrites drop their old index entries/overflow
+            oldData = self.searchKey(inputKey)
 
         # if tree is still a seed --> fill dataRoot node
         if self.root == None or self.root == self.dataRoot:
+            self.dataRoot = self.cache.pager.node(self.dataRoot.rid, 'X')
             (key, link) = self.dataRoot.insert((inputKey, data), 0)
             if key != None and key != 'full':     # the seed breaks open --> and spawns a root!
-                newRoot = RID().newIndexNode(
+                newRoot = self.cache.pager.newIndexNode(
                     key, [self.dataRoot.rid, link.rid])
                 self.rootRef = newRoot.rid
                 self.root = newRoot
-                RID().updateNode(self.root)
-                cache.header.update({'rootRID': self.root.rid})
-                cache.header.update({'dataRootRID': self.dataRoot.rid})
+                self.cache.pager.updateNode(self.root)
+                self.cache.header.update({'rootRID': self.root.rid})
+                self.cache.header.update({'dataRootRID': self.dataRoot.rid})
         else:                  # regular tree growth
-            (key, link) = self.root.insert((inputKey, data), 0)
+            self.root = self.cache.pager.node(self.root.rid, 'X')
+            (key, link) = self.insertPath(self.root, (inputKey, data))
             if key != None and key != 'full':
                 self.RootSplit(key, link.rid)
 
         if key == 'full':
+            self.freeValues(data)
+            self.opStep()
             return 'full'
+        if oldData != None:
+            self.indexes.remove(inputKey, oldData)
+            self.freeValues(oldData)
+        self.indexes.add(inputKey, data)
         # update new root reference information
-        self.dataRoot = RID().node(self.dataRoot.rid)
+        self.dataRoot = self.cache.pager.node(self.dataRoot.rid)
+        if self.root != None:
+            self.root = self.cache.pager.node(self.root.rid)
+            self.cache.pager.updateNode(self.dataRoot)
+            self.cache.header.update({'rootRID': self.root.rid})
+            self.cache.header.update({'dataRootRID': self.dataRoot.rid})
+        self.opStep()
+
+    def insertPath(self, node, keyVal):
+        """inserts keyVal below node: down to the data node in a loop, the index
+           nodes passed go on a stack and take the splits surfacing on the way
+           back up --> (None, node), ('full', node) or (key, node) of a split node"""
+        path = []   # (index node, it holds the first/last keys of the tree)
+        ends = (True, True)
+        while hasattr(node, 'keys'):
+            # jump down the rabbit hole ... but which one?
+            index = bisect.bisect_right(node.keys, keyVal[0])
+            child = self.cache.pager.node(node.link[index], 'X')
+            if child.latch != None and child.safe(keyVal):
+                self.cache.pager.releasePath(child)  # no split can surface --> let readers by
+            path.append((node, ends))
+            ends = (ends[0] and index == 0, ends[1] and index == len(node.keys))
+            node = child
+        (key, link) = node.insert(keyVal, len(path), ends)
+        while len(path) > 0 and key != None and key != 'full':
+            (node, ends) = path.pop()
+            (key, link) = node.insert(key, link, ends)
+        return (key, link)
+
+    def insertMany(self, records):
+        """inserts (key, data) tuples, sorted by key (a later duplicate wins).
+           one descent per data node: the records it holds without a split go in
+           together, a record that splits it takes the insertKey way"""
+        batch = dict()
+        for keyDat in records:
+            batch.update({keyDat[0]: keyDat})
+        keyDats = [batch[key] for key in sorted(batch)]
+        if not self.concurrent:
+            return self.insertSorted(keyDats)
+        with self.cache.writeLatch:
+            try:
+                return self.insertSorted(keyDats)
+            finally:
+                self.cache.pager.releasePath()
+
+    def writeLeaf(self, key):
+        """descend to the data node for key ('X' latched in a concurrent tree, the
+           nodes above are let go) --> (node, pivot bounding it above or None, level)"""
+        node = self.cache.pager.node(self.rootRID(), 'X')
+        high, level = None, 0
+        while hasattr(node, 'keys'):
+            index = bisect.bisect_right(node.keys, key)
+            if index < len(node.keys):
+                high = node.keys[index]
+            node = self.cache.pager.node(node.link[index], 'X')
+            self.cache.pager.releasePath(node)
+            level += 1
+        return node, high, level
+
+    def insertSorted(self, keyDats):
+        pageCodec = self.cache.header['codec']
+        result = None
+        i = 0
+        while i < len(keyDats) and result == None:
+            leaf, high, level = self.writeLeaf(keyDats[i][0])
+            # fill grows by the most each record can add --> nothing placed splits
+            fill = leaf.fill()
+            roomy = self.cache.pager.reserveBlocks(level + 2)  # as DataNode.insert asks
+            placed = 0
+            spilt = None        # next record, if it must split the node
+            while i < len(keyDats) and (high == None or keyDats[i][0] < high):
+                key = keyDats[i][0]
+                data = self.spillValues(key, tuple(keyDats[i][1:]))
+                if data == None:
+                    result = 'full'
+                    break
+                room = pageCodec.insertRoom((key, data))
+                if not roomy or fill + room > leaf.maxKey:
+                    spilt = (key, data)
+                    break
+                oldData = None
+                if self.needsOldData(key):
+                    oldData = leaf.search(key)
+                leaf.place((key, data))
+                fill += room
+                if oldData != None:
+                    self.indexes.remove(key, oldData)
+                    self.freeValues(oldData)
+                self.indexes.add(key, data)
+                placed += 1
+                i += 1
+            if placed > 0:
+                self.cache.pager.updateNode(leaf)
+            self.cache.pager.releasePath()
+            if placed > 0:
+                self.opStep(placed)
+            if spilt != None:
+                result = self.insertRecord(*spilt)
+                self.cache.pager.releasePath()
+                i += 1
+        self.dataRoot = self.cache.pager.node(self.dataRoot.rid)
         if self.root != None:
-            self.root = RID().node(self.root.rid)
-            RID().updateNode(self.dataRoot)
-            cache.header.update({'rootRID': self.root.rid})
-            cache.header.update({'dataRootRID': self.dataRoot.rid})
+            self.root = self.cache.pager.node(self.root.rid)
+        return result
 
     def deleteKey(self, key):
         """deletes (key, data) tuple from tree"""
+        if not self.concurrent:
+            return self.deleteOne(key)
+        with self.cache.writeLatch:     # a merge may reach any anchor --> latches stay
+            try:
+                return self.deleteOne(key)
+            finally:
+                self.cache.pager.releasePath()
+
+    def deleteOne(self, key):
 
         delLink = None
+        oldData = None
+        if self.needsOldData(key):
+            oldData = self.searchKey(key)
 
         if self.root == None:   # little tree version
-            LeftNbor = self.dataRoot
-            RightNbor = self.dataRoot
-            LeftAnchor = self.dataRoot
-            RightAnchor = self.dataRoot
-            self.dataRoot.delete(key, 0, LeftNbor, RightNbor,
-                                 LeftAnchor, RightAnchor, 0, 0, self.dataRoot)
+            self.dataRoot = self.cache.pager.node(self.dataRoot.rid, 'X')
+            self.deletePath(self.dataRoot, key)
         else:                   # big tree version
-            LeftNbor = self.root
-            RightNbor = self.root
-            LeftAnchor = self.root
-            RightAnchor = self.root
-            delLink = self.root.delete(
-                key, 0, LeftNbor, RightNbor, LeftAnchor, RightAnchor, 0, 0, self.dataRoot)
+            self.root = self.cache.pager.node(self.root.rid, 'X')
+            delLink = self.deletePath(self.root, key)
+
+        if isinstance(delLink, tuple):  # root outgrew its block (delta-coded pivots)
+            self.RootSplit(delLink[0], delLink[1].rid)
+            delLink = None
 
         if delLink != None:     # handle last-minute deletion
-            RID().delNode(delLink)
-            self.root = RID().node(self.root.rid)
-            self.dataRoot = RID().node(self.dataRoot.rid)
-            RID().updateNode(self.root)
-            cache.header.update({'rootRID': self.root.rid})
-            cache.header.update({'dataRootRID': self.dataRoot.rid})
+            self.cache.pager.delNode(delLink)
+            self.root = self.cache.pager.node(self.root.rid)
+            self.dataRoot = self.cache.pager.node(self.dataRoot.rid)
+            self.cache.pager.updateNode(self.root)
+            self.cache.header.update({'rootRID': self.root.rid})
+            self.cache.header.update({'dataRootRID': self.dataRoot.rid})
 
         # check for root re-wiring
         if self.root != self.dataRoot and self.root != None:
             if len(self.root.keys) == 0:
                 tempRID = self.root.link[0]
-                RID().delNode(self.root)
-                self.root = RID().node(tempRID)
-                self.dataRoot = RID().node(self.dataRoot.rid)
-                RID().updateNode(self.root)
-                cache.header.update({'rootRID': self.root.rid})
-                cache.header.update({'dataRootRID': self.dataRoot.rid})
+                self.cache.pager.delNode(self.root)
+                self.root = self.cache.pager.node(tempRID)
+                self.dataRoot = self.cache.pager.node(self.dataRoot.rid)
+                self.cache.pager.updateNode(self.root)
+                self.cache.header.update({'rootRID': self.root.rid})
+                self.cache.header.update({'dataRootRID': self.dataRoot.rid})
                 if self.root.rid == self.dataRoot.rid:
                     self.root = None
         else:
@@ -339,15 +1171,530 @@ class BPlusTree:
 
         # ensure in-memory roots are up to date
         if self.root != None:
-            cache.header.update({'rootRID': self.root.rid})
-            self.root = RID().node(self.root.rid)
-        cache.header.update({'dataRootRID': self.dataRoot.rid})
-        self.dataRoot = RID().node(self.dataRoot.rid)
+            self.cache.header.update({'rootRID': self.root.rid})
+            self.root = self.cache.pager.node(self.root.rid)
+        self.cache.header.update({'dataRootRID': self.dataRoot.rid})
+        self.dataRoot = self.cache.pager.node(self.dataRoot.rid)
+
+        if oldData != None:
+            self.indexes.remove(key, oldData)
+            self.freeValues(oldData)
+        self.opStep()
+
+    def deletePath(self, node, key):
+        """deletes key below node: down to the data node in a loop, every index
+           node passed works out the neighbors and anchors of the next one, and
+           goes on a stack to take the merges and shifts on the way back up
+           --> what the root gave (None, a split tuple, or a node to drop)"""
+        nbors = (node, node, node, node, 0, 0)
+        path = []   # (index node, its level, its nbors)
+        level = 0
+        while hasattr(node, 'keys'):
+            (index, childNbors) = node.neighbors(key, level, nbors)
+            # locked meanwhile: as an anchor below, it may briefly outgrow its block
+            self.cache.lockNode(node)
+            path.append((node, level, nbors))
+            node = self.cache.pager.node(node.link[index], 'X')
+            nbors = childNbors
+            level += 1
+        delLink = node.delete(key, level, nbors, self.dataRoot)
+        while len(path) > 0:
+            (node, level, nbors) = path.pop()
+            delLink = node.delete(key, level, nbors, self.dataRoot, delLink)
+        return delLink
+
+    def deleteRange(self, lo=None, hi=None):
+        """deletes the records with lo <= key <= hi (None --> unbounded).
+           subtrees inside the range are freed without a look at their records
+           (unless indexes or overflow blocks need them), the nodes left short
+           along the two edges of the cut are mended once, on the way back up"""
+        if lo != None and hi != None and lo > hi:
+            return
+        if not self.concurrent:
+            return self.cutOut(lo, hi)
+        with self.cache.writeLatch:
+            try:
+                return self.cutOut(lo, hi)
+            finally:
+                self.cache.pager.releasePath()
+
+    def deleteMany(self, keys):
+        """deletes the records of keys: one visit to every node holding some of them,
+           the nodes left short are mended once, on the way back up"""
+        keys = sorted(set(keys))
+        if len(keys) == 0:
+            return
+        if not self.concurrent:
+            return self.cutKeys(keys)
+        with self.cache.writeLatch:
+            try:
+                return self.cutKeys(keys)
+            finally:
+                self.cache.pager.releasePath()
+
+    def boundLeaf(self, key, before):
+        """'X' latched data node for key (before --> the keys below key)"""
+        node = self.cache.pager.node(self.rootRID(), 'X')
+        while hasattr(node, 'keys'):
+            if before:
+                index = bisect.bisect_left(node.keys, key)
+            else:
+                index = bisect.bisect_right(node.keys, key)
+            node = self.cache.pager.node(node.link[index], 'X')
+        return node
+
+    def height(self):
+        """levels of index nodes above the data nodes"""
+        node = self.cache.pager.node(self.rootRID())
+        level = 0
+        while hasattr(node, 'keys'):
+            node = self.cache.pager.node(node.link[0])
+            level += 1
+        return level
+
+    def cutOut(self, lo, hi):
+        removed = []
+        if self.root != None and lo != None:
+            # the data nodes between the edges of the cut go --> chain across them now
+            before = self.boundLeaf(lo, True)
+            after = None if hi == None else self.boundLeaf(hi, False)
+            if after == None or after.rid != before.rid:
+                before.next = -1 if after == None else after.rid
+                self.cache.pager.updateNode(before)
+        elif lo == None and hi == None:     # only the first data node stays
+            first = self.cache.pager.node(self.dataRoot.rid, 'X')
+            first.next = -1
+            self.cache.pager.updateNode(first)
+        root = self.cache.pager.node(self.rootRID(), 'X')
+        (bad, split) = self.cutRange(root, self.height(), lo, hi, None, None, removed)
+        self.regrow(root, bad, split, removed)
+
+    def cutKeys(self, keys):
+        removed = []
+        root = self.cache.pager.node(self.rootRID(), 'X')
+        (bad, split) = self.cutList(root, self.height(), keys, removed)
+        self.regrow(root, bad, split, removed)
+
+    def regrow(self, root, bad, split, removed):
+        """after a cut: a root left with one child steps down (a short spine
+           below it mended first), index entries and overflow blocks of the
+           removed records go"""
+        if split != None:
+            self.root = root
+            self.RootSplit(split[0], split[1].rid)
+            root = self.root
+        while hasattr(root, 'keys'):
+            if len(root.link) == 1:
+                child = root.link[0]
+                self.cache.pager.delNode(root)
+                root = self.cache.pager.node(child, 'X')
+            elif bad in ['left', 'right']:
+                self.cache.lockNode(root)
+                bad = self.fixChild(root, 0 if bad == 'left' else len(root.link) - 1, bad)
+                self.cache.pager.updateNode(root)
+                self.cache.unlockNode(root)
+            else:
+                break
+        if hasattr(root, 'keys'):
+            self.root = root
+            self.cache.header.update({'rootRID': root.rid})
+        else:   # one data node left --> it is the root on file too
+            self.root = None
+            self.cache.header.update({'rootRID': root.rid})
+        # the first data node may be gone
+        node = root
+        while hasattr(node, 'keys'):
+            node = self.cache.pager.node(node.link[0])
+        self.dataRoot = node
+        self.cache.header.update({'dataRootRID': node.rid})
+
+        for (key, data) in removed:
+            if self.needsOldData(key):
+                self.indexes.remove(key, data)
+                self.freeValues(data)
+        self.opStep(max(1, len(removed)))
+
+    def needsRecords(self, low, high):
+        """True if removing the records of keys low..high (None --> unbounded,
+           high excluded) must see them"""
+        return (self.needsOldData(-1) and (low == None or low < 0)) or \
+            (self.needsOldData(0) and (high == None or high > 0))
+
+    def dropSubtree(self, refID, level, low, high, removed):
+        """frees the subtree at refID holding keys low..high (high excluded).
+           a data node is only read if its records are needed (or latched)"""
+        if level == 0 and not self.concurrent and not self.needsRecords(low, high):
+            self.cache.pager.dropBlock(refID)
+            return
+        node = self.cache.pager.node(refID, 'X')
+        if level == 0:
+            removed.extend(node.slots)
+        else:
+            bounds = [low] + list(node.keys) + [high]
+            for i in range(len(node.link)):
+                self.dropSubtree(node.link[i], level - 1, bounds[i], bounds[i + 1], removed)
+        self.cache.pager.delNode(node)
+
+    def cutRange(self, node, level, lo, hi, low, high, removed):
+        """cuts the keys lo..hi out of the subtree at node (keys low..high) -->
+           (what may be short: None, 'node' or the 'left'/'right' spine, a split)"""
+        if level == 0:
+            first = 0 if lo == None else node.slotIndex(lo)
+            last = len(node.slots)
+            if hi != None:
+                last = node.slotIndex(hi)
+                if last < len(node.slots) and node.slots[last][0] == hi:
+                    last += 1
+            if first >= last:
+                return (None, None)
+            removed.extend(node.slots[first:last])
+            del node.slots[first:last]
+            self.cache.pager.updateNode(node)
+            return ('node', None)
+
+        self.cache.lockNode(node)
+        bounds = [low] + list(node.keys) + [high]
+        first = 0 if lo == None else bisect.bisect_right(node.keys, lo)
+        last = len(node.keys) if hi == None else bisect.bisect_right(node.keys, hi)
+        inside = [i for i in range(first, last + 1)
+                  if (lo == None or (bounds[i] != None and bounds[i] >= lo)) and
+                  (hi == None or (bounds[i + 1] != None and bounds[i + 1] <= hi))]
+        if len(inside) == len(node.link):   # all goes --> the first data node stays
+            inside.pop(0)
+        parts = [i for i in range(first, last + 1) if i not in inside]
+
+        # subtrees inside the range go, the (at most two) cut ones end up side by side
+        if len(inside) > 0:
+            for i in inside:
+                self.dropSubtree(node.link[i], level - 1, bounds[i], bounds[i + 1], removed)
+            if inside[0] > 0:
+                del node.keys[inside[0] - 1:inside[-1]]
+            else:
+                del node.keys[0:inside[-1] + 1]
+            del node.link[inside[0]:inside[-1] + 1]
+            parts = [i if i < inside[0] else i - len(inside) for i in parts]
+        bads = []
+        for i in reversed(parts):
+            child = self.cache.pager.node(node.link[i], 'X')
+            (bad, split) = self.cutRange(child, level - 1, lo, hi, low if i == 0 else node.keys[i - 1],
+                                         node.keys[i] if i < len(node.keys) else high, removed)
+            if split != None:
+                node.keys.insert(i, split[0])
+                node.link.insert(i + 1, split[1].rid)
+                bads = [(pos + 1, down) for (pos, down) in bads]
+            if bad != None:
+                bads.insert(0, (i, bad))
+
+        status = 'node' if len(inside) > 0 else None
+        if len(bads) == 2:      # the two edges of the cut meet here
+            status = self.fixChild(node, bads[0][0], self.mend(node, bads[0][0], bads[0][1], bads[1][1]))
+        elif len(bads) == 1:
+            status = self.fixChild(node, *bads[0])
+        return self.settled(node, status)
+
+    def cutList(self, node, level, keys, removed):
+        """removes the sorted keys from the subtree at node --> as cutRange"""
+        if level == 0:
+            count = len(removed)
+            for key in keys:
+                i = node.slotIndex(key)
+                if i < len(node.slots) and node.slots[i][0] == key:
+                    removed.append(node.slots.pop(i))
+            if len(removed) == count:
+                return (None, None)
+            self.cache.pager.updateNode(node)
+            return ('node', None)
+
+        self.cache.lockNode(node)
+        groups = dict()     # child --> its keys
+        for key in keys:
+            groups.setdefault(bisect.bisect_right(node.keys, key), []).append(key)
+        bads = []
+        for i in sorted(groups, reverse=True):
+            child = self.cache.pager.node(node.link[i], 'X')
+            (bad, split) = self.cutList(child, level - 1, groups[i], removed)
+            if split != None:
+                node.keys.insert(i, split[0])
+                node.link.insert(i + 1, split[1].rid)
+                bads = [(pos + 1, down) for (pos, down) in bads]
+            if bad != None:
+                bads.insert(0, (i, bad))
+        status = None
+        for (i, bad) in reversed(bads):
+            status = self.fixChild(node, i, bad)
+        return self.settled(node, status)
+
+    def settled(self, node, status):
+        """index node done with its children --> (status, split) for its parent"""
+        split = None
+        if node.fill() > node.maxKey:   # delta-coded pivots: a longer one moved up
+            split = node.splitOff(node.keys, node.link)
+            status = None
+        elif status != None:
+            self.cache.pager.updateNode(node)
+        self.cache.unlockNode(node)
+        return (status, split)
+
+    def fixChild(self, parent, index, bad):
+        """mends child index of parent with its siblings (bad: what may be short in it)
+           --> 'node', or the spine still short if the child has no siblings"""
+        index = min(index, len(parent.link) - 1)   # merged away to the left
+        while bad != None and len(parent.link) > 1:
+            if index + 1 < len(parent.link):
+                bad = self.mend(parent, index, bad, None)
+            else:
+                index -= 1
+                bad = self.mend(parent, index, None, bad)
+        if bad == None:
+            return 'node'
+        return 'right' if bad == 'right' else 'left'    # one child: both spines
+
+    def mend(self, parent, index, badA, badB):
+        """children index, index + 1 of parent go together in one (briefly overfull)
+           node, the short nodes below them are mended in it (badA/badB: None,
+           'node', the 'left' or 'right' spine), then it splits in two again if it
+           must --> None, or what may be short in the node left at index"""
+        nodeA = self.cache.pager.node(parent.link[index], 'X')
+        nodeB = self.cache.pager.node(parent.link[index + 1], 'X')
+        pageCodec = self.cache.header['codec']
+
+        if not hasattr(nodeA, 'keys'):
+            slots = nodeA.slots + nodeB.slots
+            if pageCodec.slotsSize(slots) <= nodeA.maxKey:
+                nodeA.slots = slots
+                nodeA.next = nodeB.next
+                del parent.keys[index]
+                del parent.link[index + 1]
+                self.cache.pager.delNode(nodeB)
+                self.cache.pager.updateNode(nodeA)
+                return 'node' if nodeA.fill() < nodeA.minKey else None
+            half = nodeA.fairSplit(slots)
+            nodeA.slots = slots[0:half]
+            nodeB.slots = slots[half:]
+            parent.keys[index] = nodeB.slots[0][0]
+            self.cache.pager.updateNode(nodeA)
+            self.cache.pager.updateNode(nodeB)
+            return None
+
+        self.cache.lockNode(nodeA)
+        numA = len(nodeA.link)
+        nodeA.keys = list(nodeA.keys) + [parent.keys[index]] + list(nodeB.keys)
+        nodeA.link = nodeA.link + nodeB.link
+        fixes = []      # (child of nodeA, what may be short in it)
+        if badA in ['left', 'right']:
+            fixes.append((0 if badA == 'left' else numA - 1, badA))
+        if badB in ['left', 'right']:
+            fixes.append((numA if badB == 'left' else len(nodeA.link) - 1, badB))
+        status = 'node'
+        if len(fixes) == 2 and fixes[0][0] == numA - 1 and fixes[1][0] == numA:
+            status = self.fixChild(nodeA, numA - 1,
+                                   self.mend(nodeA, numA - 1, fixes[0][1], fixes[1][1]))
+        else:
+            for (i, bad) in reversed(fixes):
+                status = self.fixChild(nodeA, i, bad)
+
+        keys, links = nodeA.keys, nodeA.link
+        if pageCodec.indexFill(keys) <= nodeA.maxKey:
+            del parent.keys[index]
+            del parent.link[index + 1]
+            self.cache.pager.delNode(nodeB)
+            self.cache.pager.updateNode(nodeA)
+            self.cache.unlockNode(nodeA)
+            if status in ['left', 'right']:
+                return status
+            return 'node' if nodeA.fill() < nodeA.minKey else None
+        half = nodeA.fairSplit(keys)
+        parent.keys[index] = keys[half]
+        nodeA.keys, nodeA.link = keys[0:half], links[0:half + 1]
+        nodeB.keys, nodeB.link = keys[half + 1:], links[half + 1:]
+        self.cache.pager.updateNode(nodeA)
+        self.cache.pager.updateNode(nodeB)
+        self.cache.unlockNode(nodeA)
+        return None
+
+    def bulkLoad(self, entries, fillFactor=0.9):
+        """builds the tree bottom-up from (key, field, ..., field) entries.
+           entries already in the db are kept unless overwritten by a key.
+           the tree is built in a fresh file that takes the name of the db file
+           in a single rename (see vacuum) --> a crash leaves the old db or the
+           loaded one, never a half rewritten file. 'busy' while snapshots are live"""
+        with self.cache.writeLatch:
+            if len(self.cache.header['snapshots']) > 0:
+                return 'busy'
+            try:
+                return self.rebuildFile(fillFactor, list(entries))
+            finally:
+                self.cache.pager.releasePath()
+
+    def loadFresh(self, entries, fillFactor):
+        """bulkLoad on a new db file nothing else reads yet: the tree is
+           written in place, not logged --> ends in a checkpoint"""
+        self.commit()
+        pageCodec = self.cache.header['codec']
+        # gather everything --> later duplicates overwrite earlier ones
+        records = dict(self.ReadOut())
+        for keyDat in entries:
+            records.update({keyDat[0]: pageCodec.fitRecord(keyDat[0], tuple(keyDat[1:]))})
+        if len(records) == 0:
+            return None
+
+        # long VAR values get new overflow chains --> size them as placeholders for now
+        overflowCount = 0
+        for key, data in records.items():
+            if pageCodec.canSpill(key):
+                data = [str(value) if isinstance(value, dbcodec.spilled) else value
+                        for value in data]
+                for i in pageCodec.spillFields(key, data):
+                    size = dbcodec.textSize(data[i])
+                    data[i] = dbcodec.spilled(data[i], -1, size)
+                    overflowCount += pageCodec.overflowPages(size)
+                records[key] = tuple(data)
+        slots = sorted(records.items())
+
+        # plan every level first: blocks are handed out in write order
+        # (delta-coded keys are weighed by their distance to the key before)
+        slotSizes = dict(zip([slot[0] for slot in slots], pageCodec.slotSizes(slots)))
+        leafGroups = packGroups(slots, fillCount(self.dataMinKey, self.dataMaxKey, fillFactor),
+                                self.dataMinKey, self.dataMaxKey,
+                                lambda slot: slotSizes[slot[0]])
+        indexSize = fillCount(self.minKey, self.maxKey, fillFactor)
+        levels = []     # index levels bottom-up, groups of (lowKey, rid)
+        children = [(leafGroups[i][0][0], i) for i in range(len(leafGroups))]
+        refID = len(leafGroups)
+        while len(children) > 1:
+            if self.keyFormat == keyDelta:     # fill in bytes: link + key distance
+                keySizes = dict(zip([child[1] for child in children], pageCodec.indexSizes(
+                    [child[0] for child in children])))
+                groups = packGroups(children, indexSize, self.minKey, self.maxKey,
+                                    lambda child: keySizes[child[1]])
+            else:   # n children hold n - 1 keys
+                groups = packGroups(children, indexSize + 1,
+                                    self.minKey + 1, self.maxKey + 1)
+            levels.append(groups)
+            children = [(groups[i][0][0], refID + i)
+                        for i in range(len(groups))]
+            refID += len(groups)
+        missing = refID + overflowCount - self.cache.header['blockCount']
+        if missing > 0:
+            if not self.cache.pager.growFile(missing):
+                return 'full'
+
+        # start over on an empty file, overflow chains and dictionary pages go
+        # behind the tree blocks
+        if self.cache.header['writer'] != None:
+            self.cache.header['writer'].drain()
+        self.cache.clear()
+        self.cache.header['space'].reset(refID)
+        self.cache.header.update({'dictRID': -1})
+        for column in pageCodec.dicts.values():
+            column.dirty = True
+        for group in leafGroups:
+            for i in range(len(group)):
+                key, data = group[i]
+                if overflowCount > 0 and pageCodec.canSpill(key):
+                    group[i] = (key, tuple([self.cache.pager.writeOverflow(value)
+                                            if isinstance(value, dbcodec.spilled) else value
+                                            for value in data]))
+
+        # one sequential pass: chained leaves, then index levels
+        for i in range(len(leafGroups)):
+            leaf = DataNode(self.dataMinKey, self.dataMaxKey, i, self.cache)
+            leaf.slots = leafGroups[i]
+            if i < len(leafGroups) - 1:
+                leaf.next = i + 1
+            self.cache.pager.writeNode(leaf)
+        refID = len(leafGroups)
+        for groups in levels:
+            for group in groups:
+                node = IndexNode(self.minKey, self.maxKey, None,
+                                 [child[1] for child in group], refID, self.cache)
+                node.keys = [child[0] for child in group[1:]]
+                self.cache.pager.writeNode(node)
+                refID += 1
+
+        # hook up the new roots
+        self.dataRoot = self.cache.pager.node(0)
+        if len(levels) > 0:
+            self.root = self.cache.pager.node(refID - 1)
+        else:
+            self.root = None
+        self.dataRootRef = self.dataRoot.rid
+        self.rootRef = refID - 1
+        self.cache.header.update({'rootRID': refID - 1})
+        self.cache.header.update({'dataRootRID': self.dataRoot.rid})
+        self.checkpoint()
+        self.indexes.rebuild(slots)
+
+    def vacuum(self, fillFactor=0.9):
+        """rewrites the db into a fresh file: data nodes packed to fillFactor in
+           key order, the index nodes right behind them, no free blocks left.
+           the fresh file takes the name of the old one in a single rename -->
+           a crash leaves one or the other. 'busy' while snapshots are live"""
+        with self.cache.writeLatch:     # readers carry on until the swap
+            if len(self.cache.header['snapshots']) > 0:
+                return 'busy'
+            try:
+                return self.rebuildFile(fillFactor, [])
+            finally:
+                self.cache.pager.releasePath()
+
+    def rebuildFile(self, fillFactor, entries):
+        """the records of the db and entries (entries win) into a fresh file,
+           swapped in for the db file"""
+        self.checkpoint()
+        name = self.file.name
+        freshFile = open(name + '.vacuum', 'wb+')
+        # same page layout (a legacy file gets the growable header), grown
+        # block by block --> it ends at the live size
+        fresh = BPlusTree(1, freshFile, self.catalog, blockSize=self.blockSize, extent=1)
+        fresh.version = max(self.version, fixedVersion)
+        fresh.keyFormat = self.keyFormat
+        (fresh.minKey, fresh.maxKey, fresh.dataMinKey, fresh.dataMaxKey) = (
+            self.minKey, self.maxKey, self.dataMinKey, self.dataMaxKey)
+        fresh.newDB()
+        if fresh.loadFresh([(key,) + data for key, data in self.rangeScan()] + entries,
+                           fillFactor) == 'full':
+            freshFile.close()
+            os.remove(name + '.vacuum')
+            return 'full'
+        fresh.cache.header.update({'extent': self.extent})
+        fresh.checkpoint()
+        os.fsync(freshFile.fileno())
+        if len(entries) > 0:    # new records --> the indexes follow the fresh file
+            self.indexes.rebuild(fresh.rangeScan())
+        freshFile.close()
+        if os.path.exists(fresh.indexFile()):   # its own adjacency, not needed
+            os.remove(fresh.indexFile())
+        # records keep their keys (new ones are in the rebuild) --> the indexes
+        # hold for the fresh file
+        self.indexes.save(self.indexFile(), fresh.indexStamp())
+
+        if self.concurrent:     # no new descents, the readers in the tree finish
+            root = self.cache.pager.node(self.rootRID(), 'X')
+            while True:
+                with self.cache.lock:
+                    busy = len(self.cache.loading) > 0 or any(
+                        [node.inUse for node in self.cache.nodes.values() if node is not root])
+                if not busy:
+                    break
+                time.sleep(0.001)
+        # everything is in the old file after the checkpoint --> its log goes
+        self.closeWriter()
+        if self.cache.header['log'] != None:
+            self.cache.header['log'].close()
+            self.cache.header['log'] = None
+        if os.path.exists(self.logFile()):
+            os.remove(self.logFile())
+        if self.cache.header['mmap'] != None:
+            unmapFile(self.cache.header)
+        self.file.close()
+        os.replace(name + '.vacuum', name)
+        self.file = open(name, 'rb+')
+        self.readDB()
 
     def printArray(self):
-        global cache
-        house = cache.header
-        self.blockArray = house['blockArray']
+        house = self.cache.header
+        self.space = house['space']
         self.blockCount = house['blockCount']
 
         print("Tree Used vs. Free Dump")
@@ -355,7 +1702,7 @@ class BPlusTree:
             print(i % 10, " ", end='')
         print()
         for i in range(self.blockCount):
-            print(self.blockArray[i], " ", end='')
+            print(1 if self.space.isUsed(i) else 0, " ", end='')
         print("\n", flush=True)
 
     def recDump(self, cur_node, tabs):
@@ -365,9 +1712,9 @@ class BPlusTree:
 
         cur_node.printNode(tabs)
         print("")
-        for nextLink in cur_node.link:
-            if nextLink != None:
-                self.recDump(RID().node(nextLink), tabs + "    ")
+        if hasattr(cur_node, 'keys'):
+            for nextLink in cur_node.link:
+                self.recDump(self.cache.pager.node(nextLink), tabs + "    ")
 
     def dump(self):
         """Prints traversal of tree"""
@@ -380,6 +1727,7 @@ class BPlusTree:
         """Prints leaf-traversal of tree (left to right)"""
         print("Leaves of B+Tree")
         node = self.dataRoot
+        ring = dbcache.ring(self.cache.header['readahead'], node.rid)
         while True:
             node.printNode('    ')
             if node.next != -1:
@@ -387,20 +1735,11 @@ class BPlusTree:
             else:
                 print('.')
                 break
-            node = RID().node(node.next)
+            node = self.cache.pager.scanNode(node.next, ring)
 
     def ReadOut(self):
         """Get list of all key values in DB"""
-        readout = []
-        node = self.dataRoot
-        while True:
-            for val in node.slots:
-                readout.append(val)
-            if node.next == -1:
-                break
-            else:
-                node = RID().node(node.next)
-        return readout
+        return list(self.rangeScan())
 
     def isEmpty(self):
         """return True if DB empty, return False o.w."""
@@ -411,15 +1750,45 @@ class BPlusTree:
 
     def cacheOut(self):
         """commit all dirty nodes to file"""
-        global cache
-        writeHeader(self.file, cache.header)
-        for rid in cache.nodes.keys():
-            if cache.nodes[rid].dirty == True:
-                if hasattr(cache.nodes[rid], 'keys'):
-                    RID().writeIndexNode(self.file, cache.nodes[rid])
+        self.checkpoint()
+        self.closeWriter()
+        self.indexes.save(self.indexFile(), self.indexStamp())
+        self.cache.header.update({'indexFile': self.indexFile()})
+
+    def checkpoint(self):
+        """write every dirty node and the header to the db file,
+           the redo log starts over once they are on disk"""
+        with self.cache.writeLatch:
+            self.writeCheckpoint()
+        self.checkpointed = time.monotonic()
+
+    def writeCheckpoint(self):
+        self.commit()
+        self.cache.pager.writeDicts()
+        with self.cache.lock:   # readers may load nodes meanwhile
+            dirtyNodes = [node for node in self.cache.nodes.values() if node.dirty == True]
+        with self.cache.pager.blockIO():
+            if len(dirtyNodes) > 0:     # the index file stops matching before the header moves on
+                staleIndexes(self.cache.header)
+            if self.cache.header['writer'] != None:  # older images first
+                self.cache.header['writer'].drain()
+            writeHeader(self.file, self.cache.header)
+            for node in dirtyNodes:
+                if hasattr(node, 'keys'):
+                    self.cache.pager.writeIndexNode(self.file, node)
                 else:
-                    RID().writeDataNode(self.file, cache.nodes[rid])
-        pass
+                    self.cache.pager.writeDataNode(self.file, node)
+        with self.cache.lock:
+            for node in dirtyNodes:
+                node.dirty = False
+            self.cache.dirty = set()
+        with self.cache.pager.blockIO():
+            if self.cache.header['mmap'] != None:
+                self.cache.header['mmap'].flush()
+            self.file.flush()
+            if self.cache.header['log'] != None:
+                os.fsync(self.file.fileno())
+                self.cache.header['log'].reset(self.logState())
 
 #####
 #######
@@ -429,216 +1798,429 @@ class BPlusTree:
 # Define RID class
 
 
-class RID(BPlusTree):
-    """Reference ID class"""
-
-    def __init__(self): pass
+class RID():
+    """Reference ID class: block and node storage of one tree, made once
+       with its buffer pool (cache.pager)"""
+
+    def __init__(self, cache):
+        self.cache = cache      # buffer pool (and header) of the tree the blocks belong to
+
+    def growFile(self, numBlocks=1):
+        """extend db by whole extents covering numBlocks, return False if it can't grow"""
+        house = self.cache.header
+        if house['version'] == 0:   # original layout: map sits before block0
+            return False
+        with self.blockIO():
+            extents = (numBlocks + house['extent'] - 1) // house['extent']
+            newCount = house['blockCount'] + extents * house['extent']
+
+            remap = house['mmap'] != None
+            if remap:
+                unmapFile(house)
+            # cut off the old map, then zero-extend: new blocks read back empty
+            dbfile = house['file']
+            dbfile.flush()
+            dbfile.truncate(house['block0'] + house['blockCount'] * house['blockSize'])
+            dbfile.truncate(house['block0'] + newCount * house['blockSize'])
+
+            house['space'].grow(newCount)
+            house['blockCount'] = newCount
+            if house['bufferSize'] == None:
+                # keep default cache size at 10% of DB size
+                self.cache.setMaxCount(max(2, newCount // 10))
+            if remap:
+                mapFile(house)
+        return True
+
+    def reserveBlocks(self, numBlocks):
+        """make sure numBlocks blocks are free, growing the file if needed"""
+        freeCount = self.cache.header['space'].freeCount
+        if freeCount >= numBlocks:
+            return True
+        return self.growFile(numBlocks - freeCount)
 
-    def findFreeBlock(self):
-        global cache
-        refID = cache.header['arrayPos']
-        while cache.header['blockArray'][refID] > 0:
-            refID = (refID + 1) % cache.header['blockCount']
-            if refID == cache.header['arrayPos']:  # no room --> return nothing
-                return None
-        cache.header['arrayPos'] = refID
-        return refID
+    def findFreeBlock(self, near=None):
+        """claims a free block (next to block near if possible), returns its refID"""
+        if not self.reserveBlocks(1):   # no room --> return nothing
+            return None
+        return self.cache.header['space'].allocate(near)
 
     def isNodeInCache(self, refID):
-        global cache
-        if refID in cache.rids:
+        if refID in self.cache.rids:
             return 1
         else:
             return 0
 
     def cacheHandle(self, node, *flags):
-        global cache
-        oldNode = cache.insNode(node, *flags)
-        if oldNode != None:
-            if oldNode.dirty == True:
-                self.writeNode(oldNode)
-
-    def node(self, refID):
-        """returns node with given refID"""
-        global cache
+        # evicted node is written back before another thread can miss on it
+        with self.cache.lock:
+            if len(flags) > 0 and flags[0] and self.cache.header['log'] != None:
+                self.cache.held.add(node.rid)    # stays in the buffer until committed
+            oldNode = self.cache.insNode(node, *flags)
+            if oldNode != None:
+                if oldNode.dirty == True:
+                    self.writeBack(oldNode)
+
+    def writeBack(self, node):
+        """dirty node leaving the buffer --> background writer, or straight to the db file"""
+        if self.cache.header['writer'] != None:
+            self.cache.header['writer'].put(node.rid, bytes(self.encodeNode(node)))
+        else:
+            self.writeNode(node)
+
+    def trickle(self, count):
+        """hand the count lowest dirty nodes (by rid) to the background writer,
+           so evictions mostly find clean nodes"""
+        with self.cache.lock:
+            rids = heapq.nsmallest(count, [rid for rid in self.cache.dirty
+                                           if not self.cache.isLocked(rid)])
+            for rid in rids:
+                self.cache.header['writer'].put(rid, bytes(self.encodeNode(self.cache.nodes[rid])))
+                self.cache.nodes[rid].dirty = False
+                self.cache.dirty.discard(rid)
+
+    def blockIO(self):
+        """lock for db file/map access, shared with the background writer"""
+        if self.cache.header['writer'] != None:
+            return self.cache.header['writer'].lock
+        if self.cache.header['concurrent'] or len(self.cache.header['snapshots']) > 0:
+            return self.cache.ioLock
+        return contextlib.nullcontext()
+
+    def node(self, refID, mode=None):
+        """returns node with given refID.
+           concurrent tree: mode 'S'/'X' pins and latches it until unlatch"""
+        if self.cache.header['concurrent']:
+            return self.sharedNode(refID, mode)
         # check cache first
-        if refID in cache.rids:
-            return cache.getNode(refID)
+        if refID in self.cache.rids:
+            return self.cache.getNode(refID)
         # not in cache --> get from file and throw to cache
         nodeFromFile = self.readNode(refID)
-        self.cacheHandle(nodeFromFile, False, False)
+        self.cacheHandle(nodeFromFile, False, 0)
         return nodeFromFile
 
-    def newIndexNode(self, key, links):
+    def sharedNode(self, refID, mode):
+        """node of a concurrent tree: a block is read by the first thread missing it,
+           the others wait for that node --> one copy of every node in the buffer"""
+        pool = self.cache
+        node, loading = None, None
+        while node == None:
+            with pool.lock:
+                if refID in pool.rids:
+                    node = pool.getNode(refID)
+                    if mode != None:
+                        pool.lockNode(node)
+                elif refID not in pool.loading:     # first to miss --> read it here
+                    loading = threading.Event()
+                    pool.loading.update({refID: loading})
+                    break
+                else:
+                    waitFor = pool.loading[refID]
+            if node == None:
+                waitFor.wait()
+        if loading != None:
+            try:
+                node = self.readNode(refID)
+                with pool.lock:
+                    self.cacheHandle(node, False, 0)
+                    if mode != None:
+                        pool.lockNode(node)
+            finally:
+                with pool.lock:
+                    pool.loading.pop(refID)
+                loading.set()
+        if mode != None:
+            node.latch.acquire(mode)
+            if mode == 'X':
+                pool.writePath.append(node)
+        return node
+
+    def unlatch(self, node, mode):
+        """drop a latch (and pin) taken by node(refID, mode)"""
+        node.latch.release(mode)
+        self.cache.unlockNode(node)
+
+    def releasePath(self, keep=None):
+        """drop the writer's 'X' latches, but the one on node keep"""
+        pool = self.cache
+        path = pool.writePath
+        pool.writePath = [node for node in path if node is keep]
+        for node in path:
+            if node is not keep:
+                self.unlatch(node, 'X')
+
+    def newIndexNode(self, key, links, near=None):
         """create new index-node to db file on block with refID"""
-        global cache
-        refID = self.findFreeBlock()
+        refID = self.findFreeBlock(near)
         if refID == None:
             return None
         # if you're here, there is room --> return new node
-        newNode = IndexNode(
-            cache.header['minKey'], cache.header['maxKey'], key, links, refID)
-        cache.header['blockArray'][refID] = 1
-        cache.header['freeSlots'] -= 1
-        self.cacheHandle(newNode, True, False)
+        newNode = IndexNode(self.cache.header['minKey'], self.cache.header['maxKey'],
+                            key, links, refID, self.cache)
+        self.cacheHandle(newNode, True, 0)
         return newNode
 
-    def newDataNode(self):
+    def newDataNode(self, near=None):
         """create new data-node to db file on block with refID"""
-        global cache
-        refID = self.findFreeBlock()
+        refID = self.findFreeBlock(near)
         if refID == None:
             return None
         # if you're here, there is room --> return new node
-        newNode = DataNode(
-            cache.header['minKey'], cache.header['maxKey'], refID)
-        cache.header['blockArray'][refID] = 1
-        cache.header['freeSlots'] -= 1
-        self.cacheHandle(newNode, True, False)
+        newNode = DataNode(self.cache.header['dataMinKey'], self.cache.header['dataMaxKey'],
+                           refID, self.cache)
+        self.cacheHandle(newNode, True, 0)
         return newNode
 
     def updateNode(self, node):
         """update node to db file on block using node.rid"""
-        global cache
         self.cacheHandle(node, True)
 
     def writeNode(self, node):
-        global cache
         # if node.keys exists --> node is an index-node, o.w. node is data-node
         if hasattr(node, 'keys'):
-            self.writeIndexNode(cache.header['file'], node)
+            self.writeIndexNode(self.cache.header['file'], node)
         else:
-            self.writeDataNode(cache.header['file'], node)
+            self.writeDataNode(self.cache.header['file'], node)
+
+    def encodeNode(self, node):
+        """block image of node"""
+        if hasattr(node, 'keys'):
+            return self.cache.header['codec'].encodeIndex(node.rid, node.keys, node.link)
+        return self.cache.header['codec'].encodeData(node.rid, node.next, node.slots)
 
     def writeIndexNode(self, dbfile, node):
         """writes index-node to file"""
-        global cache
-        nodeSize = 0
-        dbfile.seek(cache.header['block0'] +
-                    node.rid * cache.header['blockSize'])
-        dbfile.write(struct.pack('c', bytes('I', 'ascii')))
-        nodeSize += struct.calcsize('c')
-        dbfile.write(struct.pack('I', node.rid))
-        nodeSize += struct.calcsize('I')
-        dbfile.write(struct.pack('h', len(node.keys)))
-        nodeSize += struct.calcsize('h')
-        dbfile.write(struct.pack('h', len(node.link)))
-        nodeSize += struct.calcsize('h')
-        for key in node.keys:
-            dbfile.write(struct.pack('q', key))
-            nodeSize += struct.calcsize('q')
-        for refid in node.link:
-            dbfile.write(struct.pack('q', refid))
-            nodeSize += struct.calcsize('q')
-        for _ in range(cache.header['blockSize'] - nodeSize):
-            dbfile.write(struct.pack('b', 0))
+        blockPos = self.cache.header['block0'] + node.rid * self.cache.header['blockSize']
+        with self.blockIO():
+            saveVersion(self.cache.header, node.rid)
+            staleIndexes(self.cache.header)
+            if self.cache.header['mmap'] != None:    # pack straight into the map
+                self.cache.header['codec'].encodeIndex(
+                    node.rid, node.keys, node.link, self.cache.header['mmap'], blockPos)
+            else:
+                writeAt(self.cache.header, blockPos, self.cache.header['codec'].encodeIndex(
+                    node.rid, node.keys, node.link))
 
     def writeDataNode(self, dbfile, node):
         """writes data-node to file"""
-        global cache
-        nodeSize = 0
-        dbfile.seek(cache.header['block0'] +
-                    node.rid * cache.header['blockSize'])
-        # write data node header
-        dbfile.write(struct.pack('c', bytes('D', 'ascii')))
-        dbfile.write(struct.pack('h', len(node.slots)))
-        dbfile.write(struct.pack('q', node.next))
-        dbfile.write(struct.pack('I', node.rid))
-        nodeSize += struct.calcsize('c') + struct.calcsize('h') + \
-            struct.calcsize('q') + struct.calcsize('I')
-        # write data node keys and values
-        for slot in node.slots:
-            dbfile.write(struct.pack('q', slot[0]))
-            nodeSize += struct.calcsize('q')
-        for slot in node.slots:
-            if slot[0] >= 0:     # positive key ==> node
-                dataCAT = cache.header['catalog']['node'][1:]
-            else:           # negative key ==> edge
-                dataCAT = cache.header['catalog']['edge'][1:]
-            data = slot[1]
-            for i in range(len(dataCAT)):
-                if dataCAT[i][1] == 'Int':
-                    dbfile.write(struct.pack('q', data[i]))
-                    nodeSize += struct.calcsize('q')
-
-                if dataCAT[i][1] == 'V20':
-                    dbfile.write(data[i].encode('ascii'))
-                    filler = [0 for _ in range(20 - len(data[i]))]
-                    dbfile.write(bytearray(filler))
-                    nodeSize += 20
-        # write filler to reach preset blockSize bytes
-        for _ in range(cache.header['blockSize'] - nodeSize):
-            dbfile.write(struct.pack('b', 0))
+        blockPos = self.cache.header['block0'] + node.rid * self.cache.header['blockSize']
+        with self.blockIO():
+            saveVersion(self.cache.header, node.rid)
+            staleIndexes(self.cache.header)
+            if self.cache.header['mmap'] != None:    # pack straight into the map
+                self.cache.header['codec'].encodeData(
+                    node.rid, node.next, node.slots, self.cache.header['mmap'], blockPos)
+            else:
+                writeAt(self.cache.header, blockPos, self.cache.header['codec'].encodeData(
+                    node.rid, node.next, node.slots))
+
+    def readBlock(self, refID):
+        """raw bytes of block refID"""
+        if self.cache.header['log'] != None and refID in self.cache.header['log'].pending:
+            return self.cache.header['log'].pending[refID]
+        blockPos = self.cache.header['block0'] + refID * self.cache.header['blockSize']
+        with self.blockIO():
+            if self.cache.header['writer'] != None:  # not on disk yet
+                block = self.cache.header['writer'].get(refID)
+                if block != None:
+                    return block
+            if self.cache.header['view'] != None:    # decode from the mapped block
+                block = self.cache.header['view'][blockPos:blockPos +
+                                                  self.cache.header['blockSize']]
+                if self.cache.header['concurrent']:  # the map may move when the file grows
+                    block = bytes(block)
+                return block
+            if not self.cache.header['concurrent']:
+                dbfile = self.cache.header['file']
+                dbfile.seek(blockPos)
+                return dbfile.read(self.cache.header['blockSize'])
+        # concurrent tree --> reads run side by side (writes are flushed)
+        return os.pread(self.cache.header['file'].fileno(), self.cache.header['blockSize'],
+                        blockPos)
+
+    def readRun(self, refID, count):
+        """raw bytes of count blocks from refID on (as far as the file goes),
+           in one read --> rid: block"""
+        house = self.cache.header
+        size = house['blockSize']
+        count = min(count, house['blockCount'] - refID)
+        blockPos = house['block0'] + refID * size
+        with self.blockIO():
+            if house['view'] != None:
+                run = bytes(house['view'][blockPos:blockPos + count * size])
+            else:
+                house['file'].seek(blockPos)
+                run = house['file'].read(count * size)
+            blocks = dict()
+            for i in range(len(run) // size):
+                blocks.update({refID + i: run[i * size:(i + 1) * size]})
+            if house['writer'] != None:  # not on disk yet
+                for rid in blocks:
+                    block = house['writer'].get(rid)
+                    if block != None:
+                        blocks.update({rid: block})
+        if house['log'] != None:
+            for rid in blocks:
+                if rid in house['log'].pending:
+                    blocks.update({rid: house['log'].pending[rid]})
+        return blocks
+
+    def scanNode(self, refID, ring):
+        """data node refID for a scan along the chain: from the buffer if there,
+           else out of ring and not put in the buffer. a scan going on to the next
+           block reads the next ring.size blocks at once"""
+        if ring.size == 0 or self.cache.header['concurrent']:
+            return self.node(refID)
+        node = self.scanBlock(refID, ring)
+        if not hasattr(node, 'rid'):
+            node = self.blockNode(node, refID)
+        return node
+
+    def scanBlock(self, refID, ring):
+        """as scanNode, but a block not in the buffer is handed out undecoded"""
+        if refID in self.cache.rids:
+            block = self.cache.getNode(refID)
+        else:
+            block = ring.get(refID, self.cache.changes)
+            if block == None and ring.size > 0 and ring.sequential(refID):
+                # nodes in the buffer may be newer than their blocks --> not kept
+                blocks = self.readRun(refID, ring.size)
+                ring.fill({rid: blocks[rid] for rid in blocks if rid not in self.cache.rids},
+                          self.cache.changes)
+                block = ring.blocks.get(refID)
+            if block == None:
+                block = self.readBlock(refID)
+        ring.last = refID
+        return block
+
+    def writeBlock(self, refID, block):
+        """raw bytes of block refID to the db file"""
+        with self.blockIO():
+            putBlock(self.cache.header, refID, block)
+
+    def storeBlock(self, refID, pack):
+        """block kept outside the buffer, packed by pack(buffer, offset) -->
+           straight to the db file, or held back until the redo log has it"""
+        blockPos = self.cache.header['block0'] + refID * self.cache.header['blockSize']
+        with self.blockIO():
+            if self.cache.header['writer'] != None:  # block reused --> queued image is stale
+                self.cache.header['writer'].drop(refID)
+            if self.cache.header['log'] != None:
+                self.cache.header['log'].pending.update({refID: bytes(pack(None, 0))})
+                return
+            saveVersion(self.cache.header, refID)
+            staleIndexes(self.cache.header)
+            if self.cache.header['mmap'] != None:
+                pack(self.cache.header['mmap'], blockPos)
+            else:
+                writeAt(self.cache.header, blockPos, pack(None, 0))
+
+    def writeOverflow(self, value):
+        """store the text of value on a chain of free blocks --> spilled value"""
+        pageCodec = self.cache.header['codec']
+        text = value.encode('utf-8')
+        rids = [self.cache.header['space'].allocate()]
+        for _ in range(pageCodec.overflowPages(len(text)) - 1):
+            rids.append(self.cache.header['space'].allocate(rids[-1]))
+        rids.append(-1)
+        for i in range(len(rids) - 1):
+            piece = text[i * pageCodec.overflowSize:(i + 1) * pageCodec.overflowSize]
+            self.storeBlock(rids[i], lambda buffer, offset: pageCodec.encodeOverflow(
+                rids[i + 1], piece, buffer, offset))
+        return dbcodec.spilled(value, rids[0], len(text))
+
+    def readOverflow(self, refID, size):
+        """text stored on the overflow chain starting at block refID"""
+        pieces = []
+        nextRID = refID
+        while nextRID != -1:
+            nextRID, piece = self.cache.header['codec'].decodeOverflow(
+                self.readBlock(nextRID))
+            pieces.append(piece)
+        return dbcodec.spilled(str(b''.join(pieces)[0:size], 'utf-8'), refID, size)
+
+    def freeOverflow(self, value):
+        """hand the overflow chain of a spilled value back to the free pool"""
+        nextRID = value.rid
+        while nextRID != -1:
+            refID = nextRID
+            nextRID = self.cache.header['codec'].decodeOverflow(self.readBlock(refID))[0]
+            self.cache.header['space'].release(refID)
+
+    def writeDicts(self):
+        """rewrite the dictionary pages if any dictionary gained values"""
+        pageCodec = self.cache.header['codec']
+        if not any([column.dirty for column in pageCodec.dicts.values()]):
+            return
+        nextRID = self.cache.header['dictRID']
+        while nextRID != -1:
+            refID = nextRID
+            nextRID = pageCodec.decodeDict(self.readBlock(refID))[0]
+            self.cache.header['space'].release(refID)
+
+        pages = pageCodec.dictPages()
+        rids = []
+        for _ in pages:
+            rids.append(self.findFreeBlock(rids[-1] if len(rids) > 0 else None))
+        rids.append(-1)
+        for i in range(len(pages)):
+            column, firstCode, values = pages[i]
+            self.storeBlock(rids[i], lambda buffer, offset: pageCodec.encodeDict(
+                rids[i + 1], column, firstCode, values, buffer, offset))
+        self.cache.header.update({'dictRID': rids[0]})
+        for column in pageCodec.dicts.values():
+            column.dirty = False
+
+    def readDicts(self):
+        """load the dictionaries of DICT attributes from their pages"""
+        pageCodec = self.cache.header['codec']
+        nextRID = self.cache.header['dictRID']
+        while nextRID != -1:
+            nextRID, column, firstCode, values = pageCodec.decodeDict(
+                self.readBlock(nextRID))
+            if column in pageCodec.dicts:
+                pageCodec.dicts[column].load(firstCode, values)
 
     def readNode(self, refID):
-        global cache
         """loads node from DB file"""
-        dbfile = cache.header['file']
-        dbfile.seek(cache.header['block0'] + refID * cache.header['blockSize'])
-        nodeType = chr(ord(struct.unpack('c', dbfile.read(1))[0]))
-        if nodeType == 'I':
-            node = IndexNode(
-                cache.header['minKey'], cache.header['maxKey'], None, None, refID)
-            node.rid = int(struct.unpack('I', dbfile.read(4))[0])
-            KeyLinks = struct.unpack('h', dbfile.read(2))
-            numKeys = int(KeyLinks[0])
-            KeyLinks = struct.unpack('h', dbfile.read(2))
-            numLinks = int(KeyLinks[0])
-            for _ in range(numKeys):
-                key = int(struct.unpack('q', dbfile.read(8))[0])
-                node.keys.append(key)
-            for _ in range(numLinks):
-                refid = int(struct.unpack('q', dbfile.read(8))[0])
-                node.link.append(refid)
-
-        elif nodeType == 'D':
-            node = DataNode(cache.header['minKey'], cache.header['maxKey'])
-            numSlots = int(struct.unpack('h', dbfile.read(2))[0])
-            node.next = int(struct.unpack('q', dbfile.read(8))[0])
-            node.rid = int(struct.unpack('I', dbfile.read(4))[0])
-            keys, vals = [], []
-            for _ in range(numSlots):       # read the keys
-                key = int(struct.unpack('q', dbfile.read(8))[0])
-                keys.append(key)
-
-            for i in range(numSlots):       # read the fields
-                if keys[i] >= 0:    # positive key ==> node
-                    dataCAT = cache.header['catalog']['node'][1:]
-                else:               # negative key ==> edge
-                    dataCAT = cache.header['catalog']['edge'][1:]
-                fields = []
-                for i in range(len(dataCAT)):
-                    if dataCAT[i][1] == 'Int':
-                        fields.append(
-                            int(struct.unpack('q', dbfile.read(8))[0]))
-
-                    if dataCAT[i][1] == 'V20':
-                        bstr = dbfile.read(20)
-                        stop = bstr.decode('ascii').find('\x00')
-                        if stop == -1:
-                            stop = 20
-                        fields.append(bstr.decode('ascii')[0:stop])
-                pass
-
-                vals.append(tuple(fields))
-
-            for i in range(numSlots):       # build data slots
-                node.slots.append((keys[i], vals[i]))
-
+        return self.blockNode(self.readBlock(refID), refID)
+
+    def blockNode(self, block, refID):
+        """node decoded from the raw bytes of block refID"""
+        block = self.cache.header['codec'].decode(block, self.readOverflow, refID)
+        if block[0] == 'I':
+            node = IndexNode(self.cache.header['minKey'], self.cache.header['maxKey'],
+                             None, block[3], block[1], self.cache)
+            node.keys = block[2]
+        else:
+            node = DataNode(self.cache.header['dataMinKey'], self.cache.header['dataMaxKey'],
+                            block[1], self.cache)
+            node.next = block[2]
+            node.slots = block[3]
         return node
 
     def delNode(self, node):
-        """update data-node to db file on block with refID"""
-        global cache
-        cache.header['blockArray'][node.rid] = 0
-        cache.header['freeSlots'] += 1
-        if node.rid in cache.rids:
-            cache.delNode(node.rid)
-        pass
+        """node leaves the tree: its latches are dropped, its block is freed"""
+        if self.cache.header['concurrent']:     # the writer's latches go with the node
+            for latched in [latched for latched in self.cache.writePath if latched is node]:
+                self.cache.writePath.remove(latched)
+                self.unlatch(latched, 'X')
+        self.dropBlock(node.rid)
+
+    def dropBlock(self, refID):
+        """block refID leaves the tree, unread or not"""
+        self.cache.header['space'].release(refID)
+        if self.cache.header['writer'] != None:
+            self.cache.header['writer'].drop(refID)
+        if refID in self.cache.rids:
+            self.cache.delNode(refID, self.cache.header['concurrent'])
 
 
 # Define abstract class methods
 class NodeType():
+    __slots__ = ()      # nodes keep no __dict__, a buffer pool holds thousands
+
     @abc.abstractmethod
     def insert(self, keyVal): pass
     @abc.abstractmethod
@@ -647,10 +2229,11 @@ class NodeType():
     def printStrNode(self, indent): pass
     @abc.abstractmethod
     def search(self, key): pass
+    @abc.abstractmethod
+    def safe(self, keyVal): pass
 
     @abc.abstractmethod
-    def delete(self, key, cur_lvl, LNbor, RNbor, LAnchor,
-               RAnchor, LAnch_lvl, RAnch_lvl, droot): pass
+    def delete(self, key, cur_lvl, nbors, droot, delLink=None): pass
 
 #####
 #######
@@ -662,12 +2245,18 @@ class NodeType():
 
 
 class IndexNode(NodeType):
-    """Index class structure to handle parsing data."""
+    """Index class structure to handle parsing data.
+       keys and links are array('q')s, assigned lists are turned into one"""
+
+    __slots__ = ('rid', 'cache', 'latch', 'dirty', 'inUse', 'minKey', 'maxKey',
+                 'keyArray', 'linkArray')
 
-    def __init__(self, minK, maxK, key, links=None, rid=-1):
+    def __init__(self, minK, maxK, key, links=None, rid=-1, cache=None):
         self.rid = rid
+        self.cache = cache      # buffer pool of the tree the node belongs to
+        self.latch = newLatch(cache)
         self.dirty = False
-        self.inUse = False
+        self.inUse = 0          # pin count, see cache.lockNode
         self.minKey = minK
         self.maxKey = maxK
         self.keys = []
@@ -677,111 +2266,120 @@ class IndexNode(NodeType):
         if links != None:
             self.link = links
 
+    @property
+    def keys(self):
+        return self.keyArray
+
+    @keys.setter
+    def keys(self, keys):
+        self.keyArray = dbslots.keyArray(keys)
+
+    @property
+    def link(self):
+        return self.linkArray
+
+    @link.setter
+    def link(self, links):
+        self.linkArray = dbslots.keyArray(links)
+
     def search(self, key):
         """search B+ tree by key - index node version"""
-        index = 0
-        for indexKey in self.keys:
-            if key < indexKey:
-                break
-            index += 1
-        return RID().node(self.link[index]).search(key)
+        node = self
+        while hasattr(node, 'keys'):
+            node = self.cache.pager.node(node.link[bisect.bisect_right(node.keys, key)])
+        return node.search(key)
 
     def testsearch(self, key, curCnt):
-        index = 0
-        for indexKey in self.keys:
-            if key < indexKey:
-                break
-            index += 1
-        MorF = RID().isNodeInCache(self.link[index])
-        return RID().node(self.link[index]).testsearch(key, curCnt + MorF)
+        index = bisect.bisect_right(self.keys, key)
+        MorF = self.cache.pager.isNodeInCache(self.link[index])
+        return self.cache.pager.node(self.link[index]).testsearch(key, curCnt + MorF)
 
     def indexSplit(self, *keysAndLinks):
         """create new data node with input keysAndLinks = ([keys], [links])"""
-        newINode = RID().newIndexNode(0, keysAndLinks[1])
+        newINode = self.cache.pager.newIndexNode(0, keysAndLinks[1], self.rid)
         newINode.keys = keysAndLinks[0]
-        RID().updateNode(newINode)
+        self.cache.pager.updateNode(newINode)
         return newINode
 
-    def insert(self, keyVal, cur_lvl):
-        key = keyVal[0]
-
-        # jump down the rabbit hole ... but which one?
-        index = 0
-        for indexKey in self.keys:
-            if key < indexKey:
-                break
-            index += 1
-
-        # send (key, val) down the pike, and wait for something to surface from the deep
-        (key, link) = RID().node(self.link[index]).insert(keyVal, cur_lvl + 1)
-
-        # if normal insertion happened --> traverse back with no changes
-        # else: new link provided --> insert new (key, link) node
-        if key == None:
+    def fill(self):
+        """space taken by the keys: a key count, bytes with delta-coded keys"""
+        return self.cache.header['codec'].indexFill(self.keys)
+
+    def safe(self, keyVal):
+        """True if a key surfacing from below can't split the node"""
+        return self.fill() + self.cache.header['codec'].keyRoom() <= self.maxKey
+
+    def canLend(self, index, minFill):
+        """True if the node stays at minFill without key index"""
+        keys = list(self.keys)
+        keys.pop(index)
+        return self.cache.header['codec'].indexFill(keys) >= minFill
+
+    def splitPoint(self, keys):
+        """key moving up on a split: both halves within one key of each other"""
+        sizes = self.cache.header['codec'].indexSizes(keys)
+        total = sum(sizes)
+        half, size = 0, 0
+        while 2 * size < total - sizes[half] - max(sizes):
+            size += sizes[half]
+            half += 1
+        return half
+
+    def fairSplit(self, keys):
+        """splitPoint, moved until both halves fit in a block"""
+        pageCodec = self.cache.header['codec']
+        half = self.splitPoint(keys)
+        while half > 0 and pageCodec.indexFill(keys[0:half]) > self.maxKey:
+            half -= 1
+        while half < len(keys) - 1 and pageCodec.indexFill(keys[half + 1:]) > self.maxKey:
+            half += 1
+        return half
+
+    def splitAt(self, keys, index, ends):
+        """key moving up on a split with key index new: append splits at the
+           ends of the tree keep splitFill of a block on the full side (one key
+           at least on the other), else splitPoint"""
+        pageCodec = self.cache.header['codec']
+        (policy, target) = self.cache.header['split']
+        if policy == splitAppend and ends[1] and index == len(keys) - 1:
+            half = len(keys) - 2
+            while half > 1 and pageCodec.indexFill(keys[0:half]) > target * self.maxKey:
+                half -= 1
+            return half
+        if policy == splitAppend and ends[0] and index == 0:
+            half = 1
+            while half < len(keys) - 2 and pageCodec.indexFill(keys[half + 1:]) > target * self.maxKey:
+                half += 1
+            return half
+        return self.splitPoint(keys)
+
+    def splitOff(self, keys, links, half=None):
+        """keep the left half of an overfull keys/links pair, the right half
+           moves to a new node --> (key, node) for the parent"""
+        if half == None:
+            half = self.splitPoint(keys)
+        newNode = self.indexSplit(keys[half + 1:], links[half + 1:])
+        self.keys = keys[0:half]
+        self.link = links[0:half + 1]
+        self.cache.pager.updateNode(self)
+        return (keys[half], newNode)
+
+    def insert(self, key, link, ends=(True, True)):
+        """takes (key, new node) surfacing from a split below --> (None, self),
+           or (key, node) of its own split for the parent.
+           ends: the node holds the first/last keys of the tree"""
+        index = bisect.bisect_right(self.keys, key)
+        keys = list(self.keys)
+        keys.insert(index, key)
+        links = list(self.link)
+        links.insert(index + 1, link.rid)
+        if self.cache.header['codec'].indexFill(keys) <= self.maxKey:
+            self.keys, self.link = keys, links  # always room for one more ...
+            self.cache.pager.updateNode(self)
             return (None, self)
-        elif key == 'full':
-            return (key, self)
-        else:
-            if len(self.keys) < self.maxKey:    # always room for one more ...
-                index = 0
-                for indexKey in self.keys:
-                    if key < indexKey:
-                        break
-                    index += 1
-
-                self.keys.insert(index, key)
-                self.link.insert(index + 1, link.rid)
-                RID().updateNode(self)
-                return (None, self)
-            else:                               # until there isn't --> split index nodes
-                if key < self.keys[self.minKey - 1]:
-                    # perform un-even split
-                    newKeys = self.keys[-self.minKey - 1:]
-                    newLinks = self.link[-self.minKey - 1:]
-                    minMaxKey = newKeys.pop(0)
-
-                    newNode = self.indexSplit(newKeys, newLinks)
-                    self.keys = self.keys[0:self.minKey - 1]
-                    self.link = self.link[0:self.minKey]
-
-                    index = 0
-                    for indexKey in self.keys:
-                        if key < indexKey:
-                            break
-                        index += 1
-
-                    self.keys.insert(index, key)
-                    self.link.insert(index + 1, link.rid)
-
-                    RID().updateNode(self)
-                    # send new node back up
-                    return (minMaxKey, newNode)
-                else:
-                    # perform even split
-                    newKeys = self.keys[-self.minKey:]
-                    newLinks = self.link[-self.minKey:]
-
-                    newNode = self.indexSplit(newKeys, newLinks)
-                    self.keys = self.keys[0:self.minKey]
-                    self.link = self.link[0:self.minKey + 1]
-
-                    index = 0
-                    for indexKey in newNode.keys:
-                        if key < indexKey:
-                            break
-                        index += 1
-
-                    newNode.keys.insert(index, key)
-                    newNode.link.insert(index, link.rid)
-
-                    minMaxKey = newNode.keys.pop(0)
-
-                    RID().updateNode(self)
-                    RID().updateNode(newNode)
-                    # send new right node back up
-                    return (minMaxKey, newNode)
-
-        return (None, self)
+        else:                               # until there isn't --> split index nodes
+            # send new right node back up
+            return self.splitOff(keys, links, self.splitAt(keys, index, ends))
 
     def shiftLR(self, leftNode, anchorNode):
         """performs index node shift from left to current"""
@@ -792,11 +2390,7 @@ class IndexNode(NodeType):
         leftNode.link.pop(-1)
 
         # locate pivot key in anchor node and swap pivot key
-        pivotIndex = 0
-        for key in anchorNode.keys:
-            if leftKey < key:
-                break
-            pivotIndex += 1
+        pivotIndex = bisect.bisect_right(anchorNode.keys, leftKey)
 
         tempkey = anchorNode.keys[pivotIndex]
         anchorNode.keys[pivotIndex] = leftKey
@@ -805,9 +2399,9 @@ class IndexNode(NodeType):
         self.keys.insert(0, tempkey)
         self.link.insert(0, leftlnk)
 
-        RID().updateNode(self)
-        RID().updateNode(leftNode)
-        RID().updateNode(anchorNode)
+        self.cache.pager.updateNode(self)
+        self.cache.pager.updateNode(leftNode)
+        self.cache.pager.updateNode(anchorNode)
 
     def shiftRL(self, rightNode, anchorNode):
         """performs index node shift from right to current"""
@@ -818,13 +2412,7 @@ class IndexNode(NodeType):
         rightNode.link.pop(0)
 
         # locate pivot key in anchor node and swap pivot key
-        pivotIndex = 0
-        for key in anchorNode.keys:
-            if rightKey < key:
-                break
-            pivotIndex += 1
-
-        pivotIndex -= 1
+        pivotIndex = bisect.bisect_right(anchorNode.keys, rightKey) - 1
 
         tempkey = anchorNode.keys[pivotIndex]
         anchorNode.keys[pivotIndex] = rightKey
@@ -833,20 +2421,16 @@ class IndexNode(NodeType):
         self.keys.append(tempkey)
         self.link.append(rightlnk)
 
-        RID().updateNode(self)
-        RID().updateNode(rightNode)
-        RID().updateNode(anchorNode)
+        self.cache.pager.updateNode(self)
+        self.cache.pager.updateNode(rightNode)
+        self.cache.pager.updateNode(anchorNode)
 
     def mergeLeft(self, leftNode, anchorNode):
         """merge self to left index"""
         # locate pivot key in anchor node
 
         keyCheck = leftNode.keys[-1]
-        pivotIndex = 0
-        for key in anchorNode.keys:
-            if keyCheck < key:
-                break
-            pivotIndex += 1
+        pivotIndex = bisect.bisect_right(anchorNode.keys, keyCheck)
 
         keyPivotIndex = pivotIndex
         if keyPivotIndex == len(anchorNode.keys):
@@ -863,20 +2447,15 @@ class IndexNode(NodeType):
         anchorNode.keys.pop(keyPivotIndex)
         anchorNode.link.pop(keyPivotIndex + 1)
 
-        RID().updateNode(self)
-        RID().updateNode(leftNode)
-        RID().updateNode(anchorNode)
+        self.cache.pager.updateNode(self)
+        self.cache.pager.updateNode(leftNode)
+        self.cache.pager.updateNode(anchorNode)
 
-    def mergeRight(self, rightNode, anchorNode):
-        """merge right index to self"""
-        keyCheck = self.keys[-1]
+    def mergeRight(self, rightNode, anchorNode, keyCheck):
+        """merge right index to self (keyCheck: a key of self's range, self may have none)"""
 
         # locate pivot key in anchor node
-        pivotIndex = 0
-        for key in anchorNode.keys:
-            if keyCheck < key:
-                break
-            pivotIndex += 1
+        pivotIndex = bisect.bisect_right(anchorNode.keys, keyCheck)
 
         keyPivotIndex = pivotIndex
         if keyPivotIndex == len(anchorNode.keys):
@@ -895,99 +2474,113 @@ class IndexNode(NodeType):
         anchorNode.keys.pop(keyPivotIndex)
         anchorNode.link.pop(keyPivotIndex + 1)
 
-        RID().updateNode(self)
-        RID().updateNode(rightNode)
-        RID().updateNode(anchorNode)
+        self.cache.pager.updateNode(self)
+        self.cache.pager.updateNode(rightNode)
+        self.cache.pager.updateNode(anchorNode)
 
-    def delete(self, key, cur_lvl, LNbor, RNbor, LAnchor, RAnchor, LAnch_lvl, RAnch_lvl, droot):
-        """delete for index node"""
-        global cache
-
-        index = 0
-        for thiskey in self.keys:
-            if key < thiskey:
-                break
-            index += 1
+    def neighbors(self, key, cur_lvl, nbors):
+        """neighbors and anchors of the child holding key, from those of self
+           (nbors: LNbor, RNbor, LAnchor, RAnchor, LAnch_lvl, RAnch_lvl)
+           --> (child index, nbors of the child)"""
+        (LNbor, RNbor, LAnchor, RAnchor, LAnch_lvl, RAnch_lvl) = nbors
+        index = bisect.bisect_right(self.keys, key)
 
         # determine next neighbors and anchors
         nxtLLvl, nxtRLvl = LAnch_lvl, RAnch_lvl
         if index == 0:                      # next node is leftmost
-            nextL = RID().node(LNbor.link[-1])
-            nextR = RID().node(self.link[index + 1])
+            nextL = self.cache.pager.node(LNbor.link[-1], 'X')
+            nextR = self.cache.pager.node(self.link[index + 1], 'X')
             nxtLAn = LAnchor
             nxtRAn = self
             nxtRLvl = cur_lvl
         elif index == len(self.link) - 1:   # next node is rightmost
-            nextL = RID().node(self.link[index - 1])
-            nextR = RID().node(RNbor.link[0])
+            nextL = self.cache.pager.node(self.link[index - 1], 'X')
+            nextR = self.cache.pager.node(RNbor.link[0], 'X')
             nxtLAn = self
             nxtRAn = RAnchor
             nxtLLvl = cur_lvl
         else:                               # next node is a middle node
-            nextL = RID().node(self.link[index - 1])
-            nextR = RID().node(self.link[index + 1])
+            nextL = self.cache.pager.node(self.link[index - 1], 'X')
+            nextR = self.cache.pager.node(self.link[index + 1], 'X')
             nxtLAn = self
             nxtRAn = self
             nxtLLvl, nxtRLvl = cur_lvl, cur_lvl
-
-        # send key down the pike, and wait for something to surface from the deep
-        delLink = RID().node(self.link[index]).delete(
-            key, cur_lvl + 1, nextL, nextR, nxtLAn, nxtRAn, nxtLLvl, nxtRLvl, droot)
-
-        # goodnight sweet prince, embrace the ever-after
-        if delLink != None:
-            RID().delNode(delLink)
-
-        # check for underflow
-        if len(self.keys) < self.minKey:
+        return (index, (nextL, nextR, nxtLAn, nxtRAn, nxtLLvl, nxtRLvl))
+
+    def delete(self, key, cur_lvl, nbors, droot, delLink):
+        """delete for index node, once the child holding key is done
+           (delLink: what it gave back, the node is locked since the way down)"""
+        (LNbor, RNbor, LAnchor, RAnchor, LAnch_lvl, RAnch_lvl) = nbors
+        if isinstance(delLink, tuple):      # a node below split --> take its key
+            index = bisect.bisect_right(self.keys, delLink[0])
+            self.keys.insert(index, delLink[0])
+            self.link.insert(index + 1, delLink[1].rid)
+            self.cache.pager.updateNode(self)
+        elif delLink != None:
+            # goodnight sweet prince, embrace the ever-after
+            self.cache.pager.delNode(delLink)
+
+        # delta-coded keys: a longer pivot shifted in below can overfill self
+        split = None
+        if self.fill() > self.maxKey:
+            split = self.splitOff(self.keys, self.link)
+        self.cache.unlockNode(self)
+        if split != None:
+            return split
+
+        # check for underflow --> shift until refilled (one shift on count
+        # filled nodes, short keys may need more when delta coded) or merge
+        while self.fill() < self.minKey:
             # check if root
-            if cur_lvl == 0 and len(self.keys) == 0:
+            if cur_lvl == 0:
                 return None
-            else:
-                # check for shift
-                nodeIsLeftmost, nodeIsRightmost = False, False
-                if LNbor.keys[0] > self.keys[0]:
-                    nodeIsLeftmost = True
-                elif RNbor.keys[0] < self.keys[0]:
-                    nodeIsRightmost = True
-
-                leftKeyNum, rightKeyNum = len(LNbor.keys), len(RNbor.keys)
-                if nodeIsLeftmost:
-                    leftKeyNum = self.minKey
-                elif nodeIsRightmost:
-                    rightKeyNum = self.minKey
 
-                if leftKeyNum > self.minKey or rightKeyNum > self.minKey:
-                    if leftKeyNum > rightKeyNum:
+            # check for shift
+            # (key stands for the keys of self: append splits leave nodes with few)
+            nodeIsLeftmost, nodeIsRightmost = False, False
+            if LNbor.keys[0] > key:
+                nodeIsLeftmost = True
+            elif RNbor.keys[0] < key:
+                nodeIsRightmost = True
+
+            leftKeyNum, rightKeyNum = LNbor.fill(), RNbor.fill()
+            leftLends = not nodeIsLeftmost and LNbor.canLend(-1, self.minKey)
+            rightLends = not nodeIsRightmost and RNbor.canLend(0, self.minKey)
+
+            if leftLends or rightLends:
+                if not rightLends:
+                    self.shiftLR(LNbor, LAnchor)
+                elif not leftLends:
+                    self.shiftRL(RNbor, RAnchor)
+                elif leftKeyNum > rightKeyNum:
+                    self.shiftLR(LNbor, LAnchor)
+                elif leftKeyNum < rightKeyNum:
+                    self.shiftRL(RNbor, RAnchor)
+                else:
+                    if LAnch_lvl >= RAnch_lvl:
                         self.shiftLR(LNbor, LAnchor)
-                    elif leftKeyNum < rightKeyNum:
-                        self.shiftRL(RNbor, RAnchor)
                     else:
-                        if LAnch_lvl >= RAnch_lvl:
-                            self.shiftLR(LNbor, LAnchor)
-                        else:
-                            self.shiftRL(RNbor, RAnchor)
+                        self.shiftRL(RNbor, RAnchor)
 
-                else:  # check for merging conditions
-                    # node is left-most
-                    if nodeIsLeftmost and rightKeyNum == self.minKey:
-                        self.mergeRight(RNbor, RAnchor)
-                        return RNbor
+            else:  # check for merging conditions
+                # node is left-most
+                if nodeIsLeftmost:
+                    self.mergeRight(RNbor, RAnchor, key)
+                    return RNbor
 
-                    # node is middle-most
-                    if leftKeyNum == self.minKey and rightKeyNum == self.minKey:
-                        if LAnch_lvl >= RAnch_lvl or self == LNbor:
-                            self.mergeLeft(LNbor, LAnchor)
-                            return self
+                # node is middle-most
+                if LAnch_lvl >= RAnch_lvl or self == LNbor:
+                    self.mergeLeft(LNbor, LAnchor)
+                    return self
 
-                        elif LAnch_lvl < RAnch_lvl or nodeIsRightmost:
-                            self.mergeRight(RNbor, RAnchor)
-                            return RNbor
+                elif LAnch_lvl < RAnch_lvl or nodeIsRightmost:
+                    self.mergeRight(RNbor, RAnchor, key)
+                    return RNbor
 
-                    # node is right-most
-                    if nodeIsRightmost and rightKeyNum == self.minKey:
-                        self.mergeLeft(LNbor, LAnchor)
-                        return LNbor
+                # node is right-most
+                if nodeIsRightmost:
+                    self.mergeLeft(LNbor, LAnchor)
+                    return LNbor
         return None
 
     def printNode(self, indent):
@@ -1040,88 +2633,156 @@ class IndexNode(NodeType):
 
 
 class DataNode(NodeType):
-    """Node class structure to handle storing the data."""
-
-    def __init__(self, minK, maxK, rid=-1):
+    """Node class structure to handle storing the data.
+       minKey/maxKey bound the fill: slots on fixed pages, bytes on slotted pages.
+       overwriting with shorter text may leave a slotted node under minKey,
+       the next delete in the node refills it (so do append splits, for the
+       node they start at an end of the tree).
+       slots is a dbslots.slotList, assigned lists of slots are turned into one"""
+
+    __slots__ = ('cache', 'minKey', 'maxKey', 'slotStore', 'next', 'rid',
+                 'latch', 'dirty', 'inUse')
+
+    def __init__(self, minK, maxK, rid=-1, cache=None):
+        self.cache = cache      # buffer pool of the tree the node belongs to
         self.minKey = minK
         self.maxKey = maxK
         self.slots = []
         self.next = -1
-        self.link = [None]
         self.rid = rid
+        self.latch = newLatch(cache)
         self.dirty = False
-        self.inUse = False
+        self.inUse = 0          # pin count, see cache.lockNode
+
+    @property
+    def slots(self):
+        return self.slotStore
+
+    @slots.setter
+    def slots(self, slots):
+        if not isinstance(slots, dbslots.slotList):
+            slots = dbslots.slotList(slots)
+        self.slotStore = slots
+
+    def slotIndex(self, key):
+        """position of first slot with slot key >= key"""
+        return self.slots.find(key)
 
     def search(self, key):
         """data node search: check for key -> return data or nothing"""
-        for slot in self.slots:
-            if key == slot[0]:
-                return slot[1]
+        slots = self.slots
+        i = slots.find(key)
+        if i < len(slots.keys) and slots.keys[i] == key:
+            return slots.records[i]
         return None
 
-    def insert(self, keyVal, cur_lvl):
+    def fill(self):
+        """space taken by the slots"""
+        return self.cache.header['codec'].slotsSize(self.slots)
+
+    def place(self, keyVal):
+        """insert or overwrite keyVal, the caller made sure it fits"""
+        index = self.slotIndex(keyVal[0])
+        if index < len(self.slots) and self.slots[index][0] == keyVal[0]:
+            self.slots[index] = keyVal
+        else:
+            self.slots.insert(index, keyVal)
+
+    def safe(self, keyVal):
+        """True if keyVal goes in without a split"""
+        return self.fill() + self.cache.header['codec'].insertRoom(keyVal) <= self.maxKey
+
+    def canLend(self, index, minFill):
+        """True if the node stays at minFill without slot index"""
+        slots = list(self.slots)
+        slots.pop(index)
+        return self.cache.header['codec'].slotsSize(slots) >= minFill
+
+    def splitPoint(self, slots):
+        """first slot of the right half: both halves within one record of each other"""
+        sizes = self.cache.header['codec'].slotSizes(slots)
+        total = sum(sizes)
+        half, size = 0, 0
+        while 2 * size < total - max(sizes):
+            size += sizes[half]
+            half += 1
+        return half
+
+    def fairSplit(self, slots):
+        """splitPoint, moved until both halves fit in a block"""
+        pageCodec = self.cache.header['codec']
+        half = self.splitPoint(slots)
+        while half > 1 and pageCodec.slotsSize(slots[0:half]) > self.maxKey:
+            half -= 1
+        while half < len(slots) - 1 and pageCodec.slotsSize(slots[half:]) > self.maxKey:
+            half += 1
+        return half
+
+    def splitAt(self, slots, index, ends):
+        """first slot of the right half with slot index new: append splits at
+           the ends of the tree keep splitFill of a block on the full side, else
+           splitPoint"""
+        pageCodec = self.cache.header['codec']
+        (policy, target) = self.cache.header['split']
+        if policy == splitAppend and ends[1] and index == len(slots) - 1:
+            half = len(slots) - 1
+            while half > 1 and pageCodec.slotsSize(slots[0:half]) > target * self.maxKey:
+                half -= 1
+            return half
+        if policy == splitAppend and ends[0] and index == 0:
+            half = 1
+            while half < len(slots) - 1 and pageCodec.slotsSize(slots[half:]) > target * self.maxKey:
+                half += 1
+            return half
+        return self.splitPoint(slots)
+
+    def insert(self, keyVal, cur_lvl, ends=(True, True)):
         """inserts (key, val) tuple in leaf/data node.
-           Returns (key, pointer) if needed one node up"""
+           Returns (key, pointer) if needed one node up
+           (ends: the node holds the first/last keys of the tree)"""
 
         key, val = keyVal[0], keyVal[1]
 
         # duplicate insertion --> overwrite old keyVal tuple
-        for i in range(len(self.slots)):
-            if key == self.slots[i][0]:
-                self.slots[i] = keyVal
-                RID().updateNode(self)
+        index = self.slotIndex(key)
+        if index < len(self.slots) and self.slots[index][0] == key:
+            oldKeyVal = self.slots[index]
+            self.slots[index] = keyVal
+            if self.fill() <= self.maxKey:
+                self.cache.pager.updateNode(self)
                 return (None, self)
+            # a longer record no longer fits --> re-insert it with a split
+            self.slots[index] = oldKeyVal
+            if not self.cache.pager.reserveBlocks(cur_lvl + 2):
+                return ('full', self)
+            self.slots.pop(index)
 
         # new insertion
-        # check if free space allows for worst-case splitting
-        if cur_lvl >= cache.header['freeSlots']:
+        # check if free space allows for worst-case splitting (+ new root)
+        if not self.cache.pager.reserveBlocks(cur_lvl + 2):
             return ('full', self)
 
-        if len(self.slots) < self.maxKey:
-
-            if len(self.slots) == 0:
-                self.slots.append(keyVal)
-            else:
-                skip = False
-                for i in range(len(self.slots)):
-                    if self.slots[i][0] >= key:
-                        self.slots.insert(i, (key, val))
-                        skip = True
-                        break
-                if skip == False:
-                    self.slots.append((key, val))
-
-            RID().updateNode(self)
+        slots = list(self.slots)
+        slots.insert(index, (key, val))
+        if self.cache.header['codec'].slotsSize(slots) <= self.maxKey:
+            self.slots = slots
+            self.cache.pager.updateNode(self)
 
         else:  # handle splitting the node
             tempNextNode = self.next
-            newNode = RID().newDataNode()
+            newNode = self.cache.pager.newDataNode(self.rid)
             self.next = newNode.rid
-            newNode.slots = self.slots[-self.minKey:]
-            self.slots = self.slots[0:self.minKey]
+            # split the slots (new one included) as the split policy says
+            self.slots = slots
+            splitPos = self.splitAt(self.slots, index, ends)
+            newNode.slots = self.slots[splitPos:]
+            self.slots = self.slots[0:splitPos]
             newNode.next = tempNextNode
 
-            found = False
-            # determine which node gets the insert
-            if key < newNode.slots[0][0]:
-                # go to old left (original) node
-                nodeSlots = self.slots
-            # else go to new (right) node
-            else:
-                nodeSlots = newNode.slots
-
-            for i in range(len(nodeSlots)):
-                if key < nodeSlots[i][0]:
-                    found = True
-                    nodeSlots.insert(i, (key, val))
-                    break
-            if found == False:
-                nodeSlots.append((key, val))
-
             minMaxKey = newNode.slots[0][0]
 
-            RID().updateNode(self)
-            RID().updateNode(newNode)
+            self.cache.pager.updateNode(self)
+            self.cache.pager.updateNode(newNode)
             return (minMaxKey, newNode)         # send new node up the chain
 
         return (None, self)                     # send point back up the chain
@@ -1139,19 +2800,15 @@ class DataNode(NodeType):
         minMaxKey = self.slots[0][0]
 
         # locate pivot key in anchor node and replace
-        pivotIndex = 0
-        for key in anchorNode.keys:
-            if minMaxKey < key:
-                break
-            pivotIndex += 1
+        pivotIndex = bisect.bisect_right(anchorNode.keys, minMaxKey)
         if pivotIndex == len(anchorNode.keys):
             pivotIndex -= 1
 
         anchorNode.keys[pivotIndex] = minMaxKey
 
-        RID().updateNode(self)
-        RID().updateNode(leftNode)
-        RID().updateNode(anchorNode)
+        self.cache.pager.updateNode(self)
+        self.cache.pager.updateNode(leftNode)
+        self.cache.pager.updateNode(anchorNode)
 
     def shiftRL(self, rightNode, anchorNode):
         """performs leaf node shift from right to current"""
@@ -1165,12 +2822,7 @@ class DataNode(NodeType):
         self.slots.append(keyVal)
 
         # locate pivot key in anchor node and replace
-        pivotIndex = 0
-        for key in anchorNode.keys:
-            if oldpivot < key:
-                break
-            pivotIndex += 1
-        keyPivotIndex = pivotIndex
+        keyPivotIndex = bisect.bisect_right(anchorNode.keys, oldpivot)
 
         keyPivotIndex -= 1
         if keyPivotIndex == len(anchorNode.keys):
@@ -1178,18 +2830,14 @@ class DataNode(NodeType):
 
         anchorNode.keys[keyPivotIndex] = minMaxKey
 
-        RID().updateNode(self)
-        RID().updateNode(rightNode)
-        RID().updateNode(anchorNode)
+        self.cache.pager.updateNode(self)
+        self.cache.pager.updateNode(rightNode)
+        self.cache.pager.updateNode(anchorNode)
 
-    def mergeLeft(self, leftNode, anchorNode):
+    def mergeLeft(self, leftNode, anchorNode, minMaxKey):
         # locate pivot key in anchor node and delete
-        minMaxKey = self.slots[0][0]
-        pivotIndex = 0
-        for key in anchorNode.keys:
-            if minMaxKey < key:
-                break
-            pivotIndex += 1
+        # (minMaxKey: a key of self's range, self may have no slots left)
+        pivotIndex = bisect.bisect_right(anchorNode.keys, minMaxKey)
 
         keyPivotIndex = pivotIndex - 1
         if keyPivotIndex == len(anchorNode.keys):
@@ -1206,21 +2854,14 @@ class DataNode(NodeType):
         # snip self out of link list
         leftNode.next = self.next
 
-        RID().updateNode(self)
-        RID().updateNode(leftNode)
-        RID().updateNode(anchorNode)
+        self.cache.pager.updateNode(self)
+        self.cache.pager.updateNode(leftNode)
+        self.cache.pager.updateNode(anchorNode)
 
-    def mergeRight(self, rightNode, anchorNode):
+    def mergeRight(self, rightNode, anchorNode, selfMaxKey):
         # locate pivot key in anchor node and delete
-
-        selfMaxKey = self.slots[-1][0]
-        pivotIndex = 0
-        for key in anchorNode.keys:
-            if selfMaxKey < key:
-                break
-            pivotIndex += 1
-
-        keyPivotIndex = pivotIndex
+        # (selfMaxKey: a key of self's range, self may have no slots left)
+        keyPivotIndex = bisect.bisect_right(anchorNode.keys, selfMaxKey)
 
         # delete index key and lnk from anchor node
         anchorNode.keys.pop(keyPivotIndex)
@@ -1233,52 +2874,63 @@ class DataNode(NodeType):
         # snip right neighbor out of link list
         self.next = rightNode.next
 
-        RID().updateNode(self)
-        RID().updateNode(rightNode)
-        RID().updateNode(anchorNode)
+        self.cache.pager.updateNode(self)
+        self.cache.pager.updateNode(rightNode)
+        self.cache.pager.updateNode(anchorNode)
 
-    def delete(self, key, cur_lvl, LNbor, RNbor, LAnchor, RAnchor, LAnch_lvl, RAnch_lvl, droot):
-        """deletes tuple with input key"""
+    def delete(self, key, cur_lvl, nbors, droot, delLink=None):
+        """deletes tuple with input key (a data node has no child --> no delLink)"""
+        (LNbor, RNbor, LAnchor, RAnchor, LAnch_lvl, RAnch_lvl) = nbors
         # perform the delete
-        for i in range(len(self.slots)):
-            if self.slots[i][0] == key:
-                self.slots.pop(i)
-                RID().updateNode(self)
-                break
+        i = self.slotIndex(key)
+        if i < len(self.slots) and self.slots[i][0] == key:
+            self.slots.pop(i)
+            self.cache.pager.updateNode(self)
 
         # special condition: last node on the left is empty
         if self == droot and cur_lvl == 0 and len(self.slots) == 0:
             return None
 
-        if len(self.slots) < self.minKey:  # check for regular underflow
-            leftKeyNum, rightKeyNum = len(LNbor.slots), len(RNbor.slots)
+        # check for regular underflow --> shift until refilled (one shift on
+        # fixed pages, small records may need more on slotted pages) or merge
+        while self.fill() < self.minKey:
+            leftKeyNum, rightKeyNum = LNbor.fill(), RNbor.fill()
+            leftLends = LNbor.canLend(-1, self.minKey)
+            rightLends = RNbor.canLend(0, self.minKey)
             ShiftConditionisGood, MergeConditionisGood = False, False
 
             # check shift condition
-            if self.rid == droot.rid and rightKeyNum > self.minKey:
+            if self.rid == droot.rid and rightLends:
                 ShiftConditionisGood = True
-            elif self.slots[0][0] > RNbor.slots[0][0] and leftKeyNum > self.minKey:
+            elif key > RNbor.slots[0][0] and leftLends:
                 ShiftConditionisGood = True
-            elif leftKeyNum > self.minKey or rightKeyNum > self.minKey:
+            elif leftLends or rightLends:
                 ShiftConditionisGood = True
 
-            if self.rid == droot.rid and rightKeyNum == self.minKey:
+            if self.rid == droot.rid and not rightLends:
                 MergeConditionisGood = True
-            elif self.slots[0][0] > RNbor.slots[0][0] and leftKeyNum == self.minKey:
+            elif key > RNbor.slots[0][0] and not leftLends:
                 MergeConditionisGood = True
-            elif leftKeyNum == self.minKey and rightKeyNum == self.minKey:
+            elif not leftLends and not rightLends:
                 MergeConditionisGood = True
 
             # special condition: last node on the left
             if self.rid == droot.rid and cur_lvl == 0:
                 ShiftConditionisGood, MergeConditionisGood = False, False
 
+            if not ShiftConditionisGood and not MergeConditionisGood:
+                break
+
             if ShiftConditionisGood and not MergeConditionisGood:
                 # check for shiftLR condition
                 if self.rid == droot.rid:
                     self.shiftRL(RNbor, RAnchor)
-                elif self.slots[0][0] > RNbor.slots[0][0]:
+                elif key > RNbor.slots[0][0]:
+                    self.shiftLR(LNbor, LAnchor)
+                elif not rightLends:
                     self.shiftLR(LNbor, LAnchor)
+                elif not leftLends:
+                    self.shiftRL(RNbor, RAnchor)
                 else:
                     if leftKeyNum > rightKeyNum:
                         self.shiftLR(LNbor, LAnchor)
@@ -1296,18 +2948,18 @@ class DataNode(NodeType):
             # check for merge condition
             if MergeConditionisGood:
                 if self.rid == droot.rid:
-                    self.mergeRight(RNbor, RAnchor)
+                    self.mergeRight(RNbor, RAnchor, key)
                     return RNbor
-                elif self.slots[0][0] > RNbor.slots[0][0]:
-                    self.mergeLeft(LNbor, LAnchor)
+                elif key > RNbor.slots[0][0]:
+                    self.mergeLeft(LNbor, LAnchor, key)
                     return self
                 else:
                     # check for merge left
                     if LAnch_lvl >= RAnch_lvl:
-                        self.mergeLeft(LNbor, LAnchor)
+                        self.mergeLeft(LNbor, LAnchor, key)
                         return self
                     else:
-                        self.mergeRight(RNbor, RAnchor)
+                        self.mergeRight(RNbor, RAnchor, key)
                         return RNbor
 
         # no underflow --> all done
@@ -4,7 +4,81 @@
 ###################################
 
 import random
-from collections import deque
+import threading
+from collections import OrderedDict
+
+# page latch for concurrent trees
+
+
+class latch():
+    """read/write latch of one node: shared 'S' for readers, exclusive 'X'
+       for the writer (who may take it again, e.g. a node that is its own neighbor).
+       a waiting writer holds off new readers
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition(threading.Lock())
+        self.readers = 0            # threads holding it shared
+        self.owner = None           # thread holding it exclusive
+        self.depth = 0              # times the owner took it
+        self.waiting = 0            # writers waiting for it
+
+    def acquire(self, mode):
+        me = threading.get_ident()
+        with self.cond:
+            if self.owner == me:            # the writer reading its own path
+                self.depth += 1
+            elif mode == 'S':
+                while self.owner != None or self.waiting > 0:
+                    self.cond.wait()
+                self.readers += 1
+            else:
+                self.waiting += 1
+                while self.owner != None or self.readers > 0:
+                    self.cond.wait()
+                self.waiting -= 1
+                self.owner, self.depth = me, 1
+
+    def release(self, mode):
+        with self.cond:
+            if mode == 'S' and self.owner != threading.get_ident():
+                self.readers -= 1
+            else:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.owner = None
+            self.cond.notify_all()
+
+
+# read-ahead ring of a scan
+
+
+class ring():
+    """blocks read ahead by one scan, kept apart from the buffer pool
+       --> a full scan doesn't push out the nodes everyone else is using.
+       holds one run of blocks at a time, dropped once a node changes
+    """
+
+    def __init__(self, size, last=None):
+        self.size = size            # blocks read per run
+        self.blocks = dict()        # rid --> raw block
+        self.changes = None         # cache.changes when the run was read
+        self.last = last            # rid of the block the scan took last
+
+    def get(self, rid, changes):
+        """raw block rid if read ahead (and still current), else None"""
+        if changes != self.changes:
+            self.blocks = dict()
+        return self.blocks.get(rid)
+
+    def sequential(self, rid):
+        """True if the scan goes on to the block after the one it took last"""
+        return self.last != None and rid == self.last + 1
+
+    def fill(self, blocks, changes):
+        self.blocks = blocks
+        self.changes = changes
+
 
 # define cache buffer
 
@@ -12,6 +86,7 @@ from collections import deque
 class cache():
     """class for storing nodes in buffer
        methods employed: FIFO, LIFO, LFU, MFU, RR
+       every method holds lock --> threads share the buffer safely
     """
 
     def __init__(self, maxCount=1, DBHeader=None, method="FIFO"):
@@ -21,8 +96,17 @@ class cache():
         self.nodeCount = 0          # initalize node counter
         self.nodeMax = maxCount     # max number of nodes allowed
         self.method = method        # method to rank node in cache
-        self.usageList = deque()    # queue for FIFO/LIFO ranking
+        self.usageList = OrderedDict()  # queue for FIFO/LIFO ranking (rid --> None)
         self.usageFreq = dict()     # stores frequency ranking for LFU/MFU
+        self.held = set()           # dirty nodes the redo log hasn't got yet
+        self.dirty = set()          # dirty nodes, candidates for the background writer
+        self.lock = threading.RLock()   # guards everything above
+        self.loading = dict()       # rid --> event of the thread reading the block
+        self.writeLatch = threading.RLock()     # writers take turns
+        self.writePath = []         # nodes the writer holds 'X' latched
+        self.ioLock = threading.RLock()     # db file/map access of concurrent trees
+        self.changes = 0            # counts node changes --> read-ahead blocks go stale
+        self.pager = None           # block/node storage of the tree (BTree.RID)
 
     def setMaxCount(self, maxNum):
         if maxNum == 0:
@@ -37,17 +121,20 @@ class cache():
         self.method = method
 
     def lockNode(self, node):
-        node.inUse = True
+        """pin node in buffer (pins count, every lockNode needs its unlockNode)"""
+        with self.lock:
+            node.inUse += 1
 
     def unlockNode(self, node):
-        node.inUse = False
+        with self.lock:
+            node.inUse -= 1
 
     def getWorstOffender(self):
         """selects which node to delete by method, return rid for deletion"""
         if self.method == "FIFO":
-            return self.usageList[0]
+            return next(iter(self.usageList))
         elif self.method == "LIFO":
-            return self.usageList[-1]
+            return next(reversed(self.usageList))
         elif self.method == "LFU":
             keys = list(self.usageFreq.keys())
             vals = list(self.usageFreq.values())
@@ -61,23 +148,23 @@ class cache():
         elif self.method == "RR":
             return random.choice(list(self.nodes.keys()))
         elif self.method == "MID":  # my own rotation process
-            return self.usageList[self.nodeCount // 2]
+            return list(self.usageList)[self.nodeCount // 2]
 
     def popUsage(self, key):
         if self.method == "FIFO":
-            self.usageList.popleft()
+            self.usageList.popitem(last=False)
         elif self.method == "LFU" or self.method == "MFU":
             self.usageFreq.pop(key)
 
     def delUsage(self, key):
         if self.method == "FIFO" or self.method == "MID":
-            self.usageList.remove(key)
+            self.usageList.pop(key)
         elif self.method == "LFU" or self.method == "MFU":
             self.usageFreq.pop(key)
 
     def insertUsage(self, rid):
         if self.method == "FIFO" or self.method == "MID":
-            self.usageList.append(rid)
+            self.usageList.update({rid: None})
         elif self.method == "LFU" or self.method == "MFU":
             self.usageFreq.update({rid: 1})
 
@@ -88,47 +175,96 @@ class cache():
             else:
                 self.usageFreq.update({rid: self.usageFreq.get(rid) + 1})
         if self.method == "FIFO" or "MID":
-            self.usageList.remove(rid)
-            self.usageList.append(rid)
+            self.usageList.move_to_end(rid)    # O(1), the buffer may hold thousands
         # if self.method == "RR": pass
 
+    def isLocked(self, rid):
+        """node in use, or holding changes not yet in the redo log --> must stay"""
+        with self.lock:
+            return self.nodes[rid].inUse or rid in self.held
+
+    def evict(self):
+        """rotate out the worst offending unlocked node --> the node (None if all are locked)"""
+        with self.lock:
+            rid = self.getWorstOffender()
+            dropUsage = self.popUsage
+            if self.isLocked(rid):      # locked --> first unlocked node instead
+                rid = next((rid for rid in self.nodes if not self.isLocked(rid)), None)
+                dropUsage = self.delUsage
+            if rid == None:
+                return None
+            node = self.nodes.pop(rid)
+            self.rids.remove(rid)
+            self.dirty.discard(rid)
+            dropUsage(rid)
+            self.nodeCount -= 1
+            return node
+
+    def shrink(self):
+        """evict nodes until the buffer is back to nodeMax --> evicted nodes"""
+        nodes = []
+        with self.lock:
+            while self.nodeCount > self.nodeMax:
+                node = self.evict()
+                if node == None:
+                    break
+                nodes.append(node)
+        return nodes
+
     def getNode(self, key):
-        self.updateUsage(key)
-        return self.nodes[key]
+        with self.lock:
+            self.updateUsage(key)
+            return self.nodes[key]
 
     def insNode(self, node, *args):
         """insert node to cache, possibly returns node to potentially update to file"""
         commitNode = None           # potential node to commit ot file
-        if len(args) == 1:          # handle any change of flags
-            node.dirty = args[0]
-        elif len(args) > 1:
-            node.dirty = args[0]
-            node.inUse = args[1]
-
-        if node.rid in self.rids:  # node is already present in buffer
-            self.updateUsage(node.rid)
-            self.nodes.update({node.rid: node})
-        else:                       # node is not in cache
-            if self.nodeCount >= self.nodeMax:  # AND there's no room! yikes!
-                # new node buffer overflow --> rotate out worst offending node
-                rid = self.getWorstOffender()
-                commitNode = self.nodes[rid]
-                self.nodes.pop(rid)
-                self.rids.remove(rid)
-                self.popUsage(rid)
-                self.nodeCount -= 1
+        with self.lock:
+            if len(args) == 1:          # handle any change of flags
+                node.dirty = args[0]
+            elif len(args) > 1:
+                node.dirty = args[0]
+                node.inUse = args[1]
+            if node.dirty:
+                self.dirty.add(node.rid)
+                self.changes += 1
+            else:
+                self.dirty.discard(node.rid)
+
+            if node.rid in self.rids:  # node is already present in buffer
+                self.updateUsage(node.rid)
+                self.nodes.update({node.rid: node})
+            else:                       # node is not in cache
+                if self.nodeCount >= self.nodeMax:  # AND there's no room! yikes!
+                    # new node buffer overflow --> rotate out worst offending node
+                    # (all locked --> overshoot for now)
+                    commitNode = self.evict()
 
-            self.insertUsage(node.rid)
-            self.nodes.update({node.rid: node})
-            self.rids.add(node.rid)
-            self.nodeCount += 1
+                self.insertUsage(node.rid)
+                self.nodes.update({node.rid: node})
+                self.rids.add(node.rid)
+                self.nodeCount += 1
 
         return commitNode
 
-    def delNode(self, rid):
-        if self.nodes[rid].inUse == False:
-            self.nodes.pop(rid)
-            self.rids.remove(rid)
-            self.delUsage(rid)
-            self.nodeCount -= 1
-        pass
+    def clear(self):
+        """drop every node from buffer without committing"""
+        with self.lock:
+            self.nodes = dict()
+            self.rids = set()
+            self.nodeCount = 0
+            self.usageList = OrderedDict()
+            self.usageFreq = dict()
+            self.held = set()
+            self.dirty = set()
+
+    def delNode(self, rid, force=False):
+        """drop node rid from buffer (force: even if pinned, its block was freed)"""
+        with self.lock:
+            if self.nodes[rid].inUse == False or force:
+                self.nodes.pop(rid)
+                self.rids.remove(rid)
+                self.held.discard(rid)
+                self.dirty.discard(rid)
+                self.delUsage(rid)
+                self.nodeCount -= 1
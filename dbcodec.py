@@ -0,0 +1,655 @@
+###################################
+# -- This script is designed to run in Python 3.8 --
+#  page codecs: compiled struct layouts for db blocks
+###################################
+
+import struct
+import threading
+import dbdict
+
+# struct format of each catalog attribute type
+fieldFormat = {'Int': 'q', 'V20': '20s'}
+
+
+class codec():
+    """class for encoding/decoding whole blocks in a single struct call
+       index page:  'I', rid, #keys, #links, keys..., links...
+       data page:   'D', #slots, next, rid, keys..., edge records..., node records...
+       (slots are sorted, so edge records (negative keys) always come first)
+       data node fill is counted in slots: every record has the same width
+    """
+
+    pageType = b'D'
+
+    def __init__(self, catalog, blockSize):
+        self.blockSize = blockSize
+        self.local = threading.local()      # preallocated page buffer of each thread
+        self.blank = bytes(blockSize)       # zero filler for unused page tail
+        self.indexHead = struct.Struct('=cIhh')
+        self.indexLayouts = dict()          # #keys + #links --> Struct
+        self.dicts = dict()                 # (type, field position) --> columnDict
+        if catalog == None:
+            catalog = dict()
+        self.setupRecords(catalog)
+
+    def setupRecords(self, catalog):
+        """compile the fixed-width record layouts of every catalog type"""
+        self.dataHead = struct.Struct('=chqI')
+        self.dataLayouts = dict()           # (#slots, #edges) --> Struct
+        self.recordFormat = dict()          # type --> record format string
+        self.recordWidth = dict()           # type --> fields per record
+        self.strFields = dict()             # type --> positions of V20 fields
+        for type in catalog.keys():
+            if 'VAR' in [field[1] for field in catalog[type]]:
+                raise ValueError("'VAR' attributes need a db with slotted data pages.")
+            fields = catalog[type][1:]      # key is stored with the keys
+            self.recordFormat.update(
+                {type: ''.join([fieldFormat[field[1]] for field in fields])})
+            self.recordWidth.update({type: len(fields)})
+            self.strFields.update({type: [i for i in range(len(fields))
+                                          if fields[i][1] == 'V20']})
+
+    def indexLimits(self):
+        """(min, max) keys per index node: n keys + (n + 1) links"""
+        keySize = struct.calcsize('q')
+        indexMax = (self.blockSize - self.indexHead.size - keySize) // (2 * keySize)
+        if indexMax < 4:
+            raise ValueError("block size of " + str(self.blockSize) +
+                             " bytes is too small for index nodes.")
+        return indexMax // 2, indexMax
+
+    def indexFill(self, keys):
+        """fill taken by the keys (and links) of an index node"""
+        return len(keys)
+
+    def indexSizes(self, keys):
+        """fill taken by each key of an index node"""
+        return [1] * len(keys)
+
+    def indexLayout(self, numRefs):
+        """compiled layout of an index page holding numRefs keys + links"""
+        layout = self.indexLayouts.get(numRefs)
+        if layout == None:
+            layout = struct.Struct('=cIhh' + numRefs * 'q')
+            self.indexLayouts.update({numRefs: layout})
+        return layout
+
+    def dataLayout(self, numSlots, numEdges):
+        """compiled layout of a data page with numSlots records, numEdges of them edges"""
+        layout = self.dataLayouts.get((numSlots, numEdges))
+        if layout == None:
+            layout = struct.Struct('=chqI' + numSlots * 'q' +
+                                   numEdges * self.recordFormat['edge'] +
+                                   (numSlots - numEdges) * self.recordFormat['node'])
+            self.dataLayouts.update({(numSlots, numEdges): layout})
+        return layout
+
+    def slotSize(self, slot):
+        """fill taken by one (key, fields) slot"""
+        return 1
+
+    def slotsSize(self, slots):
+        """fill taken by a list of slots"""
+        return len(slots)
+
+    def insertRoom(self, slot):
+        """most fill inserting slot can add to a data node"""
+        return self.slotSize(slot)
+
+    def keyRoom(self):
+        """most fill one more key (+ link) can add to an index node"""
+        return 1
+
+    def slotSizes(self, slots):
+        """fill taken by each slot of a list (in the context of the slot before it)"""
+        return [1] * len(slots)
+
+    def fitRecord(self, key, data):
+        """record fields as stored (fixed pages cut V20 text when packing)"""
+        return data
+
+    def spillFields(self, key, data):
+        """positions of values that must move to overflow blocks (none on fixed pages)"""
+        return []
+
+    def canSpill(self, key):
+        """True if records with key may own overflow blocks"""
+        return False
+
+    def clearBlock(self, buffer, offset):
+        """zero out one block of buffer, returns the buffer to pack into"""
+        if buffer == None:
+            buffer = getattr(self.local, 'buffer', None)
+            if buffer == None:
+                buffer = self.local.buffer = bytearray(self.blockSize)
+        buffer[offset:offset + self.blockSize] = self.blank
+        return buffer
+
+    def encodeIndex(self, rid, keys, links, buffer=None, offset=0):
+        """index node --> block bytes (packed in place if buffer is given)"""
+        buffer = self.clearBlock(buffer, offset)
+        self.indexLayout(len(keys) + len(links)).pack_into(
+            buffer, offset, b'I', rid, len(keys), len(links), *keys, *links)
+        return buffer
+
+    def encodeData(self, rid, next, slots, buffer=None, offset=0):
+        """data node --> block bytes (packed in place if buffer is given)"""
+        values = [b'D', len(slots), next, rid]
+        numEdges = 0
+        for slot in slots:
+            values.append(slot[0])
+            if slot[0] < 0:
+                numEdges += 1
+        for key, data in slots:
+            strFields = self.strFields['edge' if key < 0 else 'node']
+            if len(strFields) > 0:
+                data = list(data)
+                for i in strFields:
+                    data[i] = data[i].encode('ascii')
+            values.extend(data)
+
+        buffer = self.clearBlock(buffer, offset)
+        self.dataLayout(len(slots), numEdges).pack_into(
+            buffer, offset, *values)
+        return buffer
+
+    def decode(self, block, readOverflow=None, rid=None):
+        """block bytes --> ('I', rid, keys, links) or ('D', rid, next, slots).
+           rid only names the block when it holds no page of this db"""
+        if block[0:1] == b'I':
+            _, rid, numKeys, numLinks = self.indexHead.unpack_from(block, 0)
+            refs = self.indexLayout(numKeys + numLinks).unpack_from(block, 0)[4:]
+            return ('I', rid, list(refs[0:numKeys]), list(refs[numKeys:]))
+        if block[0:1] != codec.pageType or not hasattr(self, 'dataHead'):
+            raise ValueError("block " + str(rid) + " holds no page of this db (page type " +
+                             repr(bytes(block[0:1])) + "), the db file is damaged.")
+
+        _, numSlots, next, rid = self.dataHead.unpack_from(block, 0)
+        keys = struct.unpack_from('=' + numSlots * 'q', block,
+                                  self.dataHead.size)
+        numEdges = 0
+        while numEdges < numSlots and keys[numEdges] < 0:
+            numEdges += 1
+        values = self.dataLayout(numSlots, numEdges).unpack_from(block, 0)
+
+        slots = []
+        pos = 4 + numSlots
+        for key in keys:
+            type = 'edge' if key < 0 else 'node'
+            width = self.recordWidth[type]
+            fields = values[pos:pos + width]
+            pos += width
+            strFields = self.strFields[type]
+            if len(strFields) > 0:
+                fields = list(fields)
+                for i in strFields:
+                    fields[i] = fields[i].partition(b'\x00')[0].decode('ascii')
+                fields = tuple(fields)
+            slots.append((key, fields))
+        return ('D', rid, next, slots)
+
+
+# slotted data pages:
+#   'S', rid, next, #slots, slot directory (record offsets) ..., free space,
+#   records packed from the end of the block backwards
+#   record: key, then per field  Int: q   V20: B length + utf-8   VAR: H length + utf-8
+#           DICT: H code in the dictionary of the attribute
+#   a VAR value too long for the page is stored as H overflowMark, first overflow
+#   block rid, byte length --> the text sits on a chain of overflow blocks ('O', next, text)
+slotHead = struct.Struct('=cIqH')
+slotEntry = struct.Struct('=H')
+overflowMark = 0xFFFF
+overflowStub = struct.Struct('=HqI')
+overflowHead = struct.Struct('=cq')
+packInt = struct.Struct('=q')
+packLen20 = struct.Struct('=B')
+packLenVar = struct.Struct('=H')
+packCode = struct.Struct('=H')
+
+# dictionary page: 'T', next, type ('n'/'e'), field position, first code, #values,
+#   then per value: B length + utf-8. each page holds the values of one attribute
+dictHead = struct.Struct('=cqcHIH')
+
+
+class spilled(str):
+    """VAR value whose text is kept on overflow blocks"""
+
+    def __new__(cls, value, rid, size):
+        value = str.__new__(cls, value)
+        value.rid = rid     # first block of the overflow chain
+        value.size = size   # utf-8 length in bytes
+        return value
+
+
+def textSize(value):
+    """utf-8 length of value in bytes"""
+    if value.isascii():
+        return len(value)
+    return len(value.encode('utf-8'))
+
+
+class slottedCodec(codec):
+    """class for encoding/decoding blocks with slotted data pages.
+       data node fill is counted in bytes, strings take only the space they need
+    """
+
+    pageType = b'S'
+    pageHead = slotHead
+    keyWidth = packInt.size     # most bytes a record key takes
+    joinCost = 0                # extra bytes when two runs of records are joined
+
+    def setupRecords(self, catalog):
+        """size the variable-length records of every catalog type"""
+        self.fieldKinds = dict()    # type --> attribute type of each field
+        self.strFields = dict()     # type --> positions of V20/VAR fields
+        self.varFields = dict()     # type --> positions of VAR fields
+        self.dictFields = dict()    # type --> positions of DICT fields
+        self.recordBase = dict()    # type --> record bytes without string text
+        self.maxFill = self.blockSize - self.pageHead.size
+        # the largest record may take a quarter page, so a split always leaves
+        # two legal halves and a node at min fill holds at least two records
+        budget = self.maxFill // 4
+        fixedMax = dict()
+        for type in catalog.keys():
+            kinds = [field[1] for field in catalog[type][1:]]
+            self.fieldKinds.update({type: kinds})
+            self.strFields.update({type: [i for i in range(len(kinds))
+                                          if kinds[i] in ['V20', 'VAR']]})
+            self.varFields.update({type: [i for i in range(len(kinds))
+                                          if kinds[i] == 'VAR']})
+            self.dictFields.update({type: [i for i in range(len(kinds))
+                                           if kinds[i] == 'DICT']})
+            for i in self.dictFields[type]:
+                self.dicts.update({(type, i): dbdict.columnDict(
+                    type, catalog[type][i + 1][0])})
+            self.recordBase.update({type: slotEntry.size + self.keyWidth +
+                                    kinds.count('Int') * packInt.size +
+                                    kinds.count('V20') * packLen20.size +
+                                    kinds.count('VAR') * packLenVar.size +
+                                    kinds.count('DICT') * packCode.size})
+            fixedMax.update({type: self.recordBase[type] + kinds.count('V20') * 20})
+
+        # longest VAR text kept in the page, longer text is spilled
+        self.varInline = overflowMark - 1
+        for type in catalog.keys():
+            if len(self.varFields[type]) > 0:
+                self.varInline = min(self.varInline, (budget - fixedMax[type]) //
+                                     len(self.varFields[type]) - packLenVar.size)
+        spillExtra = overflowStub.size - packLenVar.size
+        self.maxRecord = packInt.size
+        for type in catalog.keys():
+            size = fixedMax[type] + len(self.varFields[type]) * max(
+                self.varInline, spillExtra)
+            self.maxRecord = max(self.maxRecord, size)
+        if self.maxRecord > budget:
+            raise ValueError("block size of " + str(self.blockSize) +
+                             " bytes is too small for the catalog records.")
+        self.minFill = (self.maxFill - self.maxRecord) // 2 - self.joinCost
+        self.overflowSize = self.blockSize - overflowHead.size
+
+    def dataLimits(self):
+        """(min, max) bytes of records in a data node"""
+        return self.minFill, self.maxFill
+
+    def slotSize(self, slot):
+        key, data = slot
+        type = 'edge' if key < 0 else 'node'
+        size = self.recordBase[type]
+        for i in self.strFields[type]:
+            if isinstance(data[i], spilled):
+                size += overflowStub.size - packLenVar.size
+            else:
+                size += textSize(data[i])
+        return size
+
+    def slotsSize(self, slots):
+        return sum(self.slotSizes(slots))
+
+    def slotSizes(self, slots):
+        return [self.slotSize(slot) for slot in slots]
+
+    def fitRecord(self, key, data):
+        """cut V20/DICT text to 20 utf-8 bytes, as the fixed '20s' fields do.
+           DICT values are swapped for the coded copy of their dictionary"""
+        type = 'edge' if key < 0 else 'node'
+        kinds = self.fieldKinds[type]
+        fitted = list(data)
+        for i in self.strFields[type] + self.dictFields[type]:
+            if kinds[i] != 'VAR' and textSize(fitted[i]) > 20:
+                fitted[i] = fitted[i].encode('utf-8')[:20].decode('utf-8', 'ignore')
+        for i in self.dictFields[type]:
+            fitted[i] = self.dicts[(type, i)].intern(fitted[i])
+        return tuple(fitted)
+
+    def spillFields(self, key, data):
+        type = 'edge' if key < 0 else 'node'
+        return [i for i in self.varFields[type] if not isinstance(data[i], spilled)
+                and textSize(data[i]) > self.varInline]
+
+    def canSpill(self, key):
+        return len(self.varFields['edge' if key < 0 else 'node']) > 0
+
+    def overflowPages(self, size):
+        """number of overflow blocks holding size bytes of text"""
+        return (size + self.overflowSize - 1) // self.overflowSize
+
+    def packHead(self, buffer, offset, rid, next, slots):
+        self.pageHead.pack_into(buffer, offset, self.pageType, rid, next, len(slots))
+
+    def unpackHead(self, block):
+        """page header --> (rid, next, #slots, key before the first record)"""
+        _, rid, next, numSlots = self.pageHead.unpack_from(block, 0)
+        return rid, next, numSlots, None
+
+    def encodeKey(self, key, prevKey):
+        return packInt.pack(key)
+
+    def decodeKey(self, block, pos, prevKey):
+        """record key at pos --> (key, position behind it)"""
+        return packInt.unpack_from(block, pos)[0], pos + packInt.size
+
+    def encodeRecord(self, key, data, prevKey=None):
+        type = 'edge' if key < 0 else 'node'
+        kinds = self.fieldKinds[type]
+        parts = [self.encodeKey(key, prevKey)]
+        for i in range(len(kinds)):
+            value = data[i]
+            if kinds[i] == 'Int':
+                parts.append(packInt.pack(value))
+            elif kinds[i] == 'DICT':
+                parts.append(packCode.pack(self.dicts[(type, i)].encode(value)))
+            elif isinstance(value, spilled):
+                parts.append(overflowStub.pack(overflowMark, value.rid, value.size))
+            else:
+                text = value.encode('utf-8')
+                if kinds[i] == 'V20':
+                    if len(text) > 20:
+                        raise ValueError("'V20' value '" + value + "' exceeds 20 bytes.")
+                    parts.append(packLen20.pack(len(text)))
+                else:
+                    if len(text) > self.varInline:
+                        raise ValueError("'VAR' value longer than " + str(self.varInline) +
+                                         " bytes must be spilled to overflow blocks.")
+                    parts.append(packLenVar.pack(len(text)))
+                parts.append(text)
+        return b''.join(parts)
+
+    def encodeData(self, rid, next, slots, buffer=None, offset=0):
+        """data node --> slotted block bytes (packed in place if buffer is given)"""
+        buffer = self.clearBlock(buffer, offset)
+        self.packHead(buffer, offset, rid, next, slots)
+        entryPos = offset + self.pageHead.size
+        recordPos = offset + self.blockSize
+        prevKey = None
+        for key, data in slots:
+            record = self.encodeRecord(key, data, prevKey)
+            prevKey = key
+            recordPos -= len(record)
+            if recordPos < entryPos + slotEntry.size:
+                raise ValueError("data node " + str(rid) + " overflows its block.")
+            buffer[recordPos:recordPos + len(record)] = record
+            slotEntry.pack_into(buffer, entryPos, recordPos - offset)
+            entryPos += slotEntry.size
+        return buffer
+
+    def encodeOverflow(self, next, text, buffer=None, offset=0):
+        """one piece of spilled text --> overflow block bytes"""
+        buffer = self.clearBlock(buffer, offset)
+        overflowHead.pack_into(buffer, offset, b'O', next)
+        start = offset + overflowHead.size
+        buffer[start:start + len(text)] = text
+        return buffer
+
+    def decodeOverflow(self, block):
+        """overflow block bytes --> (next, text bytes)"""
+        next = overflowHead.unpack_from(block, 0)[1]
+        return next, bytes(block[overflowHead.size:self.blockSize])
+
+    def dictPages(self):
+        """(column, first code, values) of every dictionary page, in column order"""
+        pages = []
+        for column in sorted(self.dicts):
+            values = self.dicts[column].values
+            first = 0
+            while first < len(values):
+                last, size = first, dictHead.size
+                while last < len(values) and \
+                        size + packLen20.size + textSize(values[last]) <= self.blockSize:
+                    size += packLen20.size + textSize(values[last])
+                    last += 1
+                pages.append((column, first, values[first:last]))
+                first = last
+        return pages
+
+    def encodeDict(self, next, column, firstCode, values, buffer=None, offset=0):
+        """values of one dictionary page --> block bytes"""
+        buffer = self.clearBlock(buffer, offset)
+        dictHead.pack_into(buffer, offset, b'T', next, column[0][0:1].encode('ascii'),
+                           column[1], firstCode, len(values))
+        pos = offset + dictHead.size
+        for value in values:
+            text = value.encode('utf-8')
+            packLen20.pack_into(buffer, pos, len(text))
+            buffer[pos + packLen20.size:pos + packLen20.size + len(text)] = text
+            pos += packLen20.size + len(text)
+        return buffer
+
+    def decodeDict(self, block):
+        """dictionary block bytes --> (next, column, first code, values)"""
+        _, next, type, fieldPos, firstCode, numValues = dictHead.unpack_from(block, 0)
+        column = ('node' if type == b'n' else 'edge', fieldPos)
+        values = []
+        pos = dictHead.size
+        for _ in range(numValues):
+            size = block[pos]
+            pos += packLen20.size
+            values.append(str(block[pos:pos + size], 'utf-8'))
+            pos += size
+        return next, column, firstCode, values
+
+    def decode(self, block, readOverflow=None, rid=None):
+        """block bytes --> ('I', rid, keys, links) or ('D', rid, next, slots).
+           readOverflow(rid, size) returns the text of spilled values"""
+        if block[0:1] != self.pageType:
+            return codec.decode(self, block, None, rid)
+
+        rid, next, numSlots, prevKey = self.unpackHead(block)
+        offsets = struct.unpack_from('=' + numSlots * 'H', block, self.pageHead.size)
+        slots = []
+        for pos in offsets:
+            key, pos = self.decodeKey(block, pos, prevKey)
+            prevKey = key
+            slots.append((key, self.decodeFields(block, pos, key, readOverflow)))
+        return ('D', rid, next, slots)
+
+    def decodeFields(self, block, pos, key, readOverflow):
+        """fields of the record with key, starting at pos"""
+        type = 'edge' if key < 0 else 'node'
+        fields = []
+        for i, kind in enumerate(self.fieldKinds[type]):
+            if kind == 'Int':
+                fields.append(packInt.unpack_from(block, pos)[0])
+                pos += packInt.size
+            elif kind == 'DICT':
+                fields.append(self.dicts[(type, i)].values[
+                    packCode.unpack_from(block, pos)[0]])
+                pos += packCode.size
+            elif kind == 'V20':
+                size = block[pos]
+                pos += packLen20.size
+                fields.append(str(block[pos:pos + size], 'utf-8'))
+                pos += size
+            else:
+                size = packLenVar.unpack_from(block, pos)[0]
+                if size == overflowMark:
+                    _, firstRID, size = overflowStub.unpack_from(block, pos)
+                    fields.append(readOverflow(firstRID, size))
+                    pos += overflowStub.size
+                else:
+                    pos += packLenVar.size
+                    fields.append(str(block[pos:pos + size], 'utf-8'))
+                    pos += size
+        return tuple(fields)
+
+    def skipFields(self, block, pos, type, count):
+        """position of field count of a record whose fields start at pos"""
+        for kind in self.fieldKinds[type][:count]:
+            if kind == 'Int':
+                pos += packInt.size
+            elif kind == 'DICT':
+                pos += packCode.size
+            elif kind == 'V20':
+                pos += packLen20.size + block[pos]
+            elif packLenVar.unpack_from(block, pos)[0] == overflowMark:
+                pos += overflowStub.size
+            else:
+                pos += packLenVar.size + packLenVar.unpack_from(block, pos)[0]
+        return pos
+
+    def dictMatches(self, block, type, fieldPos, code, readOverflow=None):
+        """data block bytes --> (next, last key, records of type whose DICT field
+           fieldPos holds code). codes are read straight from the slots,
+           only the matching records are decoded"""
+        rid, next, numSlots, prevKey = self.unpackHead(block)
+        offsets = struct.unpack_from('=' + numSlots * 'H', block, self.pageHead.size)
+        matches = []
+        for pos in offsets:
+            key, pos = self.decodeKey(block, pos, prevKey)
+            prevKey = key
+            if (key < 0) != (type == 'edge'):
+                continue
+            if packCode.unpack_from(block, self.skipFields(block, pos, type, fieldPos))[0] == code:
+                matches.append((key, self.decodeFields(block, pos, key, readOverflow)))
+        return next, prevKey, matches
+
+
+# delta-coded pages (key compression):
+#   index page:  'K', rid, #keys, first key, links (I) ..., varint key deltas ...
+#   data page:   'L', rid, next, #slots, first key, slot directory ..., records
+#   as on slotted pages, a record key is the varint distance to the key before
+#   (0 for the first record). keys are sorted and unique --> deltas are positive
+deltaIndexHead = struct.Struct('=cIHq')
+deltaHead = struct.Struct('=cIqHq')
+packLink = struct.Struct('=I')
+maxVarint = 10      # varint bytes of the largest distance between two 'q' keys
+
+
+def varintSize(value):
+    """bytes taken by value as a varint (7 bits per byte)"""
+    return max(1, (value.bit_length() + 6) // 7)
+
+
+def packVarint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def unpackVarint(block, pos):
+    """varint at pos --> (value, position behind it)"""
+    value, shift = 0, 0
+    while True:
+        byte = block[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class deltaCodec(slottedCodec):
+    """class for encoding/decoding slotted pages with delta-coded keys.
+       index node fill is counted in bytes as well: dense keys take a byte or two
+    """
+
+    pageType = b'L'
+    pageHead = deltaHead
+    keyWidth = maxVarint
+    joinCost = maxVarint - 1    # a run's first key (delta 0) gets a real distance
+
+    def indexLimits(self):
+        """(min, max) bytes of keys + links in an index node.
+           a merge adds at most one entry, the pulled-down pivot and a join"""
+        indexMax = self.blockSize - deltaIndexHead.size - packLink.size
+        entry = packLink.size + maxVarint
+        if indexMax < 8 * entry:
+            raise ValueError("block size of " + str(self.blockSize) +
+                             " bytes is too small for index nodes.")
+        return indexMax // 2 - entry - maxVarint, indexMax
+
+    def indexFill(self, keys):
+        return sum(self.indexSizes(keys))
+
+    def insertRoom(self, slot):
+        """the slot's key distance and the one of the slot after it may both grow"""
+        return self.slotSize(slot) + 2 * self.joinCost
+
+    def keyRoom(self):
+        return packLink.size + 2 * maxVarint
+
+    def indexSizes(self, keys):
+        """link + key distance to the key before (the first key sits in the header)"""
+        sizes = [packLink.size] * len(keys)
+        for i in range(1, len(keys)):
+            sizes[i] += varintSize(keys[i] - keys[i - 1])
+        return sizes
+
+    def slotSize(self, slot):
+        return slottedCodec.slotSize(self, slot) - maxVarint + varintSize(0)
+
+    def slotSizes(self, slots):
+        sizes = [self.slotSize(slot) for slot in slots]
+        for i in range(1, len(slots)):
+            sizes[i] += varintSize(slots[i][0] - slots[i - 1][0]) - varintSize(0)
+        return sizes
+
+    def packHead(self, buffer, offset, rid, next, slots):
+        firstKey = slots[0][0] if len(slots) > 0 else 0
+        deltaHead.pack_into(buffer, offset, b'L', rid, next, len(slots), firstKey)
+
+    def unpackHead(self, block):
+        _, rid, next, numSlots, firstKey = deltaHead.unpack_from(block, 0)
+        return rid, next, numSlots, firstKey
+
+    def encodeKey(self, key, prevKey):
+        if prevKey == None:
+            return packVarint(0)
+        return packVarint(key - prevKey)
+
+    def decodeKey(self, block, pos, prevKey):
+        delta, pos = unpackVarint(block, pos)
+        return prevKey + delta, pos
+
+    def encodeIndex(self, rid, keys, links, buffer=None, offset=0):
+        """index node --> delta-coded block bytes (packed in place if buffer is given)"""
+        buffer = self.clearBlock(buffer, offset)
+        firstKey = keys[0] if len(keys) > 0 else 0
+        deltaIndexHead.pack_into(buffer, offset, b'K', rid, len(keys), firstKey)
+        pos = offset + deltaIndexHead.size
+        struct.pack_into('=' + len(links) * 'I', buffer, pos, *links)
+        pos += len(links) * packLink.size
+        deltas = b''.join([packVarint(keys[i] - keys[i - 1]) for i in range(1, len(keys))])
+        if pos + len(deltas) > offset + self.blockSize:
+            raise ValueError("index node " + str(rid) + " overflows its block.")
+        buffer[pos:pos + len(deltas)] = deltas
+        return buffer
+
+    def decode(self, block, readOverflow=None, rid=None):
+        if block[0:1] != b'K':
+            return slottedCodec.decode(self, block, readOverflow, rid)
+
+        _, rid, numKeys, key = deltaIndexHead.unpack_from(block, 0)
+        pos = deltaIndexHead.size
+        links = list(struct.unpack_from('=' + (numKeys + 1) * 'I', block, pos))
+        pos += (numKeys + 1) * packLink.size
+        keys = []
+        if numKeys > 0:
+            keys.append(key)
+        for _ in range(numKeys - 1):
+            delta, pos = unpackVarint(block, pos)
+            key += delta
+            keys.append(key)
+        return ('I', rid, keys, links)
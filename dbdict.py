@@ -0,0 +1,57 @@
+###################################
+# -- This script is designed to run in Python 3.8 --
+#  dictionaries for DICT attributes: text value <--> small integer code
+###################################
+
+maxCodes = 1 << 16      # codes are stored as 'H' in the records
+
+
+class coded(str):
+    """DICT value shared by every record holding it, carries its code"""
+
+    def __new__(cls, value, code):
+        value = str.__new__(cls, value)
+        value.code = code
+        return value
+
+
+class columnDict():
+    """class for the dictionary of one DICT attribute.
+       codes are handed out in order of first use and never change,
+       so a record keeps its code for the life of the db
+    """
+
+    def __init__(self, type, name):
+        self.type = type            # 'node' or 'edge'
+        self.name = name            # attribute name
+        self.values = []            # code --> coded value
+        self.codes = dict()         # value --> code
+        self.dirty = False          # values added since the pages were written
+
+    def encode(self, value):
+        """code of value, a new value gets the next free code"""
+        code = self.codes.get(value)
+        if code == None:
+            code = len(self.values)
+            if code >= maxCodes:
+                raise ValueError("dictionary of " + self.type + '.' + self.name +
+                                 " is full (" + str(maxCodes) + " values).")
+            self.values.append(coded(value, code))
+            self.codes.update({value: code})
+            self.dirty = True
+        return code
+
+    def intern(self, value):
+        """the shared coded copy of value"""
+        return self.values[self.encode(value)]
+
+    def lookup(self, value):
+        """code of value, None if no record ever held it"""
+        return self.codes.get(value)
+
+    def load(self, firstCode, values):
+        """values of one dictionary page, codes from firstCode on"""
+        for code in range(firstCode, firstCode + len(values)):
+            if code == len(self.values):
+                self.values.append(coded(values[code - firstCode], code))
+                self.codes.update({self.values[code]: code})
@@ -0,0 +1,261 @@
+###################################
+# -- This script is designed to run in Python 3.8 --
+#  secondary attribute indexes: attribute value --> primary keys
+#  indexes live in memory, next to the tree, not in pages of the db file:
+#  memory grows with the indexed records (a Python tuple or dict entry each),
+#  cacheOut rewrites the whole index file, and an index file that doesn't
+#  match the db on open costs a full scan of the records to rebuild
+###################################
+
+import bisect
+import math
+import os
+import struct
+
+# index file layout:
+#   magic, version, #indexes, current flag, stamp (rootRID, dataRootRID, blockCount)
+#   per index: type, attribute, kind, #entries --> all definitions come first,
+#   then the (value, key) entries of each index in the same order.
+#   Int values are 'q', text values (V20/VAR) a 'I' byte length + utf-8 bytes
+#   the current flag is cleared in place before the db file changes after a
+#   save --> a file left behind by a session that didn't end in cacheOut is rebuilt
+indexMagic = b'MBPX'
+indexVersion = 3
+indexHead = struct.Struct('=4sIIIQQQ')
+indexCurrentPos = 12    # offset of the current flag in indexHead
+indexEntryHead = struct.Struct('=4s20scI')
+intEntry = struct.Struct('=qq')
+textEntry = struct.Struct('=qI')    # key, byte length of the value
+
+
+class orderedIndex():
+    """class for an ordered index: sorted (value, key) pairs, serves = < > ≤ ≥.
+       a python list --> add and remove shift the entries behind, O(n) each"""
+
+    kind = 'O'
+
+    def __init__(self, type, name, fieldPos, fieldType):
+        self.type = type            # 'node' or 'edge'
+        self.name = name            # attribute name
+        self.fieldPos = fieldPos    # position in the record fields (key excluded)
+        self.fieldType = fieldType  # 'Int', 'V20' or 'VAR'
+        self.entries = []
+
+    def add(self, key, value):
+        bisect.insort(self.entries, (value, key))
+
+    def remove(self, key, value):
+        i = bisect.bisect_left(self.entries, (value, key))
+        if i < len(self.entries) and self.entries[i] == (value, key):
+            self.entries.pop(i)
+
+    def lookup(self, op, value):
+        """primary keys of entries satisfying (entry value op value)"""
+        first, last = 0, len(self.entries)
+        if op in ['=', '≥']:
+            first = bisect.bisect_left(self.entries, (value,))
+        elif op == '>':
+            first = bisect.bisect_right(self.entries, (value, math.inf))
+        if op in ['=', '≤']:
+            last = bisect.bisect_right(self.entries, (value, math.inf))
+        elif op == '<':
+            last = bisect.bisect_left(self.entries, (value,))
+        return [entry[1] for entry in self.entries[first:last]]
+
+    def supports(self, op):
+        return True
+
+    def fill(self, items):
+        """replace contents with (value, key) items"""
+        self.entries = sorted(items)
+
+    def items(self):
+        return self.entries
+
+
+class hashIndex():
+    """class for a hash index: value --> keys (a dict, in insertion order), serves = only.
+       add and remove are O(1) also for a value shared by many records"""
+
+    kind = 'H'
+
+    def __init__(self, type, name, fieldPos, fieldType):
+        self.type = type
+        self.name = name
+        self.fieldPos = fieldPos
+        self.fieldType = fieldType
+        self.table = dict()
+
+    def add(self, key, value):
+        keys = self.table.get(value)
+        if keys == None:
+            self.table.update({value: {key: None}})
+        else:
+            keys.update({key: None})
+
+    def remove(self, key, value):
+        keys = self.table.get(value)
+        if keys != None and key in keys:
+            del keys[key]
+            if len(keys) == 0:
+                del self.table[value]
+
+    def lookup(self, op, value):
+        return list(self.table.get(value, []))
+
+    def supports(self, op):
+        return op == '='
+
+    def fill(self, items):
+        """replace contents with (value, key) items"""
+        self.table = dict()
+        for value, key in items:
+            self.add(key, value)
+
+    def items(self):
+        return [(value, key) for value, keys in self.table.items() for key in keys]
+
+
+indexKinds = {orderedIndex.kind: orderedIndex, hashIndex.kind: hashIndex}
+
+
+class indexSet():
+    """class for all secondary indexes of one db, kept in step with every insert/delete"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.indexes = dict()   # (type, attribute) --> index
+
+    def fieldInfo(self, type, name):
+        """(position in record fields, attribute type) or None for key/unknown"""
+        fields = self.catalog[type]
+        for i in range(1, len(fields)):
+            if fields[i][0] == name:
+                return i - 1, fields[i][1]
+        return None
+
+    def create(self, type, name, kind, records):
+        """build a new index over records --> returns the index"""
+        fieldPos, fieldType = self.fieldInfo(type, name)
+        index = indexKinds[kind](type, name, fieldPos, fieldType)
+        self.indexes.update({(type, name): index})
+        index.fill([(fields[fieldPos], key) for key, fields in records
+                    if (key >= 0) == (type == 'node')])
+        return index
+
+    def find(self, type, name):
+        return self.indexes.get((type, name))
+
+    def typeIndexes(self, key):
+        type = 'node' if key >= 0 else 'edge'
+        return [index for index in self.indexes.values() if index.type == type]
+
+    def add(self, key, fields):
+        for index in self.typeIndexes(key):
+            index.add(key, fields[index.fieldPos])
+
+    def remove(self, key, fields):
+        for index in self.typeIndexes(key):
+            index.remove(key, fields[index.fieldPos])
+
+    def rebuild(self, records):
+        """refill every index from (key, fields) records"""
+        items = dict([(index, []) for index in self.indexes.values()])
+        for key, fields in records:
+            for index in self.typeIndexes(key):
+                items[index].append((fields[index.fieldPos], key))
+        for index in self.indexes.values():
+            index.fill(items[index])
+
+    def save(self, filename, stamp, current=True):
+        """write every index to filename (current --> it matches the db file as
+           stamped): a temp file renamed over it --> a crash leaves the old file
+           or the new one, never half of it"""
+        data = bytearray(indexHead.pack(
+            indexMagic, indexVersion, len(self.indexes), int(current), *stamp))
+        allItems = [index.items() for index in self.indexes.values()]
+        for index, items in zip(self.indexes.values(), allItems):
+            data += indexEntryHead.pack(index.type.encode('ascii'),
+                                        index.name.encode('ascii'),
+                                        index.kind.encode('ascii'), len(items))
+        for index, items in zip(self.indexes.values(), allItems):
+            for value, key in items:
+                if index.fieldType == 'Int':
+                    data += intEntry.pack(value, key)
+                else:
+                    value = value.encode('utf-8')
+                    data += textEntry.pack(key, len(value)) + value
+        file = open(filename + '.tmp', 'wb')
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+        file.close()
+        os.replace(filename + '.tmp', filename)
+
+
+def invalidate(filename):
+    """mark the index file no longer current (on disk before returning),
+       its definitions stay for the rebuild"""
+    if not os.path.exists(filename):
+        return
+    file = open(filename, 'rb+')
+    file.seek(indexCurrentPos)
+    file.write(struct.pack('=I', 0))
+    file.flush()
+    os.fsync(file.fileno())
+    file.close()
+
+
+def loadIndexes(filename, catalog):
+    """read indexes from filename --> (indexSet, stamp), stamp is None w/o file,
+       if it isn't current or its entries don't read back (the definitions
+       that did read back are returned empty, for a rebuild)"""
+    indexes = indexSet(catalog)
+    if not os.path.exists(filename):
+        return indexes, None
+
+    file = open(filename, 'rb')
+    data = file.read()
+    file.close()
+    try:
+        magic, version, numIndexes, current, *stamp = indexHead.unpack_from(data, 0)
+        if magic != indexMagic or version != indexVersion:
+            return indexes, None
+        pos = indexHead.size
+        counts = []
+        for _ in range(numIndexes):
+            type, name, kind, count = indexEntryHead.unpack_from(data, pos)
+            pos += indexEntryHead.size
+            type = type.decode('ascii')
+            name = name.partition(b'\x00')[0].decode('ascii')
+            kind = kind.decode('ascii')
+            info = indexes.fieldInfo(type, name)
+            if info == None or kind not in indexKinds:  # catalog changed under the file
+                return indexSet(catalog), None
+            index = indexKinds[kind](type, name, info[0], info[1])
+            indexes.indexes.update({(type, name): index})
+            counts.append(count)
+    except (struct.error, UnicodeDecodeError):
+        return indexSet(catalog), None
+
+    try:
+        for index, count in zip(indexes.indexes.values(), counts):
+            items = []
+            for _ in range(count):
+                if index.fieldType == 'Int':
+                    value, key = intEntry.unpack_from(data, pos)
+                    pos += intEntry.size
+                else:
+                    key, length = textEntry.unpack_from(data, pos)
+                    pos += textEntry.size
+                    if pos + length > len(data):
+                        raise struct.error('index file cut short')
+                    value = data[pos:pos + length].decode('utf-8')
+                    pos += length
+                items.append((value, key))
+            index.fill(items)
+    except (struct.error, UnicodeDecodeError):
+        return indexes, None
+    if current != 1:
+        return indexes, None
+    return indexes, tuple(stamp)
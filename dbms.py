@@ -7,6 +7,8 @@ import BTree
 import parse
 import sys
 import os
+import math
+import heapq
 import concurrent.futures
 import WGraph
 import BuildTube
@@ -83,9 +85,9 @@ def CATAtterVerifier():
         if parms[1] not in ['node', 'edge']:
             ExitAngry("Attr.cat error: attribute type '" +
                       parms[2] + "' is not a node or edge.")
-        if parms[3] not in ['Int', 'V20']:
+        if parms[3] not in ['Int', 'V20', 'VAR', 'DICT']:
             ExitAngry("Attr.cat error: attribute type '" +
-                      parms[3] + "' is unknown. Must use 'Int' or 'V20'.")
+                      parms[3] + "' is unknown. Must use 'Int', 'V20', 'VAR' or 'DICT'.")
         if parms[3] != 'Int' and parms[4] == '1':
             ExitAngry("Attr.cat error: attribute '" +
                       parms[2] + "' must be 'Int' type.")
@@ -109,44 +111,72 @@ def CATAtterVerifier():
     pass
 
 
-def findFirstNode(leafNodes):
-    """given sorted list of tuples with keys ---> return index wof first non-negative key value"""
-
-    if len(leafNodes) == 0:
-        return None
-
-    lower = 0
-    upper = len(leafNodes)
-    index = len(leafNodes) // 2
-    done = False
-    while not done:
-        if leafNodes[index][0] == 0:
-            return index
-        elif leafNodes[index][0] < 0:
-            lower = index
-            index = int(0.5 * (lower + upper))
-        elif leafNodes[index][0] > 0:
-            upper = index
-            index = int(0.5 * (lower + upper))
-        if abs(lower - upper) <= 1:
-            done = True
-
-    if leafNodes[lower][0] >= 0:
-        return lower
-    else:
-        return upper
+def parseVertsEdges(db, nodes=True, edges=True):
+    """range scan nodes (keys >= 0) and/or edges (keys < 0) --> nodeList, edgeList"""
+    nodeList, edgeList = [], []
+    if nodes:
+        nodeList = list(db.rangeScan(0, None))
+    if edges:
+        edgeList = list(db.rangeScan(None, -1))
 
+    return nodeList, edgeList
 
-def parseVertsEdges(db):
-    AllTheData = db.ReadOut()
-    split = findFirstNode(AllTheData)
-    if split != None:
-        edgeList = AllTheData[0:split]
-        nodeList = AllTheData[split:]
-    else:
-        edgeList = []
-        nodeList = []
 
+def indexedEntries(db, type, conditions, postfix, attrs):
+    """entries of type narrowed down by a secondary index (or by the codes of a
+       dictionary-encoded attribute), None if neither applies"""
+    if parse.referencedTypes(conditions) != [type]:
+        return None
+    terms = parse.indexTerms(type, postfix, attrs)
+    for name, op, value in terms:
+        index = db.indexes.find(type, name)
+        if index != None and index.supports(op):
+            return db.indexScan(index, op, value)
+    for name, op, value in terms:
+        if op == '=':
+            entries = db.dictScan(type, name, value)
+            if entries != None:
+                return entries
+    return None
+
+
+def shortestPath(db, initKey, termKey, attrs):
+    """Dijkstra from initKey along out-edges of the adjacency index, stops once
+       termKey is settled --> prevVerts, succEdges, distance (by node key)"""
+    linkToPos = parse.getFieldPos('edge', 'LinkTo', attrs)[0] - 1
+    prevVerts, succEdges = {initKey: -1}, {initKey: -1}
+    distance = {termKey: math.inf, initKey: 0}
+    visited = dict()
+    heap = [(0, initKey)]     # ties settle the lowest node key first
+    while len(heap) > 0:
+        dist, currKey = heapq.heappop(heap)
+        if currKey in visited:
+            continue
+        visited.update({currKey: 1})
+        if currKey == termKey:
+            break
+        for edgeKey, fields in db.outEdges(currKey):
+            tarKey = fields[linkToPos]
+            altPath = dist + 7      # every edge has the same weight
+            if altPath < distance.get(tarKey, math.inf):
+                distance.update({tarKey: altPath})
+                prevVerts.update({tarKey: currKey})
+                succEdges.update({tarKey: edgeKey})
+                heapq.heappush(heap, (altPath, tarKey))
+
+    return prevVerts, succEdges, distance
+
+
+def pathEntries(db, initKey, termKey, prevVerts, succEdges, distance):
+    """node and edge records along the path found by shortestPath"""
+    nodeList, edgeList = [], []
+    if distance[termKey] != math.inf:
+        key = termKey
+        nodeList.append((key, db.searchKey(key)))
+        while key != initKey:
+            edgeList.append((succEdges[key], db.searchKey(succEdges[key])))
+            key = prevVerts[key]
+            nodeList.append((key, db.searchKey(key)))
     return nodeList, edgeList
 
 
@@ -170,6 +200,37 @@ def packageGraph(nodeName, edgeName, attrs, nodeList, edgeList):
     return dbGraph
 
 
+def putEntry(db, type, fields, attrs):
+    """fields of one PUT tuple --> (None, entry) or (False, None) once the error is printed"""
+    # fixed-width pages (version 3 and older files) hold ASCII text only
+    asciiText = db.cache.header['version'] <= BTree.fixedVersion
+    entry = parse.entryVerifyer(type, fields, attrs, asciiText)
+
+    if entry[0] == None:
+        if type == 'node':
+            if entry[1][0] < 0:
+                entry = (True, 'node key cannot be a negative integer.')
+        else:
+            if entry[1][0] <= 0:
+                entry = (True, 'edge key must be a positive integer.')
+    if entry[0] == True:
+        print("\t   ", entry[1])
+        return (False, None)
+
+    if type == 'edge':
+        entry[1][0] = 0 - entry[1][0]
+        linkFm = entry[1][int(parse.getFieldPos('edge', 'LinkFrom', attrs)[0])]
+        linkTo = entry[1][int(parse.getFieldPos('edge', 'LinkTo', attrs)[0])]
+
+        if db.searchKey(linkFm) == None:
+            entry = (False, None)
+            print("\t   ", "node with key ", linkFm, " not in database.", sep='')
+        if db.searchKey(linkTo) == None:
+            entry = (False, None)
+            print("\t   ", "node with key ", linkTo, " not in database.", sep='')
+    return entry
+
+
 def printSchema(attrType, attrs):
     fields = '( '
     for att in Attrs[attrType]:
@@ -184,6 +245,18 @@ if __name__ == "__main__":
         ExitAngry(
             "No database file given. Please restart with a database file as an argument.")
     dbFilename = sys.argv[1]
+    useMmap = '--mmap' in sys.argv[2:]     # optional memory-mapped block I/O
+    compressKeys = '--compress-keys' in sys.argv[2:]   # delta-coded keys (new dbs)
+    logCommit = None    # redo log: every command is durable once done, not just EXIT
+    if '--wal' in sys.argv[2:]:
+        logCommit = BTree.defaultLogCommit
+    backgroundWriter = '--writer' in sys.argv[2:]   # page writes off the command path
+    checkpointInterval = None
+    if backgroundWriter:
+        checkpointInterval = BTree.defaultCheckpointInterval
+    splitPolicy = BTree.splitEven   # append splits: sequential ids fill their pages
+    if '--append-splits' in sys.argv[2:]:
+        splitPolicy = BTree.splitAppend
 
     # aquire catalog information.
     FileTable = BTree.CATTableFileReader('Table.cat', dbFilename)
@@ -205,11 +278,18 @@ if __name__ == "__main__":
               " does not exist. Creating new database.", sep='')
         numBlocks = getValidInt("\tEnter number of blocks: ")
         DBfile = open(dbFilename, 'wb+')
-        MyTree = BTree.BPlusTree(numBlocks, DBfile, Attrs)
+        MyTree = BTree.BPlusTree(numBlocks, DBfile, Attrs, useMmap=useMmap,
+                                 compressKeys=compressKeys, logCommit=logCommit,
+                                 backgroundWriter=backgroundWriter,
+                                 checkpointInterval=checkpointInterval,
+                                 splitPolicy=splitPolicy)
         MyTree.newDB()
     else:
         DBfile = open(dbFilename, 'rb+')
-        MyTree = BTree.BPlusTree(1, DBfile, Attrs)
+        MyTree = BTree.BPlusTree(1, DBfile, Attrs, useMmap=useMmap,
+                                 logCommit=logCommit, backgroundWriter=backgroundWriter,
+                                 checkpointInterval=checkpointInterval,
+                                 splitPolicy=splitPolicy)
         MyTree.readDB()
 
     print("┌──────────────────────────────────────────────────────┐")
@@ -269,7 +349,6 @@ if __name__ == "__main__":
                     error = (True, "second field not an node attribute.")
 
             if error[0] == None:
-                vertList, EdgeList = parseVertsEdges(MyTree)
                 argType = args[0].lower()
                 if argType in ['node', 'edge']:
                     postfixConditions = True
@@ -277,8 +356,25 @@ if __name__ == "__main__":
                         conditions = conditions.replace('■', ' ')
                         postfixConditions = parse.InFix2Postfix(
                             conditions, parse.logicList)
-                    FoundEntries = parse.FindMatch(
-                        args[0].lower(), vertList, EdgeList, postfixConditions, Attrs)
+                    # use an index if one applies, o.w. only scan the object types the query looks at
+                    vertList, EdgeList = [], []
+                    entries = indexedEntries(
+                        MyTree, argType, conditions, postfixConditions, Attrs)
+                    if entries == None:
+                        scanTypes = [argType] + \
+                            parse.referencedTypes(conditions)
+                        vertList, EdgeList = parseVertsEdges(
+                            MyTree, 'node' in scanTypes, 'edge' in scanTypes)
+                    elif argType == 'node':
+                        vertList = entries
+                    else:
+                        EdgeList = entries
+
+                    if entries == []:
+                        FoundEntries = []
+                    else:
+                        FoundEntries = parse.FindMatch(
+                            args[0].lower(), vertList, EdgeList, postfixConditions, Attrs)
 
                     if FoundEntries == []:
                         FoundEntries = ['empty']
@@ -292,28 +388,36 @@ if __name__ == "__main__":
                         parse.printEntryByFields(
                             args[0].lower(), fields, FoundEntries, Attrs)
                 elif argType == 'path':
+                    vertList = None
                     # parse path conditions
                     conditions = conditions.replace('■', ' ')
                     splitter = conditions.split('→')
                     if len(splitter) == 2:
-                        PfixInit = parse.InFix2Postfix(
-                            splitter[0], parse.logicList)
-                        PfixTerm = parse.InFix2Postfix(
-                            splitter[1], parse.logicList)
-                        err1 = parse.findNode(PfixInit, vertList, Attrs)
-                        err2 = parse.findNode(PfixTerm, vertList, Attrs)
+                        ends = []
+                        for cond in splitter:
+                            Pfix = parse.InFix2Postfix(cond, parse.logicList)
+                            # end nodes through an index if one applies, o.w. scan the nodes (once)
+                            entries = indexedEntries(
+                                MyTree, 'node', cond, Pfix, Attrs)
+                            if entries == None:
+                                if vertList == None:
+                                    vertList = parseVertsEdges(
+                                        MyTree, True, False)[0]
+                                entries = vertList
+                            ends.append(parse.findNode(Pfix, entries, Attrs))
+                        err1, err2 = ends
                         if err1[0] == None:
                             print(err1[1])
                         elif err2[0] == None:
                             print(err2[1])
                         else:
                             InitVal, TermVal = err1, err2
-                            dbGraph = packageGraph(
-                                fields[0], fields[1], Attrs, vertList, EdgeList)
-                            vertP, edgeP, dist = dbGraph.DijkstraShortestPath(
-                                InitVal[0])
+                            vertP, edgeP, dist = shortestPath(
+                                MyTree, InitVal[0], TermVal[0], Attrs)
+                            pathNodes, pathEdges = pathEntries(
+                                MyTree, InitVal[0], TermVal[0], vertP, edgeP, dist)
                             parse.printPath(
-                                InitVal[0], TermVal[0], fields, vertP, edgeP, dist, vertList, EdgeList, Attrs)
+                                InitVal[0], TermVal[0], fields, vertP, edgeP, dist, pathNodes, pathEdges, Attrs)
                     else:
                         error = (
                             True, '2 nodes required:  node1.attr TO node2.attr')
@@ -335,45 +439,21 @@ if __name__ == "__main__":
 
             if error[0] == None:
                 if fields != []:
-                    vertList, EdgeList = parseVertsEdges(MyTree)
-                    fields = parse.parseFields(inputLine)
-                    entry = parse.entryVerifyer(args[0], fields, Attrs)
-
-                    if entry[0] == None:
-                        if args[0].lower() == 'node':
-                            if entry[1][0] < 0:
-                                entry = (
-                                    True, 'node key cannot be a negative integer.')
-                        else:
-                            if entry[1][0] <= 0:
-                                entry = (
-                                    True, 'edge key must be a positive integer.')
-                        if entry[0] == True:
-                            print("\t   ", entry[1])
-                    if entry[0] == None:
-                        if args[0].lower() == 'edge':
-                            entry[1][0] = 0 - entry[1][0]
-                            linkFm = entry[1][int(parse.getFieldPos(
-                                'edge', 'LinkFrom', Attrs)[0])]
-                            linkTo = entry[1][int(parse.getFieldPos(
-                                'edge', 'LinkTo', Attrs)[0])]
-
-                            if MyTree.searchKey(linkFm) == None:
-                                entry = (False, None)
-                                print("\t   ", "node with key ", linkFm,
-                                      " not in database.", sep='')
-                            if MyTree.searchKey(linkTo) == None:
-                                entry = (False, None)
-                                print("\t   ", "node with key ", linkTo,
-                                      " not in database.", sep='')
-
+                    # PUT <type> (..),(..),... --> all entries or none
+                    entries = []
+                    for fields in parse.parseTuples(inputLine):
+                        entry = putEntry(MyTree, args[0].lower(), fields, Attrs)
                         if entry[0] == None:
-                            error = MyTree.insertKey(entry[1])
-                            if error == 'full':
-                                print(
-                                    '\t   ', 'Cannot insert entry. Database is full')
-                    else:
-                        print('\t   ', entry[1])
+                            entries.append(entry[1])
+                        else:
+                            entries = None
+                            break
+
+                    if entries != None:
+                        error = MyTree.insertMany(entries)
+                        if error == 'full':
+                            print(
+                                '\t   ', 'Cannot insert entry. Database is full')
                 else:
                     printSchema(args[0].lower(), Attrs)
             else:
@@ -396,15 +476,31 @@ if __name__ == "__main__":
                 error = parse.argsVerifier(args, fields, Attrs)
 
             if error[0] == None:
-                vertList, EdgeList = parseVertsEdges(MyTree)
+                argType = args[0].lower()
                 postfixConditions = True
                 if conditions != None:
                     conditions = conditions.replace('■', ' ')
                     postfixConditions = parse.InFix2Postfix(
                         conditions, parse.logicList)
 
-                FoundEntries = parse.FindMatch(
-                    args[0].lower(), vertList, EdgeList, postfixConditions, Attrs)
+                # use an index if one applies, o.w. only scan the object types the query looks at
+                vertList, EdgeList = [], []
+                entries = indexedEntries(
+                    MyTree, argType, conditions, postfixConditions, Attrs)
+                if entries == None:
+                    scanTypes = [argType] + parse.referencedTypes(conditions)
+                    vertList, EdgeList = parseVertsEdges(
+                        MyTree, 'node' in scanTypes, 'edge' in scanTypes)
+                elif argType == 'node':
+                    vertList = entries
+                else:
+                    EdgeList = entries
+
+                if entries == []:
+                    FoundEntries = []
+                else:
+                    FoundEntries = parse.FindMatch(
+                        argType, vertList, EdgeList, postfixConditions, Attrs)
                 if len(FoundEntries) > 1 and FoundEntries[0] == None:
                     print(FoundEntries[1])
                 else:
@@ -429,25 +525,37 @@ if __name__ == "__main__":
                             [entry for entry in FoundEntries if entry[0] >= 0])
                         edgesDel = 0
                         print(" nodes to delete: ", nodesDel)
+                        # orphan edges straight from the adjacency index
+                        DepEdges = set()
                         for entry in FoundEntries:
-                            MyTree.deleteKey(entry[0])
-                            DepEdges, EdgeList = parse.findDependantEdges(
-                                entry[0], EdgeList, Attrs)
-                            edgesDel += len(DepEdges)
-                            for edgekey in DepEdges:
-                                MyTree.deleteKey(edgekey)
+                            DepEdges.update(MyTree.incidentEdges(entry[0]))
+                        edgesDel = len(DepEdges)
+                        # one pass over the tree for each batch, rebalanced once
+                        if conditions == None:
+                            MyTree.deleteRange(0, None)
+                        else:
+                            MyTree.deleteMany(
+                                [entry[0] for entry in FoundEntries])
+                        MyTree.deleteMany(DepEdges)
 
                         print("\t\t", nodesDel, " nodes deleted. ",
                               edgesDel, " orphan edges deleted.", sep='')
 
                     elif args[0].lower() == 'edge':
                         edgesDel = len(FoundEntries)
-                        for entry in FoundEntries:
-                            MyTree.deleteKey(entry[0])
+                        if conditions == None:
+                            MyTree.deleteRange(None, -1)
+                        else:
+                            MyTree.deleteMany(
+                                [entry[0] for entry in FoundEntries])
                         print("\t\t", edgesDel, " edges deleted.", sep='')
             else:
                 print(error[1])
 
+        # a changing command ends in a group commit (no-op w/o redo log)
+        if command in ['PUT', 'DELETE']:
+            MyTree.commit()
+
 ########################
 
         if command == 'VISUAL':
@@ -486,21 +594,71 @@ if __name__ == "__main__":
 
 ########################
 
-        # # load the london tube system
-        # if command == 'LOAD':
-        #     nodelst, edgelst = BuildTube.TubeIT()
+        if command == 'CREATE':
+            error = (None, True)
+            kind = 'O'
+            if len(args) > 0 and args[0].upper() in ['HASH', 'ORDERED']:
+                if args[0].upper() == 'HASH':
+                    kind = 'H'
+                args = args[1:]
+            if len(args) != 2 or args[0].upper() != 'INDEX':
+                error = (True, "\t   " +
+                         'CREATE [HASH/ORDERED] INDEX <node/edge> (field)')
+            elif args[1].lower() not in ['node', 'edge']:
+                error = (True, "\t   '" + args[1] + "': unknown object type.")
+            elif len(fields) != 1:
+                error = (True, "\t   " + 'CREATE INDEX ' +
+                         args[1] + ' (???) needs exactly one field.')
+                printSchema(args[1].lower(), Attrs)
+            else:
+                valpos, fieldType = parse.getFieldPos(
+                    args[1], fields[0], Attrs)
+                if fieldType == None:
+                    error = (True, "\t   " +
+                             "Query error: object does not has attribute '" + fields[0] + "'")
+                elif valpos == 0:
+                    error = (True, "\t   '" + fields[0] +
+                             "' is the key, entries are already ordered by it.")
+                elif MyTree.indexes.find(args[1].lower(), fields[0]) != None:
+                    error = (True, "\t   " + args[1].lower() + '.' +
+                             fields[0] + ' already has an index.')
+
+            if error[0] == None:
+                MyTree.createIndex(args[1].lower(), fields[0], kind)
+                print("\t   index created on ",
+                      args[1].lower(), '.', fields[0], sep='')
+            else:
+                print(error[1])
+
+########################
+
+        # load the london tube system
+        if command == 'LOAD':
+            if FileTable != 'londonTube':
+                print("\t   LOAD is only available for the londonTube table.")
+            else:
+                nodelst, edgelst = BuildTube.TubeIT()
+                entries = [node for node in nodelst]
+                for edge in edgelst:
+                    entries.append([0 - edge[0]] + edge[1:])
+                result = MyTree.bulkLoad(entries)
+                if result == 'full':
+                    print('\t   ', 'Cannot load entries. Database is full')
+                elif result == 'busy':
+                    print('\t   ', 'Cannot load while snapshots are open')
+                DBfile = MyTree.file    # loaded into a fresh file under the same name
 
-        #     for node in nodelst:
-        #         print(node, flush=True)
-        #         MyTree.insertKey(node)
+########################
 
-        #     for edge in edgelst:
-        #         entry = []
-        #         entry.append(0 - edge[0])
-        #         for val in edge[1:]:
-        #             entry.append(val)
-        #         print(entry)
-        #         MyTree.insertKey(entry)
+        # rewrite the db file in key order, cut to its live size
+        if command == 'VACUUM':
+            oldCount = MyTree.cache.header['blockCount']
+            if MyTree.vacuum() == 'busy':
+                print('\t   ', 'Cannot vacuum while snapshots are open')
+            else:
+                DBfile = MyTree.file
+                print("\t   db file rewritten: ", oldCount, " --> ",
+                      MyTree.cache.header['blockCount'], " blocks", sep='')
 
 ########################
 
@@ -517,7 +675,7 @@ if __name__ == "__main__":
             if args == []:
                 print("\t   HELP <command> -- provides expected grammar of <command>")
                 print(
-                    "\t\t available commands are: GET, PUT, DELETE, VISUAL, EXIT, HELP")
+                    "\t\t available commands are: GET, PUT, DELETE, VISUAL, CREATE, LOAD, VACUUM, EXIT, HELP")
             elif args[0].upper() == 'GET':
                 print("\t   GET <node/edge> (field, ..., field) WHERE <condition>")
                 print(
@@ -530,6 +688,8 @@ if __name__ == "__main__":
                     "\t   PUT <node/edge>                      returns schema for type")
                 print(
                     "\t   PUT <node/edge> (field, ..., field)  will insert/overwrite an entry")
+                print(
+                    "\t   PUT <node/edge> (...), ..., (...)    will insert/overwrite entries")
             elif args[0].upper() == 'DELETE':
                 print("\t   DELETE <node/edge> WHERE <condition>")
                 print(
@@ -540,6 +700,17 @@ if __name__ == "__main__":
                 print("\t   VISUAL (node.field, edge.field)")
                 print("\t\t Force-directed graph visualization.")
                 print("\t\t Nodes and edges labeled by node.field and edge.field")
+            elif args[0].upper() == 'CREATE':
+                print("\t   CREATE INDEX <node/edge> (field)")
+                print("\t\t ordered index on field, used by GET/DELETE for = < > <= >= conditions")
+                print("\t   CREATE HASH INDEX <node/edge> (field)")
+                print("\t\t hash index on field, used by GET/DELETE for = conditions")
+            elif args[0].upper() == 'LOAD':
+                print("\t   LOAD")
+                print("\t\t bulk loads the London tube nodes and edges from LondonTube.txt")
+            elif args[0].upper() == 'VACUUM':
+                print("\t   VACUUM")
+                print("\t\t rewrites the db file in key order and cuts it to its live size")
             elif args[0].upper() == 'EXIT':
                 print("\t   EXIT ")
                 print(
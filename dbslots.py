@@ -0,0 +1,82 @@
+###################################
+# -- This script is designed to run in Python 3.8 --
+#  slot lists: the records of a data node, stored compact
+###################################
+
+import array
+import bisect
+
+
+class slotList():
+    """the sorted (key, fields) slots of a data node.
+       keys:    array('q') --> 8 bytes a key, no int objects
+       records: the field tuples, in key order
+       no (key, fields) pair is kept: indexing, slicing and iterating build
+       them on the way out, so it reads like the list of slots it stands for
+    """
+
+    __slots__ = ('keys', 'records')
+
+    def __init__(self, slots=()):
+        self.keys = array.array('q', [slot[0] for slot in slots])
+        self.records = [slot[1] for slot in slots]
+
+    @classmethod
+    def part(cls, keys, records):
+        """slot list over keys (an array('q')) and records, taken as they are"""
+        slots = cls.__new__(cls)
+        slots.keys = keys
+        slots.records = records
+        return slots
+
+    def find(self, key):
+        """position of the first slot with slot key >= key"""
+        return bisect.bisect_left(self.keys, key)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        return zip(self.keys, self.records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return slotList.part(self.keys[index], self.records[index])
+        return (self.keys[index], self.records[index])
+
+    def __setitem__(self, index, slot):
+        self.keys[index] = slot[0]
+        self.records[index] = slot[1]
+
+    def __delitem__(self, index):
+        del self.keys[index]
+        del self.records[index]
+
+    def __add__(self, other):
+        if not isinstance(other, slotList):
+            other = slotList(other)
+        return slotList.part(self.keys + other.keys, self.records + other.records)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def insert(self, index, slot):
+        self.keys.insert(index, slot[0])
+        self.records.insert(index, slot[1])
+
+    def append(self, slot):
+        self.keys.append(slot[0])
+        self.records.append(slot[1])
+
+    def pop(self, index=-1):
+        return (self.keys.pop(index), self.records.pop(index))
+
+
+def keyArray(keys):
+    """index node keys/links as an array('q') (8 bytes each, no int objects)"""
+    if isinstance(keys, array.array):
+        return keys
+    return array.array('q', keys)
@@ -0,0 +1,144 @@
+###################################
+# -- This script is designed to run in Python 3.8 --
+#  snapshots: read-only views of the db as of one moment, read next to the writer
+###################################
+
+import bisect
+import dbcodec
+
+
+class snapshot():
+    """class for a read-only view of one db.
+       the tree hands over its root and the images of the blocks not on disk yet,
+       a block overwritten later gets its old image saved in blocks first
+       (copy on write) --> the view never changes. saved images go on release
+    """
+
+    def __init__(self, codec, rootRID, blocks, io, disk, release, edgeFields=None):
+        self.codec = codec
+        self.rootRID = rootRID      # descents start here
+        self.blocks = blocks        # rid --> block image as of the snapshot
+        self.io = io                # io() guards blocks and the db file
+        self.disk = disk            # disk(rid) --> block image in the db file
+        self.onRelease = release
+        self.edgeFields = edgeFields or dict()  # adjacency field --> record position
+        self.adjacency = dict()     # field --> node key --> edges, built on first use
+        self.index = dict()         # rid --> decoded index node (read over and over)
+        self.live = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def release(self):
+        """the tree stops saving blocks for the snapshot, saved images are dropped"""
+        if self.live:
+            self.live = False
+            self.onRelease(self)
+            self.blocks = dict()
+            self.index = dict()
+            self.adjacency = dict()
+
+    def block(self, rid):
+        with self.io():
+            block = self.blocks.get(rid)
+            if block == None:
+                block = self.disk(rid)
+        return block
+
+    def readOverflow(self, refID, size):
+        """text stored on the overflow chain starting at block refID"""
+        pieces = []
+        nextRID = refID
+        while nextRID != -1:
+            nextRID, piece = self.codec.decodeOverflow(self.block(nextRID))
+            pieces.append(piece)
+        return dbcodec.spilled(str(b''.join(pieces)[0:size], 'utf-8'), refID, size)
+
+    def node(self, rid):
+        """('I', rid, keys, links) or ('D', rid, next, slots) of block rid"""
+        node = self.index.get(rid)
+        if node == None:
+            node = self.codec.decode(self.block(rid), self.readOverflow, rid)
+            if node[0] == 'I':
+                self.index.update({rid: node})
+        return node
+
+    def findLeaf(self, key):
+        """data node holding key (None --> the first one)"""
+        node = self.node(self.rootRID)
+        while node[0] == 'I':
+            if key == None:
+                node = self.node(node[3][0])
+            else:
+                node = self.node(node[3][bisect.bisect_right(node[2], key)])
+        return node
+
+    def searchKey(self, key):
+        """search snapshot for key --> return tuple"""
+        slots = self.findLeaf(key)[3]
+        i = bisect.bisect_left(slots, (key,))
+        if i < len(slots) and slots[i][0] == key:
+            return slots[i][1]
+        return None
+
+    def rangeScan(self, lo=None, hi=None, reverse=False):
+        """yields (key, fields) for lo <= key <= hi in key order (None --> unbounded)"""
+        if reverse:
+            yield from self.recScan(self.node(self.rootRID), lo, hi)
+            return
+        node = self.findLeaf(lo)
+        index = 0 if lo == None else bisect.bisect_left(node[3], (lo,))
+        while True:
+            slots = node[3]
+            while index < len(slots):
+                if hi != None and slots[index][0] > hi:
+                    return
+                yield slots[index]
+                index += 1
+            if node[2] == -1:
+                return
+            node = self.node(node[2])
+            index = 0
+
+    def recScan(self, node, lo, hi):
+        """Recursive portion of reverse range scan"""
+        if node[0] == 'I':
+            first = 0 if lo == None else bisect.bisect_right(node[2], lo)
+            last = len(node[3]) - 1 if hi == None else bisect.bisect_right(node[2], hi)
+            for index in range(last, first - 1, -1):
+                yield from self.recScan(self.node(node[3][index]), lo, hi)
+        else:
+            slots = node[3]
+            first = 0 if lo == None else bisect.bisect_left(slots, (lo,))
+            last = len(slots)
+            if hi != None:
+                last = bisect.bisect_left(slots, (hi,))
+                if last < len(slots) and slots[last][0] == hi:
+                    last += 1
+            for index in range(last - 1, first - 1, -1):
+                yield slots[index]
+
+    def ReadOut(self):
+        """Get list of all key values in snapshot"""
+        return list(self.rangeScan())
+
+    def edges(self, name, nodeKey):
+        """edge records whose field name holds nodeKey, in key order"""
+        if name not in self.adjacency:  # one edge scan for all lookups
+            fieldPos = self.edgeFields[name]
+            byNode = dict()
+            for key, data in self.rangeScan(None, -1):
+                byNode.setdefault(data[fieldPos], []).append((key, data))
+            self.adjacency.update({name: byNode})
+        return self.adjacency[name].get(nodeKey, [])
+
+    def outEdges(self, nodeKey):
+        """edge records leaving node nodeKey, in key order"""
+        return self.edges('LinkFrom', nodeKey)
+
+    def inEdges(self, nodeKey):
+        """edge records entering node nodeKey, in key order"""
+        return self.edges('LinkTo', nodeKey)
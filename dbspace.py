@@ -0,0 +1,105 @@
+###################################
+# -- This script is designed to run in Python 3.8 --
+#  free-space manager for db blocks
+###################################
+
+
+class spaceMap():
+    """class for tracking used/free blocks
+       bitmap: one bit per block (persisted with the db)
+       free:   stack of free block ids for O(1) allocate/free.
+               entries go stale when a block is taken by a neighbour request,
+               they are skipped on pop (the bitmap has the final say)
+    """
+
+    nearby = 4      # blocks checked on each side of a neighbour page
+
+    def __init__(self, blockCount, bitmap=None):
+        self.blockCount = blockCount
+        if bitmap == None:
+            self.bitmap = bytearray((blockCount + 7) // 8)
+        else:
+            self.bitmap = bytearray(bitmap)
+        self.freeCount = 0
+        self.free = []
+        self.rebuildFree()
+
+    def rebuildFree(self):
+        """restack every free block, lowest id on top"""
+        self.free = [rid for rid in range(self.blockCount - 1, -1, -1)
+                     if not self.bitmap[rid >> 3] & (1 << (rid & 7))]
+        self.freeCount = len(self.free)
+
+    def compactFree(self):
+        """drop stale and duplicate entries from the free stack"""
+        seen = set()
+        free = []
+        for rid in self.free:
+            if rid not in seen and not self.isUsed(rid):
+                seen.add(rid)
+                free.append(rid)
+        self.free = free
+
+    def isUsed(self, rid):
+        return self.bitmap[rid >> 3] & (1 << (rid & 7)) != 0
+
+    def take(self, rid):
+        self.bitmap[rid >> 3] |= 1 << (rid & 7)
+        self.freeCount -= 1
+        # stale entries outnumber the free blocks --> amortized cleanup
+        if len(self.free) > 2 * self.freeCount + 64:
+            self.compactFree()
+
+    def allocate(self, near=None):
+        """returns a free block id (close to block near if possible) or None"""
+        if self.freeCount == 0:
+            return None
+        if near != None:    # keep siblings physically clustered
+            for step in range(1, self.nearby + 1):
+                for rid in (near + step, near - step):
+                    if 0 <= rid < self.blockCount and not self.isUsed(rid):
+                        self.take(rid)
+                        return rid
+        while True:
+            rid = self.free.pop()
+            if not self.isUsed(rid):
+                self.take(rid)
+                return rid
+
+    def release(self, rid):
+        """return block to the free pool"""
+        if self.isUsed(rid):
+            self.bitmap[rid >> 3] &= ~(1 << (rid & 7))
+            self.freeCount += 1
+            self.free.append(rid)
+
+    def grow(self, newCount):
+        """add free blocks up to newCount"""
+        self.bitmap.extend(bytearray((newCount + 7) // 8 - len(self.bitmap)))
+        self.free.extend(range(newCount - 1, self.blockCount - 1, -1))
+        self.freeCount += newCount - self.blockCount
+        self.blockCount = newCount
+
+    def reset(self, usedCount):
+        """mark blocks [0, usedCount) used and everything else free"""
+        self.bitmap = bytearray((self.blockCount + 7) // 8)
+        for rid in range(usedCount):
+            self.bitmap[rid >> 3] |= 1 << (rid & 7)
+        self.rebuildFree()
+
+    def toBytes(self):
+        return bytes(self.bitmap)
+
+    def toArray(self):
+        """one 0/1 byte per block (original map layout)"""
+        return bytearray([1 if self.isUsed(rid) else 0
+                          for rid in range(self.blockCount)])
+
+
+def spaceFromArray(blockArray):
+    """build spaceMap from one 0/1 byte per block (original map layout)"""
+    bitmap = bytearray((len(blockArray) + 7) // 8)
+    for rid in range(len(blockArray)):
+        if blockArray[rid] > 0:
+            bitmap[rid >> 3] |= 1 << (rid & 7)
+    return spaceMap(len(blockArray), bitmap)
@@ -0,0 +1,111 @@
+###################################
+# -- This script is designed to run in Python 3.8 --
+#  redo log: page images of committed batches, replayed when the db is opened
+###################################
+
+import os
+import struct
+import zlib
+
+# log file layout:
+#   magic, version, block size, then one record per commit batch
+#   batch: 'B', #pages, bitmap length, pages (rid + block image) ...,
+#          db state (blockCount, rootRID, dataRootRID, dictRID, bitmap), crc32
+# the first batch (no pages) is the base: the db state at the last checkpoint.
+# a batch counts only once its crc is on disk --> a torn tail is ignored
+logMagic = b'MBPL'
+logVersion = 1
+logHead = struct.Struct('=4sII')
+batchHead = struct.Struct('=cII')
+pageRef = struct.Struct('=q')
+stateHead = struct.Struct('=QQQq')
+batchTail = struct.Struct('=I')
+
+
+class redoLog():
+    """class for the redo log of one db: every commit is one sequential append + fsync.
+       blocks written outside the buffer (overflow text, dictionaries) wait in
+       pending until their batch is on disk, the db file only gets committed images
+    """
+
+    def __init__(self, filename, blockSize):
+        self.filename = filename
+        self.blockSize = blockSize
+        self.file = open(filename, 'wb')
+        self.pending = dict()   # rid --> block image held back from the db file
+        self.state = None       # db state of the last batch
+        self.ops = 0            # operations since the last commit
+        self.started = 0        # time of the last commit
+
+    def packBatch(self, pages, state):
+        blockCount, root, dataRoot, dictRID, bitmap = state
+        parts = [batchHead.pack(b'B', len(pages), len(bitmap))]
+        for rid in sorted(pages):
+            parts.append(pageRef.pack(rid))
+            parts.append(pages[rid])
+        parts.append(stateHead.pack(blockCount, root, dataRoot, dictRID))
+        parts.append(bitmap)
+        batch = b''.join(parts)
+        return batch + batchTail.pack(zlib.crc32(batch))
+
+    def write(self, data):
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def reset(self, state):
+        """start over with state as the base (the db file has everything else)"""
+        self.file.seek(0)
+        self.file.truncate()
+        self.write(logHead.pack(logMagic, logVersion, self.blockSize) +
+                   self.packBatch(dict(), state))
+        self.state = state
+
+    def append(self, pages, state):
+        """one commit batch: rid --> block image of every changed page, new db state"""
+        self.write(self.packBatch(pages, state))
+        self.state = state
+
+    def size(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def readLog(filename, blockSize):
+    """committed batches of a log --> (rid --> last block image, last db state),
+       None if there is no log or not even a base batch"""
+    if not os.path.exists(filename):
+        return None
+    file = open(filename, 'rb')
+    data = file.read()
+    file.close()
+    if len(data) < logHead.size:
+        return None
+    magic, version, logBlockSize = logHead.unpack_from(data, 0)
+    if magic != logMagic or version != logVersion or logBlockSize != blockSize:
+        return None
+
+    pages, state = dict(), None
+    pos = logHead.size
+    while pos + batchHead.size <= len(data):
+        kind, numPages, bitmapSize = batchHead.unpack_from(data, pos)
+        end = pos + batchHead.size + numPages * (pageRef.size + blockSize) + \
+            stateHead.size + bitmapSize
+        if kind != b'B' or end + batchTail.size > len(data) or \
+                batchTail.unpack_from(data, end)[0] != zlib.crc32(data[pos:end]):
+            break   # torn tail --> never committed
+        batchPages = dict()
+        at = pos + batchHead.size
+        for _ in range(numPages):
+            rid = pageRef.unpack_from(data, at)[0]
+            at += pageRef.size
+            batchPages.update({rid: data[at:at + blockSize]})
+            at += blockSize
+        pages.update(batchPages)
+        state = stateHead.unpack_from(data, at) + (data[at + stateHead.size:end],)
+        pos = end + batchTail.size
+    if state == None:
+        return None
+    return pages, state
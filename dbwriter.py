@@ -0,0 +1,70 @@
+###################################
+# -- This script is designed to run in Python 3.8 --
+#  background writer: block images of dirty pages --> db file, off the insert path
+###################################
+
+import threading
+
+defaultInterval = 0.05      # seconds the writer sleeps when nobody wakes it
+
+
+class pageWriter(threading.Thread):
+    """class for the background writer of one db.
+       the tree hands over block images (evicted dirty nodes, trickled pages)
+       at operation boundaries, the thread writes them out in rid order.
+       lock guards the db file/map: every block access of the tree takes it too
+    """
+
+    def __init__(self, write, interval=defaultInterval):
+        threading.Thread.__init__(self, daemon=True)
+        self.write = write          # write(rid, block) --> db file
+        self.interval = interval
+        self.lock = threading.RLock()
+        self.queue = dict()         # rid --> block image waiting for the disk
+        self.wake = threading.Event()
+        self.stopping = False
+        self.written = 0            # blocks written by the thread
+
+    def put(self, rid, block):
+        """queue the image of block rid (replaces any older image)"""
+        with self.lock:
+            self.queue.update({rid: block})
+        self.wake.set()
+
+    def get(self, rid):
+        """queued image of block rid, None if the db file is up to date"""
+        with self.lock:
+            return self.queue.get(rid)
+
+    def drop(self, rid):
+        """block rid was freed or overwritten --> its queued image is stale"""
+        with self.lock:
+            self.queue.pop(rid, None)
+
+    def drain(self):
+        """write everything still queued, in the caller's thread"""
+        with self.lock:
+            for rid in sorted(self.queue):
+                self.write(rid, self.queue[rid])
+            self.queue = dict()
+
+    def run(self):
+        while not self.stopping:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            with self.lock:
+                rids = sorted(self.queue)
+            # one block per lock hold --> a reader waits for one write at most
+            for rid in rids:
+                with self.lock:
+                    block = self.queue.pop(rid, None)
+                    if block != None:
+                        self.write(rid, block)
+                        self.written += 1
+
+    def stop(self):
+        """finish the thread, nothing stays queued"""
+        self.stopping = True
+        self.wake.set()
+        self.join()
+        self.drain()
@@ -5,7 +5,8 @@
 from collections import deque
 import math
 
-commandList = ['GET', 'PUT', 'DELETE', 'HELP', 'VISUAL', 'EXIT', 'INFO']
+commandList = ['GET', 'PUT', 'DELETE', 'HELP', 'VISUAL', 'EXIT', 'INFO', 'LOAD', 'CREATE',
+               'VACUUM']
 typeList = ['NODE', 'EDGE', 'PATH']
 conditionList = ['WHERE']
 symbolList = {' AND ': ' ⋀ ',
@@ -19,18 +20,54 @@ cmpList = ['=', '<', '>', '≤', '≥']
 GraphAttrs = {'node': [('degree', 'Int', -1),
                        ('adjacent', 'Bool', -4)],
               'edge': [('weight', 'Int', -1)]}
+textTypes = ['V20', 'VAR', 'DICT']     # text attributes compare as strings
 keywords = commandList + typeList + conditionList + list(symbolList.keys())
 opLevel = {'⋀': 1, '⋁': 1, '+': 1, '-': 1, '*': 2, '/': 2}
 
 
-def nodeDegree(key, edgeList, attrs):
-    degree = 0
-    for edge in edgeList:
-        LinkFromKey = getFieldValue(edge[0], getFieldPos(
-            'edge', 'LinkFrom', attrs)[0], edgeList)
-        if int(LinkFromKey) == key:
-            degree += 1
-    return degree
+def referencedTypes(conditions):
+    """object types ('node'/'edge') a WHERE condition refers to"""
+    types = []
+    if conditions != None:
+        for type in ['node', 'edge']:
+            if type + '.' in conditions.lower():
+                types.append(type)
+    return types
+
+
+def indexTerms(type, postfix, attrs):
+    """(attribute, op, value) comparisons of a type attribute with a constant,
+       which every match must satisfy --> candidates for an index lookup"""
+    if postfix == True or '⋁' in postfix:
+        return []
+    flipOp = {'=': '=', '<': '>', '>': '<', '≤': '≥', '≥': '≤'}
+    terms = []
+    for statement in postfix:
+        if statement in logicList or statement[0] == '⌐':
+            continue
+        op = None
+        for cmp in cmpList:
+            splitter = statement.split(cmp)
+            if len(splitter) == 2:
+                op = cmp
+                break
+        if op == None:
+            continue
+        attr, const = splitter
+        if const.lower().startswith(type + '.'):    # constant on the left
+            attr, const, op = const, attr, flipOp[op]
+        if not attr.lower().startswith(type + '.') or const == '':
+            continue
+        if const[0] != '"' and not isInt(const):
+            continue
+        valpos, fieldType = getFieldPos(type, attr[len(type) + 1:], attrs)
+        value = IDvalue(const, None, None, attrs)
+        if fieldType in textTypes:
+            fieldType = 'V20'
+        if valpos == 0 or value[0] == None or value[0][0] != fieldType:
+            continue
+        terms.append((attr[len(type) + 1:], op, value[0][1]))
+    return terms
 
 
 def isInt(strInt):
@@ -83,6 +120,8 @@ def IDvalue(unknownValue, node, edge, attrs):
             value = entry[1][valpos - 1]
         else:
             value = entry[0]
+        if objType in textTypes:
+            objType = 'V20'
         value = (objType, value)
 
     else:  # huh ... must be a "string" or int
@@ -365,7 +404,7 @@ def printEntryByFields(type, fields, entryList, attrs):
                 ind = fieldpos[i]
                 if ind >= 1:
                     val = str(entry[1][ind - 1])
-                    if fieldType[i] == 'V20':
+                    if fieldType[i] in textTypes:
                         val = '"' + val + '"'
                 else:
                     val = str(entry[0])
@@ -546,6 +585,19 @@ def parseFields(inputStr):
     return fields
 
 
+def parseTuples(inputStr):
+    """every (field, ..., field) group of the input --> list of field lists"""
+    tuples = []
+    start = inputStr.find('(')
+    while start != -1:
+        end = inputStr.find(')', start)
+        if end == -1:
+            break
+        tuples.append([field.strip() for field in inputStr[start + 1:end].split(',')])
+        start = inputStr.find('(', end)
+    return tuples
+
+
 def formatInput(rawInput):
 
     if rawInput.find('"') == -1:
@@ -642,7 +694,8 @@ def argsVerifier(arg, fields, attrs):
     return (None, True)
 
 
-def entryVerifyer(type, parms, attr):
+def entryVerifyer(type, parms, attr, asciiText=False):
+    """asciiText --> the db file keeps fixed-width ASCII text fields"""
 
     attfields = attr[type]
 
@@ -652,14 +705,23 @@ def entryVerifyer(type, parms, attr):
 
     entry = []
     for ind in range(len(parms)):
-        if attfields[ind][1] == 'V20':  # format text field to V20
-            if len(parms[ind]) > 20:
+        if asciiText and attfields[ind][1] in ['V20', 'DICT', 'VAR'] and \
+                not parms[ind].isascii():
+            error = "text '" + parms[ind] + \
+                "' holds non-ASCII characters, this db file stores ASCII text only."
+            return (True, error)
+
+        if attfields[ind][1] in ['V20', 'DICT']:  # format text field to V20
+            if len(parms[ind].encode('utf-8')) > 20:
                 error = "text length of '" + \
-                    parms[ind] + "'exceeds 20 charactors."
+                    parms[ind] + "'exceeds 20 bytes."
                 return (True, error)
             else:
                 entry.append(parms[ind])
 
+        if attfields[ind][1] == 'VAR':  # text of any length
+            entry.append(parms[ind])
+
         if attfields[ind][1] == 'Int':  # format Int as integer
             if not isInt(parms[ind]):
                 error = "parameter '" + parms[ind] + \
@@ -671,23 +733,6 @@ def entryVerifyer(type, parms, attr):
     return (None, entry)
 
 
-def findDependantEdges(nodeKey, edgeList, attrs):
-    linkFromPos, linkToPos = -1, -1
-    for att in attrs['edge']:
-        if att[0] == "LinkFrom":
-            linkFromPos = int(att[-1]) - 2
-        if att[0] == "LinkTo":
-            linkToPos = int(att[-1]) - 2
-
-    foundEdges = dict()
-    for edge in edgeList:
-        if edge[1][linkFromPos] == nodeKey or edge[1][linkToPos] == nodeKey:
-            foundEdges.update({edge[0]: edge[0]})
-
-    newList = [entry for entry in edgeList if entry[0]
-               not in foundEdges.keys()]
-    return list(foundEdges.keys()), newList
-
 ########
 ############
 #################
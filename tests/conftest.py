@@ -0,0 +1,40 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import BTree
+
+
+@pytest.fixture
+def attrs():
+    """London Tube catalog: node (key, Station, Line), edge (key, LinkFrom, LinkTo, ...)"""
+    fileTable = BTree.CATTableFileReader(os.path.join(ROOT, 'Table.cat'), 'LondonTube.db')
+    return BTree.CATTableAttrReader(os.path.join(ROOT, 'Attr.cat'), fileTable)
+
+
+@pytest.fixture
+def dbPath(tmp_path):
+    return str(tmp_path / 'test.db')
+
+
+def reopen(path, attrs, **kwargs):
+    """open an existing db file the way dbms does"""
+    tree = BTree.BPlusTree(1, open(path, 'rb+'), attrs, **kwargs)
+    tree.readDB()
+    return tree
+
+
+def crashImage(tree, path):
+    """the db file and its side files as they are on disk right now (what a
+       crash would leave behind), copied to path"""
+    source = tree.file.name
+    for suffix in ['', '.wal', '.idx']:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+        if os.path.exists(source + suffix):
+            shutil.copyfile(source + suffix, path + suffix)
@@ -0,0 +1,66 @@
+import os
+
+import BTree
+from conftest import reopen
+
+
+def station(key, name='st'):
+    return [key, name + '%d' % key, 'L%d' % (key % 3)]
+
+
+def edge(key, linkFrom, linkTo):
+    return [key, linkFrom, linkTo, 'N', '1', '2']
+
+
+def test_bulk_load_round_trip(attrs, dbPath):
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs)
+    tree.newDB()
+    entries = [station(key) for key in range(499, -1, -1)] + \
+        [edge(-key, key % 10, key + 10) for key in range(1, 80)]
+    assert tree.bulkLoad(entries) == None
+    expected = sorted((entry[0], tuple(entry[1:])) for entry in entries)
+    assert tree.ReadOut() == expected
+    assert list(tree.rangeScan(100, 120)) == expected[79 + 100:79 + 121]
+    assert [key for (key, _) in tree.outEdges(3)] == [-73, -63, -53, -43, -33, -23, -13, -3]
+    tree.cacheOut()
+    tree.file.close()
+    assert not os.path.exists(dbPath + '.vacuum')
+
+    tree = reopen(dbPath, attrs)
+    assert tree.ReadOut() == expected
+    tree.insertKey(station(1000))
+    assert tree.searchKey(1000) == ('st1000', 'L1')
+    tree.file.close()
+
+
+def test_bulk_load_overwrites_existing_keys(attrs, dbPath):
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs)
+    tree.newDB()
+    tree.insertMany([station(key) for key in range(50)])
+    tree.createIndex('node', 'Station', 'O')
+    assert tree.bulkLoad([station(key, 'new') for key in range(25, 100)]) == None
+    assert tree.ReadOut() == [(key, tuple(station(key)[1:])) for key in range(25)] + \
+        [(key, tuple(station(key, 'new')[1:])) for key in range(25, 100)]
+    names = tree.indexes.find('node', 'Station')
+    assert sorted(names.items()) == sorted((data[0], key) for (key, data) in tree.ReadOut())
+    tree.cacheOut()
+    tree.file.close()
+
+    tree = reopen(dbPath, attrs)
+    assert tree.searchKey(10) == ('st10', 'L1')
+    assert tree.searchKey(30) == ('new30', 'L0')
+    tree.file.close()
+
+
+def test_bulk_load_waits_for_snapshots(attrs, dbPath):
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs)
+    tree.newDB()
+    tree.insertMany([station(key) for key in range(20)])
+    snap = tree.snapshot()
+    assert tree.bulkLoad([station(key) for key in range(20, 40)]) == 'busy'
+    assert snap.ReadOut() == tree.ReadOut()
+    snap.release()
+    assert tree.bulkLoad([station(key) for key in range(20, 40)]) == None
+    assert [key for (key, _) in tree.ReadOut()] == list(range(40))
+    tree.cacheOut()
+    tree.file.close()
@@ -0,0 +1,55 @@
+import os
+import shutil
+
+import pytest
+
+import BTree
+from conftest import ROOT, reopen
+
+layouts = [(BTree.fixedVersion, BTree.keyPlain), (BTree.headerVersion, BTree.keyPlain),
+           (BTree.headerVersion, BTree.keyDelta)]
+
+
+def pageSlots(pageCodec):
+    slots = [(key, pageCodec.fitRecord(key, ('st%d' % key, 'L%d' % (key % 3))))
+             for key in [0, 1, 5, 900]]
+    slots.append((-7, pageCodec.fitRecord(-7, (1, 900, 'N', '1', '2'))))
+    return sorted(slots)
+
+
+@pytest.mark.parametrize('version, keyFormat', layouts)
+def test_pages_round_trip(attrs, version, keyFormat):
+    pageCodec = BTree.makeCodec(version, attrs, 512, keyFormat)
+    slots = pageSlots(pageCodec)
+    assert pageCodec.decode(pageCodec.encodeData(7, 9, slots)) == ('D', 7, 9, slots)
+    assert pageCodec.decode(pageCodec.encodeIndex(4, [10, 20], [1, 2, 3])) == \
+        ('I', 4, [10, 20], [1, 2, 3])
+
+
+@pytest.mark.parametrize('version, keyFormat', layouts)
+def test_pages_pack_in_place(attrs, version, keyFormat):
+    pageCodec = BTree.makeCodec(version, attrs, 512, keyFormat)
+    slots = pageSlots(pageCodec)
+    buffer = bytearray(b'\xff' * 3 * 512)
+    pageCodec.encodeData(7, -1, slots, buffer, 512)
+    assert buffer[0:512] == b'\xff' * 512 and buffer[1024:] == b'\xff' * 512
+    assert pageCodec.decode(buffer[512:1024]) == ('D', 7, -1, slots)
+    pageCodec.encodeIndex(4, [10], [1, 2], buffer, 512)    # reused for another node
+    assert pageCodec.decode(buffer[512:1024]) == ('I', 4, [10], [1, 2])
+
+
+def test_fixed_width_pages_of_the_tube_db(attrs, tmp_path):
+    dbPath = str(tmp_path / 'LondonTube.db')
+    shutil.copyfile(os.path.join(ROOT, 'LondonTube.db'), dbPath)
+    tree = reopen(dbPath, attrs)
+    assert tree.cache.header['version'] == BTree.fixedVersion
+    records = tree.ReadOut()
+    assert records[-1] == (383, ('SHOREDITCH', 'East London'))
+    tree.insertKey([5000, 'NEW CROSS GATE', 'Overground'])
+    tree.cacheOut()
+    tree.file.close()
+
+    tree = reopen(dbPath, attrs)
+    assert tree.searchKey(5000) == ('NEW CROSS GATE', 'Overground')
+    assert tree.ReadOut() == sorted(records + [(5000, ('NEW CROSS GATE', 'Overground'))])
+    tree.file.close()
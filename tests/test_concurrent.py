@@ -0,0 +1,63 @@
+import random
+import threading
+
+import pytest
+
+import BTree
+from conftest import reopen
+
+
+def station(key, version=0):
+    return [key, 'st%d-%d' % (key, version), 'L%d' % (key % 3)]
+
+
+@pytest.mark.parametrize('options', [dict(), dict(bufferSize=6, compressKeys=True),
+                                     dict(useMmap=True, logCommit=5)])
+def test_readers_next_to_a_writer(attrs, dbPath, options):
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs, concurrent=True, **options)
+    tree.newDB()
+    tree.insertMany([station(key) for key in range(0, 1000, 2)])
+    stable = dict((key, tuple(station(key)[1:])) for key in range(0, 1000, 2))
+    done = threading.Event()
+    errors = []
+
+    def reader(seed):
+        rnd = random.Random(seed)
+        try:
+            while not done.is_set():
+                key = rnd.randrange(0, 1000, 2)     # even keys never change
+                assert tree.searchKey(key) == stable[key]
+                lo = rnd.randrange(0, 1000)
+                keys = [key for (key, _) in tree.rangeScan(lo, lo + 100, rnd.random() < 0.3)]
+                assert sorted(set(keys)) == sorted(keys)
+                assert sorted(key for key in keys if key % 2 == 0) == \
+                    [key for key in sorted(stable) if lo <= key <= lo + 100]
+        except Exception as error:
+            errors.append(error)
+            done.set()
+
+    readers = [threading.Thread(target=reader, args=(seed,)) for seed in range(3)]
+    for thread in readers:
+        thread.start()
+    rnd = random.Random(9)
+    written = dict()
+    for version in range(1500):     # odd keys come and go
+        key = rnd.randrange(1, 1000, 2)
+        if rnd.random() < 0.6:
+            tree.insertKey(station(key, version))
+            written.update({key: tuple(station(key, version)[1:])})
+        else:
+            tree.deleteKey(key)
+            written.pop(key, None)
+    done.set()
+    for thread in readers:
+        thread.join()
+    assert errors == []
+
+    expected = sorted(list(stable.items()) + list(written.items()))
+    assert tree.ReadOut() == expected
+    tree.cacheOut()
+    tree.file.close()
+    tree = reopen(dbPath, attrs)
+    assert tree.ReadOut() == expected
+    tree.file.close()
@@ -0,0 +1,38 @@
+import BTree
+from conftest import reopen
+
+
+def station(key):
+    return [key, 'st%d' % key, 'L%d' % (key % 3)]
+
+
+def test_range_delete_collapse_reopens(attrs, dbPath):
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs)
+    tree.newDB()
+    tree.insertMany([station(key) for key in range(200)])
+    assert tree.root != None
+    tree.deleteRange(5, None)
+    assert tree.root == None
+    assert tree.cache.header['rootRID'] == tree.cache.header['dataRootRID']
+    tree.cacheOut()
+    tree.file.close()
+
+    tree = reopen(dbPath, attrs)
+    assert tree.ReadOut() == [(key, tuple(station(key)[1:])) for key in range(5)]
+    tree.insertKey(station(7))
+    assert tree.searchKey(7) == ('st7', 'L1')
+    tree.cacheOut()
+    tree.file.close()
+
+
+def test_delete_many_collapse_reopens(attrs, dbPath):
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs)
+    tree.newDB()
+    tree.insertMany([station(key) for key in range(200)])
+    tree.deleteMany(list(range(3, 200)))
+    tree.cacheOut()
+    tree.file.close()
+
+    tree = reopen(dbPath, attrs)
+    assert [key for (key, _) in tree.ReadOut()] == [0, 1, 2]
+    tree.file.close()
@@ -0,0 +1,147 @@
+import os
+
+import BTree
+from conftest import crashImage, reopen
+
+
+def station(key):
+    return [key, 'st%d' % key, 'L%d' % (key % 3)]
+
+
+def edge(key, linkFrom, linkTo):
+    return [key, linkFrom, linkTo, 'N', '1', '2']
+
+
+def buildTube(attrs, dbPath):
+    """100 stations, 59 edges, a Line index --> saved and closed"""
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs)
+    tree.newDB()
+    tree.insertMany([station(key) for key in range(100)] +
+                    [edge(-key, key % 10, key + 10) for key in range(1, 60)])
+    tree.createIndex('node', 'Line', 'H')
+    tree.cacheOut()
+    tree.file.close()
+
+
+def assertIndexesMatch(tree):
+    """adjacency and Line index agree with the records in the db"""
+    records = tree.ReadOut()
+    for nodeKey in range(100):
+        assert [key for (key, _) in tree.outEdges(nodeKey)] == \
+            [key for (key, data) in records if key < 0 and data[0] == nodeKey]
+        assert tree.incidentEdges(nodeKey) == \
+            sorted(key for (key, data) in records if key < 0 and nodeKey in data[0:2])
+    lineIndex = tree.indexes.find('node', 'Line')
+    assert lineIndex != None
+    assert sorted(lineIndex.items()) == \
+        sorted((data[1], key) for (key, data) in records if key >= 0)
+
+
+def test_index_file_survives_clean_reopen(attrs, dbPath):
+    buildTube(attrs, dbPath)
+    tree = reopen(dbPath, attrs)
+    assert tree.cache.header['indexFile'] == dbPath + '.idx'
+    assertIndexesMatch(tree)
+    tree.file.close()
+
+
+def test_crash_after_checkpoint_rebuilds_indexes(attrs, dbPath, tmp_path):
+    buildTube(attrs, dbPath)
+    tree = reopen(dbPath, attrs)
+    tree.insertKey(edge(-70, 5, 99))
+    tree.checkpoint()   # the db file has the edge, the index file doesn't
+    assert tree.cache.header['indexFile'] == None
+
+    crashPath = str(tmp_path / 'crash.db')
+    crashImage(tree, crashPath)
+    crashed = reopen(crashPath, attrs)
+    assert crashed.searchKey(-70) != None
+    assert [key for (key, _) in crashed.outEdges(5)] == [-70, -55, -45, -35, -25, -15, -5]
+    assert crashed.incidentEdges(99) == [-70]
+    assertIndexesMatch(crashed)
+    crashed.file.close()
+    tree.file.close()
+
+
+def test_damaged_index_file_is_rebuilt(attrs, dbPath):
+    buildTube(attrs, dbPath)
+    size = os.path.getsize(dbPath + '.idx')
+    with open(dbPath + '.idx', 'rb+') as indexFile:
+        indexFile.truncate(size // 2)
+    tree = reopen(dbPath, attrs)
+    assertIndexesMatch(tree)
+    tree.cacheOut()
+    tree.file.close()
+    assert not os.path.exists(dbPath + '.idx.tmp')
+
+
+def test_writer_checkpoint_then_crash_rebuilds_indexes(attrs, dbPath, tmp_path):
+    buildTube(attrs, dbPath)
+    tree = reopen(dbPath, attrs, backgroundWriter=True, checkpointInterval=0.0)
+    tree.insertKey(edge(-70, 5, 99))   # checkpoint right after, no cacheOut
+    assert tree.cache.header['indexFile'] == None
+
+    crashPath = str(tmp_path / 'crash.db')
+    with tree.cache.header['writer'].lock:
+        crashImage(tree, crashPath)
+    crashed = reopen(crashPath, attrs)
+    assert crashed.searchKey(-70) != None
+    assert [key for (key, _) in crashed.outEdges(5)] == [-70, -55, -45, -35, -25, -15, -5]
+    assert crashed.incidentEdges(99) == [-70]
+    assertIndexesMatch(crashed)
+    crashed.file.close()
+    tree.closeWriter()
+    tree.file.close()
+
+
+def test_checkpoint_without_changes_keeps_index_file(attrs, dbPath):
+    buildTube(attrs, dbPath)
+    tree = reopen(dbPath, attrs, backgroundWriter=True, checkpointInterval=0.0)
+    tree.searchKey(5)
+    tree.checkpoint()
+    assert tree.cache.header['indexFile'] == dbPath + '.idx'
+    tree.closeWriter()
+    tree.file.close()
+
+
+def test_index_created_before_crash_is_rebuilt(attrs, dbPath, tmp_path):
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs)
+    tree.newDB()
+    tree.insertMany([station(key) for key in range(100)] +
+                    [edge(-key, key % 10, key + 10) for key in range(1, 60)])
+    tree.checkpoint()
+    tree.createIndex('node', 'Line', 'H')   # no cacheOut after this
+
+    crashPath = str(tmp_path / 'crash.db')
+    crashImage(tree, crashPath)
+    crashed = reopen(crashPath, attrs)
+    assertIndexesMatch(crashed)
+    crashed.file.close()
+    tree.file.close()
+
+
+def test_adjacency_follows_edge_changes(attrs, dbPath):
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs)
+    tree.newDB()
+    tree.insertMany([station(key) for key in range(10)])
+    tree.insertMany([edge(-1, 1, 2), edge(-2, 1, 3), edge(-3, 3, 1)])
+    assert [key for (key, _) in tree.outEdges(1)] == [-2, -1]
+    assert [key for (key, _) in tree.inEdges(1)] == [-3]
+    assert tree.incidentEdges(1) == [-3, -2, -1]
+
+    tree.insertKey(edge(-2, 4, 3))     # relinked
+    tree.deleteKey(-3)
+    tree.insertKey(edge(-4, 2, 1))
+    assert [key for (key, _) in tree.outEdges(1)] == [-1]
+    assert [key for (key, _) in tree.outEdges(4)] == [-2]
+    assert [key for (key, _) in tree.inEdges(1)] == [-4]
+    assert tree.incidentEdges(3) == [-2]
+    tree.cacheOut()
+    tree.file.close()
+
+    tree = reopen(dbPath, attrs)
+    assert tree.cache.header['indexFile'] == dbPath + '.idx'
+    assert tree.incidentEdges(1) == [-4, -1]
+    assert tree.incidentEdges(2) == [-4, -1]
+    assert tree.outEdges(4) == [(-2, (4, 3, 'N', '1', '2'))]
+    tree.file.close()
@@ -0,0 +1,34 @@
+import BTree
+from conftest import reopen
+
+
+def station(key, name):
+    return [key, name + '%d' % key, 'L%d' % (key % 3)]
+
+
+def test_trees_in_one_process_stay_apart(attrs, tmp_path):
+    pathA, pathB = str(tmp_path / 'a.db'), str(tmp_path / 'b.db')
+    treeA = BTree.BPlusTree(100, open(pathA, 'wb+'), attrs, bufferSize=4)
+    treeA.newDB()
+    treeB = BTree.BPlusTree(100, open(pathB, 'wb+'), attrs, bufferSize=6, blockSize=1024,
+                            compressKeys=True)
+    treeB.newDB()
+    assert treeA.cache is not treeB.cache
+    for key in range(300):     # interleaved --> each buffer evicts its own nodes only
+        treeA.insertKey(station(key, 'a'))
+        treeB.insertKey(station(key * 2, 'b'))
+    treeA.deleteKey(5)
+    assert treeA.searchKey(5) == None and treeB.searchKey(6) == ('b6', 'L0')
+    assert treeA.searchKey(7) == ('a7', 'L1') and treeB.searchKey(7) == None
+    assert treeB.cache.header['blockSize'] == 1024
+    treeA.cacheOut()
+    treeA.file.close()
+    treeB.insertKey(station(1001, 'b'))     # still open after the other one closed
+    treeB.cacheOut()
+    treeB.file.close()
+
+    treeA, treeB = reopen(pathA, attrs), reopen(pathB, attrs)
+    assert [key for (key, _) in treeA.ReadOut()] == [key for key in range(300) if key != 5]
+    assert [key for (key, _) in treeB.ReadOut()] == list(range(0, 600, 2)) + [1001]
+    treeA.file.close()
+    treeB.file.close()
@@ -0,0 +1,49 @@
+import BTree
+from conftest import reopen
+
+
+def station(key):
+    return [key, 'st%d' % key, 'L%d' % (key % 3)]
+
+
+def edge(key, linkFrom, linkTo):
+    return [key, linkFrom, linkTo, 'N', '1', '2']
+
+
+def test_mapped_and_plain_reads_agree(attrs, dbPath):
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs, useMmap=True, bufferSize=4)
+    tree.newDB()
+    for key in range(300):
+        tree.insertKey(station(key))
+    for key in range(1, 50):
+        tree.insertKey(edge(-key, key % 10, key + 10))
+    for key in range(0, 300, 7):
+        tree.deleteKey(key)
+    records = tree.ReadOut()
+    tree.cacheOut()
+    tree.file.close()
+
+    for useMmap in [True, False]:
+        tree = reopen(dbPath, attrs, useMmap=useMmap, bufferSize=4)
+        assert (tree.cache.header['mmap'] != None) == useMmap
+        assert tree.ReadOut() == records
+        assert list(tree.rangeScan(100, 150)) == [slot for slot in records
+                                                  if 100 <= slot[0] <= 150]
+        assert tree.searchKey(7) == None and tree.searchKey(8) == ('st8', 'L2')
+        tree.file.close()
+
+
+def test_mapped_file_grows(attrs, dbPath):
+    tree = BTree.BPlusTree(10, open(dbPath, 'wb+'), attrs, useMmap=True,
+                           bufferSize=4, extent=8)
+    tree.newDB()
+    blocks = tree.cache.header['blockCount']
+    tree.insertMany([station(key) for key in range(2000)])
+    assert tree.cache.header['blockCount'] > blocks
+    assert tree.searchKey(1999) == ('st1999', 'L1')
+    tree.cacheOut()
+    tree.file.close()
+
+    tree = reopen(dbPath, attrs)
+    assert [key for (key, _) in tree.ReadOut()] == list(range(2000))
+    tree.file.close()
@@ -0,0 +1,217 @@
+import array
+import random
+
+import pytest
+
+import BTree
+import dbslots
+from conftest import reopen
+
+
+def station(key):
+    return [key, 'st%d' % key, 'L%d' % (key % 3)]
+
+
+def edge(key, linkFrom, linkTo):
+    return [key, linkFrom, linkTo, 'N', '1', '2']
+
+
+def treeKeys(tree, rid, lo=None, hi=None):
+    """keys of the data nodes under rid, checking every node is sorted and
+       within the keys of its parent"""
+    node = tree.cache.pager.node(rid)
+    if hasattr(node, 'keys'):
+        keys = list(node.keys)
+        assert keys == sorted(set(keys))
+        bounds = [lo] + keys + [hi]
+        found = []
+        for i in range(len(node.link)):
+            found.extend(treeKeys(tree, node.link[i], bounds[i], bounds[i + 1]))
+        return found
+    keys = [key for (key, _) in node.slots]
+    assert keys == sorted(set(keys))
+    assert all((lo == None or key >= lo) and (hi == None or key < hi) for key in keys)
+    return keys
+
+
+def test_shuffled_inserts_keep_nodes_sorted(attrs, dbPath):
+    random.seed(7)
+    keys = list(range(400))
+    random.shuffle(keys)
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs)
+    tree.newDB()
+    for key in keys:
+        tree.insertKey(station(key))
+        if key % 5 == 0:
+            tree.insertKey(edge(-key - 1, key, (key + 1) % 400))
+    expected = sorted(list(range(400)) + [-key - 1 for key in range(0, 400, 5)])
+    assert treeKeys(tree, tree.rootRID()) == expected
+    for key in random.sample(keys, 200):
+        tree.deleteKey(key)
+        keys.remove(key)
+    assert treeKeys(tree, tree.rootRID()) == \
+        sorted(keys + [-key - 1 for key in range(0, 400, 5)])
+
+    for key in range(-100, 500):
+        found = tree.searchKey(key)
+        if key >= 0:
+            assert found == (tuple(station(key)[1:]) if key in keys else None)
+        else:
+            assert (found != None) == (key % 5 == 4)
+    tree.cacheOut()
+    tree.file.close()
+
+    tree = reopen(dbPath, attrs)
+    assert treeKeys(tree, tree.rootRID()) == \
+        sorted(keys + [-key - 1 for key in range(0, 400, 5)])
+    tree.file.close()
+
+
+def test_insert_keeps_existing_key_once(attrs, dbPath):
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs)
+    tree.newDB()
+    tree.insertMany([station(key) for key in range(100)])
+    tree.insertKey([50, 'again', 'L9'])
+    assert tree.searchKey(50) == ('again', 'L9')
+    assert treeKeys(tree, tree.rootRID()) == list(range(100))
+    tree.cacheOut()
+    tree.file.close()
+
+
+def test_insert_many_matches_single_inserts(attrs, tmp_path):
+    random.seed(3)
+    batch = [station(random.randrange(2000)) for _ in range(1500)] + \
+        [edge(-key, key % 10, key + 10) for key in range(1, 200)]
+    batch.append([7, 'last one wins', 'L9'])
+    trees = []
+    for name in ['one.db', 'many.db']:
+        tree = BTree.BPlusTree(100, open(str(tmp_path / name), 'wb+'), attrs, bufferSize=8)
+        tree.newDB()
+        tree.insertMany([station(key) for key in range(0, 2000, 5)])
+        tree.createIndex('node', 'Line', 'H')
+        trees.append(tree)
+    for keyDat in batch:
+        trees[0].insertKey(keyDat)
+    trees[1].insertMany(batch)
+
+    expected = trees[0].ReadOut()
+    assert trees[1].ReadOut() == expected
+    assert trees[1].searchKey(7) == ('last one wins', 'L9')
+    assert sorted(trees[1].indexes.find('node', 'Line').items()) == \
+        sorted(trees[0].indexes.find('node', 'Line').items())
+    assert treeKeys(trees[1], trees[1].rootRID()) == [key for (key, _) in expected]
+    for tree in trees:
+        tree.cacheOut()
+        tree.file.close()
+    tree = reopen(str(tmp_path / 'many.db'), attrs)
+    assert tree.ReadOut() == expected
+    tree.file.close()
+
+
+def leafFills(tree):
+    """fill of every data node along the chain, as a share of the largest fill"""
+    fills = []
+    node = tree.cache.pager.node(tree.dataRoot.rid)
+    while True:
+        fills.append(node.fill() / node.maxKey)
+        if node.next == -1:
+            return fills
+        node = tree.cache.pager.node(node.next)
+
+
+@pytest.mark.parametrize('order', ['ascending', 'descending'])
+def test_append_splits_leave_full_pages(attrs, tmp_path, order):
+    keys = list(range(3000)) if order == 'ascending' else list(range(2999, -1, -1))
+    leaves = dict()
+    for policy in [BTree.splitEven, BTree.splitAppend]:
+        tree = BTree.BPlusTree(100, open(str(tmp_path / ('%d.db' % policy)), 'wb+'), attrs,
+                               splitPolicy=policy, splitFill=1.0)
+        tree.newDB()
+        for key in keys:
+            tree.insertKey(station(key))
+        fills = leafFills(tree)
+        leaves.update({policy: len(fills)})
+        assert [key for (key, _) in tree.ReadOut()] == list(range(3000))
+        if policy == BTree.splitAppend:     # all but the open end are packed
+            packed = fills[:-1] if order == 'ascending' else fills[1:]
+            assert min(packed) > 0.9
+        tree.cacheOut()
+        tree.file.close()
+    assert leaves[BTree.splitAppend] < 0.6 * leaves[BTree.splitEven]
+
+
+def test_append_split_policy_with_random_inserts(attrs, dbPath):
+    random.seed(11)
+    keys = list(range(1000))
+    random.shuffle(keys)
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs, splitPolicy=BTree.splitAppend)
+    tree.newDB()
+    for key in keys:
+        tree.insertKey(station(key))
+    for key in range(1000, 1500):   # then appends
+        tree.insertKey(station(key))
+    assert treeKeys(tree, tree.rootRID()) == list(range(1500))
+    fills = leafFills(tree)     # the last leaf is the open end of the appends
+    assert min(fills[:-1]) >= tree.dataMinKey / tree.dataMaxKey
+    assert min(fills[-20:-1]) > 0.85    # splitFill of the appended pages
+    tree.cacheOut()
+    tree.file.close()
+
+
+def test_one_pager_per_tree(attrs, dbPath, monkeypatch):
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs, bufferSize=8)
+    tree.newDB()
+    pager = tree.cache.pager
+    made = []
+    ridInit = BTree.RID.__init__
+    monkeypatch.setattr(BTree.RID, '__init__',
+                        lambda self, cache: made.append(cache) or ridInit(self, cache))
+    random.seed(5)
+    keys = list(range(5000))
+    random.shuffle(keys)
+    tree.insertMany([station(key) for key in keys[:2500]])
+    for key in keys[2500:]:
+        tree.insertKey(station(key))
+    assert tree.height() >= 2
+    for key in keys[:4900]:     # merges up through the index levels
+        tree.deleteKey(key)
+    assert list(tree.rangeScan(None, None, reverse=True)) == \
+        [(key, tuple(station(key)[1:])) for key in sorted(keys[4900:], reverse=True)]
+    assert treeKeys(tree, tree.rootRID()) == sorted(keys[4900:])
+    assert made == [] and tree.cache.pager is pager
+    tree.cacheOut()
+    tree.file.close()
+
+
+def test_slot_list_reads_like_a_list():
+    slots = dbslots.slotList([(1, ('a',)), (3, ('c',))])
+    slots.insert(slots.find(2), (2, ('b',)))
+    slots.append((5, ('e',)))
+    assert list(slots) == [(1, ('a',)), (2, ('b',)), (3, ('c',)), (5, ('e',))]
+    assert slots[1:3] == [(2, ('b',)), (3, ('c',))] and slots[-1] == (5, ('e',))
+    assert slots.pop(0) == (1, ('a',)) and len(slots) == 3
+    slots[0] = (2, ('B',))
+    del slots[1]
+    assert slots + [(7, ('g',))] == [(2, ('B',)), (5, ('e',)), (7, ('g',))]
+    assert slots.find(4) == 1 and slots.find(9) == 2
+    assert isinstance(slots.keys, array.array)
+
+
+def test_nodes_are_compact(attrs, dbPath):
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs)
+    tree.newDB()
+    tree.insertMany([station(key) for key in range(1000)])
+    tree.cacheOut()
+    tree.file.close()
+
+    tree = reopen(dbPath, attrs)
+    root = tree.cache.pager.node(tree.rootRID())
+    leaf = tree.cache.pager.node(tree.dataRoot.rid)
+    for node in [root, leaf]:
+        assert not hasattr(node, '__dict__')
+    assert isinstance(root.keys, array.array) and isinstance(root.link, array.array)
+    assert isinstance(leaf.slots.keys, array.array)
+    root.keys = list(root.keys)     # assigned lists are kept as arrays
+    assert isinstance(root.keys, array.array)
+    assert treeKeys(tree, tree.rootRID()) == list(range(1000))
+    tree.file.close()
@@ -0,0 +1,128 @@
+import pytest
+
+import BTree
+import parse
+from conftest import reopen
+
+
+@pytest.fixture
+def varAttrs(attrs):
+    """the tube catalog with Station as text of any length"""
+    catalog = dict(attrs)
+    catalog['node'] = [('key', 'Int', 1), ('Station', 'VAR', 2), ('Line', 'DICT', 3)]
+    return catalog
+
+
+def longText(key, size):
+    return ('%d-Łódź-' % key * size)[:size]
+
+
+def test_long_text_goes_to_overflow_chains(varAttrs, dbPath):
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), varAttrs)
+    tree.newDB()
+    sizes = {key: [5, 60, 700, 5000][key % 4] for key in range(40)}
+    for key in range(40):
+        tree.insertKey([key, longText(key, sizes[key]), 'L1'])
+    freeCount = tree.cache.header['space'].freeCount
+    tree.cacheOut()
+    tree.file.close()
+
+    tree = reopen(dbPath, varAttrs)
+    for key in range(40):
+        assert tree.searchKey(key) == (longText(key, sizes[key]), 'L1')
+    for key in range(3, 40, 4):     # 5000 characters --> short text, chains freed
+        tree.insertKey([key, 'short', 'L1'])
+    tree.deleteKey(2)
+    assert tree.cache.header['space'].freeCount > freeCount
+    tree.cacheOut()
+    tree.file.close()
+
+    tree = reopen(dbPath, varAttrs)
+    assert tree.searchKey(3) == ('short', 'L1')
+    assert tree.searchKey(2) == None
+    assert tree.searchKey(6) == (longText(6, 700), 'L1')
+    tree.file.close()
+
+
+def test_text_is_counted_in_bytes(attrs, dbPath):
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs)
+    tree.newDB()
+    tree.insertKey([1, 'ZÜRICH HBF', 'Ωmega'])
+    tree.insertKey([2, 'Ü' * 15, 'L1'])    # 30 bytes --> cut to 20
+    tree.cacheOut()
+    tree.file.close()
+
+    tree = reopen(dbPath, attrs)
+    assert tree.searchKey(1) == ('ZÜRICH HBF', 'Ωmega')
+    assert tree.searchKey(2) == ('Ü' * 10, 'L1')
+    tree.file.close()
+
+
+def test_fixed_width_files_take_ascii_only(attrs):
+    assert parse.entryVerifyer('node', ['1', 'ZÜRICH', 'L1'], attrs)[0] == None
+    error = parse.entryVerifyer('node', ['1', 'ZÜRICH', 'L1'], attrs, asciiText=True)
+    assert error[0] == True and 'non-ASCII' in error[1]
+    assert parse.entryVerifyer('node', ['1', 'ZURICH', 'L1'], attrs, asciiText=True) == \
+        (None, [1, 'ZURICH', 'L1'])
+
+
+def test_delta_coded_keys_survive_reopen(attrs, dbPath, tmp_path):
+    keys = list(range(0, 3000, 3)) + [2 ** 40, 2 ** 62]
+    edges = [-key for key in range(1, 400)] + [-2 ** 50]
+    used = dict()   # blocks taken with and without compressed keys
+    for path, compressKeys in [(str(tmp_path / 'plain.db'), False), (dbPath, True)]:
+        tree = BTree.BPlusTree(100, open(path, 'wb+'), attrs, compressKeys=compressKeys)
+        tree.newDB()
+        tree.insertMany([[key, 'st', 'L1'] for key in keys] +
+                        [[key, 1, 2, 'N', '1', '2'] for key in edges])
+        used.update({compressKeys: tree.cache.header['blockCount'] -
+                     tree.cache.header['space'].freeCount})
+        tree.cacheOut()
+        tree.file.close()
+    assert used[True] < used[False]
+
+    tree = reopen(dbPath, attrs)    # the key format comes from the file
+    assert tree.cache.header['keyFormat'] == BTree.keyDelta
+    assert [key for (key, _) in tree.ReadOut()] == sorted(keys + edges)
+    assert tree.searchKey(2 ** 62) == ('st', 'L1')
+    assert tree.searchKey(-2 ** 50) == (1, 2, 'N', '1', '2')
+    for key in range(0, 3000, 6):
+        tree.deleteKey(key)
+    tree.insertKey([2 ** 62 - 1, 'near', 'L2'])
+    tree.cacheOut()
+    tree.file.close()
+
+    tree = reopen(dbPath, attrs)
+    assert [key for (key, _) in tree.rangeScan(0, 20)] == [3, 9, 15]
+    assert tree.searchKey(2 ** 62 - 1) == ('near', 'L2')
+    tree.file.close()
+
+
+def test_dictionary_pages_survive_reopen(attrs, dbPath):
+    lines = ['line %d' % number for number in range(120)]    # more than one dictionary page
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs, bufferSize=4)
+    tree.newDB()
+    tree.insertMany([[key, 'st%d' % key, lines[key % 120]] for key in range(600)] +
+                    [[-key, key, key + 1, 'NS'[key % 2], '1', '2'] for key in range(1, 100)])
+    tree.cacheOut()
+    tree.file.close()
+
+    tree = reopen(dbPath, attrs, bufferSize=4)
+    assert tree.searchKey(250) == ('st250', 'line 10')
+    assert tree.dictScan('node', 'Line', 'line 10') == \
+        [(key, ('st%d' % key, 'line 10')) for key in range(10, 600, 120)]
+    assert [key for (key, _) in tree.dictScan('edge', 'direction', 'S')] == \
+        list(range(-99, 0, 2))
+    assert tree.dictScan('node', 'Line', 'no such line') == []
+    assert tree.dictScan('node', 'Station', 'st1') == None
+    tree.insertKey([700, 'new', 'new line'])
+    tree.insertKey([10, 'moved', 'line 11'])
+    assert [key for (key, _) in tree.dictScan('node', 'Line', 'line 10')] == [130, 250, 370, 490]
+    tree.cacheOut()
+    tree.file.close()
+
+    tree = reopen(dbPath, attrs)
+    assert tree.dictScan('node', 'Line', 'new line') == [(700, ('new', 'new line'))]
+    assert [key for (key, _) in tree.dictScan('node', 'Line', 'line 11')] == \
+        [10, 11, 131, 251, 371, 491]
+    tree.file.close()
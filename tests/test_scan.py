@@ -0,0 +1,85 @@
+import itertools
+
+import pytest
+
+import BTree
+from conftest import reopen
+
+
+def station(key):
+    return [key, 'st%d' % key, 'L%d' % (key % 3)]
+
+
+def edge(key, linkFrom, linkTo):
+    return [key, linkFrom, linkTo, 'N', '1', '2']
+
+
+def buildScanDB(attrs, dbPath):
+    """even station keys 0..998, edges -1..-99 --> closed"""
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs)
+    tree.newDB()
+    tree.insertMany([station(key) for key in range(0, 1000, 2)] +
+                    [edge(-key, key % 10, key + 10) for key in range(1, 100)])
+    tree.cacheOut()
+    tree.file.close()
+
+
+@pytest.mark.parametrize('concurrent', [False, True])
+def test_bounded_and_reverse_scans(attrs, dbPath, concurrent):
+    buildScanDB(attrs, dbPath)
+    tree = reopen(dbPath, attrs, bufferSize=6, concurrent=concurrent)
+    records = tree.ReadOut()
+    for lo, hi in [(None, None), (100, 200), (101, 199), (-50, 10), (None, -1),
+                   (990, None), (998, 998), (999, 2000), (300, 200)]:
+        expected = [slot for slot in records
+                    if (lo == None or slot[0] >= lo) and (hi == None or slot[0] <= hi)]
+        assert list(tree.rangeScan(lo, hi)) == expected
+        assert list(tree.rangeScan(lo, hi, reverse=True)) == expected[::-1]
+    tree.file.close()
+
+
+def test_scan_is_lazy(attrs, dbPath):
+    buildScanDB(attrs, dbPath)
+    tree = reopen(dbPath, attrs, bufferSize=6, readahead=0)
+    pager = tree.cache.pager
+    reads = []
+    readBlock = pager.readBlock
+    pager.readBlock = lambda refID: reads.append(refID) or readBlock(refID)
+    assert list(itertools.islice(tree.rangeScan(500), 3)) == \
+        [(key, tuple(station(key)[1:])) for key in [500, 502, 504]]
+    assert len(reads) <= tree.height() + 1     # one descent, at most one more leaf
+    assert next(tree.rangeScan(None, None, reverse=True))[0] == 998
+    tree.file.close()
+
+
+@pytest.mark.parametrize('useMmap', [False, True])
+def test_readahead_matches_plain_scan(attrs, dbPath, useMmap):
+    buildScanDB(attrs, dbPath)
+    results = dict()
+    for readahead in [0, 16]:
+        tree = reopen(dbPath, attrs, bufferSize=4, useMmap=useMmap, readahead=readahead)
+        pager = tree.cache.pager
+        runs = []
+        readRun = pager.readRun
+        pager.readRun = lambda refID, count: runs.append(refID) or readRun(refID, count)
+        tree.searchKey(900)
+        cached = set(tree.cache.rids)
+        scans = [list(tree.rangeScan())]
+        if readahead > 0:   # read ahead blocks stay out of the buffer
+            assert set(tree.cache.rids) == cached
+            assert len(runs) > 0
+        else:
+            assert runs == []
+        scans.append(list(tree.rangeScan(300, 700)))
+        scan = tree.rangeScan(0)    # writes in the middle of a scan
+        scans.append([next(scan) for _ in range(50)])
+        for key in range(101, 400, 2):
+            tree.insertKey(station(key))
+        tree.deleteKey(500)
+        scans.append(list(scan))
+        results.update({readahead: scans})
+        tree.cacheOut()
+        tree.file.close()
+        buildScanDB(attrs, dbPath)
+    assert results[16] == results[0]
+    assert len(results[0][0]) == 599
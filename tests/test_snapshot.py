@@ -0,0 +1,45 @@
+import pytest
+
+import BTree
+
+
+def station(key, name='st'):
+    return [key, name + '%d' % key, 'L%d' % (key % 3)]
+
+
+def edge(key, linkFrom, linkTo):
+    return [key, linkFrom, linkTo, 'N', '1', '2']
+
+
+@pytest.mark.parametrize('options', [dict(bufferSize=4), dict(bufferSize=4, logCommit=3),
+                                     dict(backgroundWriter=True, checkpointInterval=0.0),
+                                     dict(concurrent=True, useMmap=True)])
+def test_snapshot_stays_stable_across_writes(attrs, dbPath, options):
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs, **options)
+    tree.newDB()
+    tree.insertMany([station(key) for key in range(300)] +
+                    [edge(-key, key % 10, key + 10) for key in range(1, 30)])
+    before = tree.ReadOut()
+    with tree.snapshot() as snap:
+        for key in range(300, 600):    # splits
+            tree.insertKey(station(key))
+        tree.deleteRange(0, 150)        # merges and freed blocks
+        for key in range(150, 300, 3):
+            tree.insertKey(station(key, 'new'))
+        tree.deleteKey(-3)
+        tree.checkpoint()
+        tree.insertKey(station(1000))
+        assert snap.ReadOut() == before
+        assert snap.searchKey(10) == ('st10', 'L1')
+        assert snap.searchKey(1000) == None
+        assert list(snap.rangeScan(140, 160, reverse=True)) == \
+            [slot for slot in before if 140 <= slot[0] <= 160][::-1]
+        assert [key for (key, _) in snap.outEdges(3)] == [-23, -13, -3]
+        assert tree.searchKey(10) == None and tree.searchKey(153) == ('new153', 'L0')
+        assert tree.vacuum() == 'busy'
+    assert tree.cache.header['snapshots'] == []
+    assert tree.searchKey(1000) == ('st1000', 'L1')
+    if tree.cache.header['writer'] != None:
+        tree.closeWriter()
+    tree.cacheOut()
+    tree.file.close()
@@ -0,0 +1,91 @@
+import os
+
+import BTree
+import dbspace
+from conftest import reopen
+
+
+def station(key):
+    return [key, 'st%d' % key, 'L%d' % (key % 3)]
+
+
+def test_file_grows_by_extents(attrs, dbPath):
+    tree = BTree.BPlusTree(10, open(dbPath, 'wb+'), attrs, bufferSize=8, extent=16)
+    tree.newDB()
+    for key in range(1000):
+        assert tree.insertKey(station(key)) != 'full'
+    house = tree.cache.header
+    assert house['blockCount'] > 10 and (house['blockCount'] - 10) % 16 == 0
+    blockCount = house['blockCount']
+    tree.cacheOut()
+    tree.file.close()
+    assert os.path.getsize(dbPath) >= house['block0'] + blockCount * house['blockSize']
+
+    tree = reopen(dbPath, attrs)
+    assert tree.cache.header['blockCount'] == blockCount
+    assert [key for (key, _) in tree.ReadOut()] == list(range(1000))
+    tree.file.close()
+
+
+def test_space_map_reuses_released_blocks():
+    space = dbspace.spaceMap(8)
+    assert [space.allocate() for _ in range(8)] == list(range(8))
+    assert space.allocate() == None
+    space.release(5)
+    space.release(2)
+    assert space.freeCount == 2
+    assert space.allocate(near=4) == 5     # a neighbour goes ahead of the free stack
+    assert space.allocate() == 2
+    assert space.allocate() == None
+    space.grow(16)
+    assert space.freeCount == 8 and space.allocate() == 8
+    assert dbspace.spaceMap(16, space.toBytes()).freeCount == 7
+
+
+def test_deleted_blocks_are_reused(attrs, dbPath):
+    tree = BTree.BPlusTree(10, open(dbPath, 'wb+'), attrs, bufferSize=8, extent=16)
+    tree.newDB()
+    tree.insertMany([station(key) for key in range(1000)])
+    blockCount = tree.cache.header['blockCount']
+    tree.deleteMany(list(range(1000)))
+    freeCount = tree.cache.header['space'].freeCount
+    assert freeCount > blockCount // 2
+    tree.insertMany([station(key) for key in range(1000, 2000)])
+    assert tree.cache.header['blockCount'] == blockCount
+    tree.cacheOut()
+    tree.file.close()
+
+    tree = reopen(dbPath, attrs)
+    assert tree.cache.header['space'].freeCount < freeCount
+    assert [key for (key, _) in tree.ReadOut()] == list(range(1000, 2000))
+    tree.file.close()
+
+
+def test_vacuum_keeps_records_and_shrinks_file(attrs, dbPath):
+    tree = BTree.BPlusTree(10, open(dbPath, 'wb+'), attrs, bufferSize=8, extent=16)
+    tree.newDB()
+    tree.insertMany([station(key) for key in range(2000)] +
+                    [[-key, key, key + 1, 'N', '1', '2'] for key in range(1, 300)])
+    tree.createIndex('node', 'Station', 'O')
+    for key in range(0, 2000, 3):
+        tree.deleteKey(key)
+    tree.deleteRange(500, 1500)
+    records = tree.ReadOut()
+    tree.checkpoint()
+    size = os.path.getsize(dbPath)
+
+    assert tree.vacuum() == None
+    assert os.path.getsize(dbPath) < size // 2
+    assert tree.cache.header['space'].freeCount == 0
+    assert tree.ReadOut() == records
+    assert [key for (key, _) in tree.outEdges(7)] == [-7]
+    names = tree.indexes.find('node', 'Station')
+    assert sorted(names.items()) == sorted((data[0], key) for (key, data) in records if key >= 0)
+    tree.insertKey(station(5000))   # the vacuumed file grows again
+    tree.cacheOut()
+    tree.file.close()
+    assert not os.path.exists(dbPath + '.vacuum')
+
+    tree = reopen(dbPath, attrs)
+    assert tree.ReadOut() == records + [(5000, tuple(station(5000)[1:]))]
+    tree.file.close()
@@ -0,0 +1,104 @@
+import os
+
+import pytest
+
+import BTree
+from conftest import crashImage, reopen
+
+
+def station(key):
+    return [key, 'st%d' % key, 'L%d' % (key % 3)]
+
+
+def edge(key, linkFrom, linkTo):
+    return [key, linkFrom, linkTo, 'N', '1', '2']
+
+
+def tearNextAppend(log):
+    """the next log append stops half way, as if the process died in it"""
+    def tornWrite(data):
+        log.file.write(data[:len(data) // 2])
+        log.file.flush()
+        raise OSError('crash')
+    log.write = tornWrite
+
+
+def test_torn_log_tail_replays_last_commit(attrs, dbPath, tmp_path):
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs, bufferSize=1000,
+                           logCommit=100000, logInterval=1000)
+    tree.newDB()
+    tree.createIndex('node', 'Line', 'H')
+    for key in range(150):
+        tree.insertKey(station(key))
+    for key in range(1, 40):
+        tree.insertKey(edge(-key, key % 10, key + 10))
+    tree.commit()
+    committed = tree.ReadOut()
+
+    for key in range(150, 200):     # the batch that never makes it to the log
+        tree.insertKey(station(key))
+    for key in range(0, 20):
+        tree.deleteKey(key)
+    tearNextAppend(tree.cache.header['log'])
+    with pytest.raises(OSError):
+        tree.commit()
+
+    crashPath = str(tmp_path / 'crash.db')
+    crashImage(tree, crashPath)
+    assert os.path.getsize(crashPath + '.wal') > 0
+    crashed = reopen(crashPath, attrs)
+    assert crashed.ReadOut() == committed
+    lineIndex = crashed.indexes.find('node', 'Line')
+    assert sorted(lineIndex.items()) == \
+        sorted((data[1], key) for (key, data) in committed if key >= 0)
+    assert [key for (key, _) in crashed.outEdges(3)] == [-33, -23, -13, -3]
+
+    # the recovered db takes new work and reopens clean
+    crashed.insertKey(station(500))
+    crashed.deleteKey(-3)
+    crashed.cacheOut()
+    crashed.file.close()
+    assert not os.path.exists(crashPath + '.wal')
+    final = reopen(crashPath, attrs)
+    assert final.searchKey(500) == ('st500', 'L2')
+    assert final.searchKey(-3) == None
+    assert [key for (key, _) in final.outEdges(3)] == [-33, -23, -13]
+    final.file.close()
+    tree.file.close()
+
+
+def test_crash_before_first_commit_reopens_empty(attrs, dbPath, tmp_path):
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs, bufferSize=1000,
+                           logCommit=100000, logInterval=1000)
+    tree.newDB()
+    crashPath = str(tmp_path / 'crash.db')
+    crashImage(tree, crashPath)     # nothing committed, nothing checkpointed
+    crashed = reopen(crashPath, attrs)
+    assert crashed.ReadOut() == []
+    crashed.file.close()
+
+    for key in range(50):   # in the buffer only, the log never got them
+        tree.insertKey(station(key))
+    crashImage(tree, crashPath)
+    crashed = reopen(crashPath, attrs)
+    assert crashed.ReadOut() == []
+    crashed.insertKey(station(7))
+    crashed.cacheOut()
+    crashed.file.close()
+    assert reopen(crashPath, attrs).searchKey(7) == ('st7', 'L1')
+    tree.file.close()
+
+
+def test_damaged_block_names_its_rid(attrs, dbPath):
+    tree = BTree.BPlusTree(100, open(dbPath, 'wb+'), attrs)
+    tree.newDB()
+    tree.insertMany([station(key) for key in range(200)])
+    tree.cacheOut()
+    rootRID = tree.cache.header['rootRID']
+    blockPos = tree.cache.header['block0'] + rootRID * tree.cache.header['blockSize']
+    tree.file.seek(blockPos)
+    tree.file.write(bytes(tree.cache.header['blockSize']))
+    tree.file.close()
+
+    with pytest.raises(ValueError, match='block ' + str(rootRID) + ' holds no page'):
+        reopen(dbPath, attrs)